@@ -1,22 +1,50 @@
 """
 Main Orchestrator for Payroll Data Extraction
-Runs the entire pipeline from PDF to structured JSON output.
+Runs the entire pipeline from PDF to structured JSON output, or any single
+step of it on existing artifacts.
 
-Usage: python main.py <pdf_filename>
-Example: python main.py PR-Register.pdf
+Usage: python main.py <command> [options]
+
+Commands:
+    run <pdf>                       Steps 1-3: PDF -> extracted/interim/mapped JSON
+    extract-text <pdf>              Step 1 only: PDF -> extracted.json
+    extract-raw <extracted.json>    Step 2 only: extracted.json -> interim.json (LLM)
+    map <interim.json>              Step 3 only: interim.json -> mapped.json
+    validate <interim.json>         Check interim.json structure
+    rebuild [outputs_dir]           Re-run only the stages whose inputs/code changed
+    refine <output_dir>             Re-extract only low-confidence lines (LLM)
+    diff <old> <new>                Compare two mapped.json outputs (adds, removals, amount deltas)
+    analyze <output_dir|mapped.json>...
+                                    Flag outlier employees -> anomalies.json (NumPy)
+    queue submit|work|coordinate|status
+                                    Distribute Steps 1-3 over worker processes/nodes
+    serve                           Local HTTP service: POST PDFs, poll job status/results
+
+Example: python main.py run PR-Register.pdf
+         python main.py run PR-Register.pdf --replay testing/cassettes/PR-Register
+         python main.py run PR-Register-0112.pdf --delta-from outputs/PR-Register-0105
+         python main.py map outputs/PR-Register/interim.json
+         python main.py rebuild outputs --jobs 8
+         python main.py refine outputs/PR-Register
+         python main.py analyze outputs/*/
+         python main.py diff outputs/PR-Register-0105 outputs/PR-Register-0112 --threshold 1
+         python main.py queue submit sample_pdfs/*.pdf && python main.py queue work &
+         python main.py queue coordinate
+         python main.py serve --port 8080 --llm-concurrency 8
+
+`python main.py <pdf>` is kept as a shorthand for `python main.py run <pdf>`.
+
+Heavy modules (PyMuPDF, anthropic, the global schema) are imported inside
+the commands that need them, so the non-LLM commands start quickly.
 """
 
+import argparse
 import sys
 import json
 from pathlib import Path
 from datetime import datetime
 
-# Import pipeline steps
-from src.step1_pdf_extraction import extract_text_from_pdf
-from src.step2_raw_extraction import RawDataExtractor
-from src.step3_schema_mapping import SchemaMatcher
-# TODO: Import remaining steps after implementation
-# from src.step4_validation import PayrollValidator
+COMMANDS = ["run", "extract-text", "extract-raw", "map", "validate", "rebuild", "refine", "diff", "analyze", "queue", "serve"]
 
 
 def log_step(step_num: int, step_name: str):
@@ -43,21 +71,8 @@ def ensure_output_dir(pdf_name: str) -> Path:
     return output_dir
 
 
-def main():
-    """Main orchestration function."""
-    
-    # Parse command line arguments
-    if len(sys.argv) < 2:
-        print("Usage: python main.py <pdf_filename>")
-        print("Example: python main.py PR-Register.pdf")
-        print("\nAvailable PDFs in sample_pdfs/:")
-        sample_pdfs = list(Path("./sample_pdfs").glob("*.pdf"))
-        for pdf in sample_pdfs:
-            print(f"  - {pdf.name}")
-        sys.exit(1)
-    
-    pdf_filename = sys.argv[1]
-    
+def resolve_pdf_path(pdf_filename: str) -> str:
+    """Accept a full path or a file name in sample_pdfs/; exit if missing."""
     # Handle both full path and just filename
     if Path(pdf_filename).exists():
         pdf_path = pdf_filename
@@ -69,6 +84,333 @@ def main():
         log_error(f"PDF file not found: {pdf_path}")
         sys.exit(1)
     
+    return pdf_path
+
+
+def load_json(path: Path) -> dict:
+    """Load an artifact (JSON or binary), exiting with an error if it is missing."""
+    from src.artifacts import artifact_path, read_artifact
+    
+    path = Path(path)
+    if artifact_path(path) is None:
+        log_error(f"File not found: {path}")
+        sys.exit(1)
+    return read_artifact(path)
+
+
+def write_metrics(metrics: "RunMetrics", output_dir: Path, write_prometheus: bool = False):
+    """Save run metrics next to the pipeline outputs."""
+    metrics.print_summary()
+    metrics_path = metrics.write_json(output_dir / "metrics.json")
+    log_success(f"Metrics saved to: {metrics_path}")
+    if write_prometheus:
+        prom_path = metrics.write_prometheus(output_dir / "metrics.prom")
+        log_success(f"Prometheus metrics saved to: {prom_path}")
+
+
+def run_step1(pdf_path: str, output_dir: Path, source_name: str, metrics: "RunMetrics",
+              text_cache=None, artifact_format: str = None) -> list:
+    """
+    Step 1: extract page text from the PDF and save extracted.json.
+    
+    Args:
+        text_cache: Optional PageTextCache; an unchanged PDF is not parsed again
+        artifact_format: "json", or "msgpack" for extracted.msgpack.zst
+                         (default: the existing artifact's format, else JSON)
+    
+    Returns:
+        List of page dictionaries
+    """
+    from src.step1_pdf_extraction import extract_text_from_pdf
+    from src.artifacts import build_record, file_sha256, write_artifact
+    
+    log_step(1, "PDF Text Extraction")
+    
+    pdf_sha256 = file_sha256(Path(pdf_path))
+    pages = extract_text_from_pdf(pdf_path, metrics=metrics, cache=text_cache, pdf_sha256=pdf_sha256)
+    
+    if not pages:
+        raise ValueError("No pages extracted from PDF")
+    
+    log_success(f"Extracted {len(pages)} pages from PDF")
+    
+    # Save extracted pages
+    pdf_input = {"path": str(Path(pdf_path).resolve()), "sha256": pdf_sha256}
+    extracted_json_path = write_artifact(output_dir / "extracted.json", {
+        "source_file": source_name,
+        "extraction_timestamp": datetime.now().isoformat(),
+        "total_pages": len(pages),
+        "pages": pages
+    }, build_record("extracted", {"pdf": pdf_input}), artifact_format)
+    log_success(f"Saved to: {extracted_json_path}")
+    
+    # Print page preview
+    print("\n  Page previews:")
+    for page in pages[:3]:  # Show first 3 pages
+        text_preview = page['text'][:80].replace('\n', ' ')
+        print(f"    Page {page['page_number']}: {text_preview}...")
+    
+    if len(pages) > 3:
+        print(f"    ... and {len(pages) - 3} more pages")
+    
+    return pages
+
+
+def run_step2(pages: list, output_dir: Path, metrics: "RunMetrics", extractor=None,
+              artifact_format: str = None) -> dict:
+    """
+    Step 2: raw LLM extraction of the pages and save interim.json.
+    
+    Args:
+        artifact_format: "json", or "msgpack" for interim.msgpack.zst
+                         (default: the existing artifact's format, else JSON)
+    
+    Returns:
+        Interim data dictionary
+    """
+    from src.step2_raw_extraction import RawDataExtractor
+    from src.artifacts import build_record, pages_hash, write_artifact
+    
+    log_step(2, "Raw Data Extraction (PASS 1)")
+    
+    if extractor is None:
+        extractor = RawDataExtractor(metrics=metrics)
+    interim_data = extractor.extract_raw_data(pages)
+    
+    # Validate interim format
+    if not extractor.validate_interim_format(interim_data):
+        print("⚠ Warning: Extracted data may not have expected format")
+        print("  Continuing anyway...")
+    
+    log_success(f"Extracted data for {len(interim_data.get('employees', []))} employees")
+    
+    # Show extraction summary
+    if interim_data.get('report_metadata'):
+        meta = interim_data['report_metadata']
+        print(f"\n  Report: {meta.get('report_title', 'Unknown')}")
+        print(f"  Company: {meta.get('company_name', 'Unknown')}")
+        print(f"  Pay Period: {meta.get('pay_period_start', '?')} to {meta.get('pay_period_end', '?')}")
+    
+    if interim_data.get('employees'):
+        print(f"\n  Sample employee (first):")
+        emp = interim_data['employees'][0]
+        print(f"    Name: {emp.get('employee_name', 'Unknown')}")
+        print(f"    ID: {emp.get('employee_id', 'Unknown')}")
+        print(f"    Earnings: {len(emp.get('earnings', []))} lines")
+        print(f"    Deductions: {len(emp.get('deductions', []))} lines")
+        print(f"    Taxes: {len(emp.get('taxes', []))} lines")
+    
+    # Save interim JSON
+    config = extractor.interim_config()
+    interim_json_path = write_artifact(output_dir / "interim.json", interim_data,
+                                       build_record("interim", {"extracted": pages_hash(pages)}, config),
+                                       artifact_format)
+    log_success(f"Saved to: {interim_json_path}")
+    
+    return interim_data
+
+
+def run_step3(interim_data: dict, output_dir: Path, metrics: "RunMetrics",
+              compact: bool = False, drop_nulls: bool = False, classifier=None,
+              jurisdictions_path: str = None) -> dict:
+    """
+    Step 3: map interim data to the global schema and save mapped.json.
+    
+    Args:
+        compact: Write mapped.json without schema boilerplate (see src/compact_output.py)
+        drop_nulls: In compact mode, also drop null values
+        classifier: Optional LabelClassifier for descriptions no alias matches
+        jurisdictions_path: Optional JSON file of per-client jurisdiction overrides
+    
+    Returns:
+        Mapped data dictionary
+    """
+    from src.step3_schema_mapping import SchemaMatcher
+    from src.jurisdictions import JurisdictionIndex
+    from src.artifacts import write_mapped_artifact
+    
+    log_step(3, "Schema Mapping (PASS 2)")
+    
+    jurisdictions = JurisdictionIndex.from_file(jurisdictions_path) if jurisdictions_path else None
+    matcher = SchemaMatcher(metrics=metrics, classifier=classifier, jurisdictions=jurisdictions)
+    mapped_data = matcher.map_interim_to_schema(interim_data)
+    
+    log_success(f"Mapped {len(mapped_data.get('employees', []))} employees to global schema")
+    
+    # Show mapping summary
+    if mapped_data.get('employees'):
+        print(f"\n  Sample mapped employee:")
+        emp = mapped_data['employees'][0]
+        print(f"    Name: {emp['employee_info'].get('employee_name', 'Unknown')}")
+        print(f"    Earnings types: {len(emp.get('earnings', {}).get('earning_lines', []))} mapped")
+        print(f"    Deduction types: {len(emp.get('deductions', {}).get('deduction_lines', []))} mapped")
+        print(f"    Tax types: {len(emp.get('employee_taxes', {}).get('tax_lines', []))} mapped")
+    
+    # Save mapped JSON
+    mapped_json_path = output_dir / "mapped.json"
+    config = {"compact": True, "drop_nulls": drop_nulls} if compact else {}
+    if classifier is not None:
+        config.update({"classify_labels": True, "label_cache": str(classifier.cache_path)})
+    if jurisdictions_path:
+        config["jurisdictions"] = str(jurisdictions_path)
+    write_mapped_artifact(mapped_json_path, mapped_data, interim_data, config)
+    log_success(f"Saved to: {mapped_json_path}")
+    
+    return mapped_data
+
+
+def run_analysis(documents: list, metrics: "RunMetrics", detector=None) -> dict:
+    """
+    Flag outlier employees and save anomalies.json next to each mapped.json.
+    
+    Args:
+        documents: (document name, mapped data, output dir) triples; documents of
+                   the same company share peer statistics
+        metrics: Run metrics
+        detector: Optional pre-configured AnomalyDetector
+    
+    Returns:
+        Document name -> flagged employees (empty if NumPy is not installed)
+    """
+    try:
+        from src.anomalies import AnomalyDetector, write_anomalies
+    except ImportError:
+        print("\n⚠ NumPy is not installed; skipping anomaly detection (pip install numpy)")
+        return {}
+    
+    print("\n" + "="*60)
+    print("ANOMALY DETECTION")
+    print("="*60)
+    
+    if detector is None:
+        detector = AnomalyDetector(metrics=metrics)
+    flagged = detector.detect((name, mapped) for name, mapped, _ in documents)
+    
+    for name, mapped, output_dir in documents:
+        entries = flagged.get(name, [])
+        path = write_anomalies(Path(output_dir) / "anomalies.json", entries,
+                               len(mapped.get('employees', [])), detector.config())
+        log_success(f"{name}: {len(entries)} of {len(mapped.get('employees', []))} employees flagged -> {path}")
+        for entry in entries[:5]:
+            print(f"    {entry['employee_name']}: {entry['reasons'][0]['message']}")
+        if len(entries) > 5:
+            print(f"    ... and {len(entries) - 5} more")
+    
+    return flagged
+
+
+def run_pipeline(pdf_path: str, output_dir: Path, source_name: str, metrics: "RunMetrics",
+                 extractor=None, compact: bool = False, drop_nulls: bool = False,
+                 classifier=None, jurisdictions_path: str = None, text_cache=None,
+                 artifact_format: str = None) -> dict:
+    """
+    Run Steps 1-3 for one PDF and save extracted/interim/mapped JSON.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        output_dir: Directory to write pipeline outputs into
+        source_name: Source file name recorded in extracted.json
+        metrics: Run metrics shared by all steps
+        extractor: Optional pre-built Step 2 extractor (e.g. with a replay client)
+        classifier: Optional LabelClassifier for Step 3
+        jurisdictions_path: Optional jurisdiction overrides file for Step 3
+        text_cache: Optional PageTextCache for Step 1
+        artifact_format: Format of extracted/interim ("json" or binary "msgpack")
+    
+    Returns:
+        Summary with page and employee counts
+    """
+    pages = run_step1(pdf_path, output_dir, source_name, metrics, text_cache, artifact_format)
+    interim_data = run_step2(pages, output_dir, metrics, extractor, artifact_format)
+    mapped_data = run_step3(interim_data, output_dir, metrics, compact, drop_nulls, classifier,
+                            jurisdictions_path)
+    try:
+        run_analysis([(output_dir.name, mapped_data, output_dir)], metrics)
+    except Exception as e:
+        # Analysis is advisory: never fail an extraction whose outputs are already written
+        print(f"\n⚠ Anomaly detection failed: {e}")
+    
+    # ==========================================
+    # TODO: STEP 4: Validation
+    # ==========================================
+    print("\n" + "="*60)
+    print("Step 4: Coming next...")
+    print("="*60)
+    print("\n✓ Steps 1-3 completed successfully!")
+    print(f"✓ Output saved to: {output_dir}/")
+    
+    return {
+        "pages": len(pages),
+        "employees": len(interim_data.get('employees', [])),
+        "mapped_employees": len(mapped_data.get('employees', [])),
+    }
+
+
+def build_extractor(args, metrics: "RunMetrics"):
+    """Create the Step 2 extractor, wiring in record/replay clients if requested."""
+    from src.step2_raw_extraction import RawDataExtractor
+    from src.replay import RecordingClient, ReplayClient, parse_latency
+    
+    router = build_router(args)
+    wire_format = getattr(args, "wire_format", False)
+    if args.replay:
+        client = ReplayClient(args.replay, latency=parse_latency(args.replay_latency))
+        extractor = RawDataExtractor(metrics=metrics, client=client, router=router, wire_format=wire_format)
+    else:
+        extractor = RawDataExtractor(metrics=metrics, router=router, wire_format=wire_format)
+        if args.record:
+            extractor.client = RecordingClient(extractor.client, args.record)
+    
+    if args.hedge:
+        from src.hedging import HedgingClient
+        extractor.client = HedgingClient(extractor.client, percentile=args.hedge_percentile,
+                                         budget=args.hedge_budget, metrics=metrics)
+    
+    if getattr(args, "delta_from", None):
+        # Prior artifacts are read now, before Step 1 may overwrite them in the same folder
+        from src.delta import DeltaExtractor
+        try:
+            extractor = DeltaExtractor(extractor, Path(args.delta_from), metrics)
+        except FileNotFoundError as e:
+            log_error(f"--delta-from: {e}")
+            sys.exit(1)
+    return extractor
+
+
+def build_router(args):
+    """Create the Step 2 model router if --route was given."""
+    if not getattr(args, "route", False):
+        return None
+    from src.model_router import ModelRouter
+    return ModelRouter(strong_model=args.strong_model, threshold=args.route_threshold)
+
+
+def build_classifier(args, metrics: "RunMetrics", client=None):
+    """Create the Step 3 label classifier if --classify-labels was given."""
+    if not args.classify_labels:
+        return None
+    from src.label_classifier import LabelClassifier
+    return LabelClassifier(client=client, cache_path=Path(args.label_cache), metrics=metrics)
+
+
+def build_text_cache(args):
+    """Create the Step 1 text cache unless --no-text-cache was given."""
+    if args.no_text_cache:
+        return None
+    from src.text_cache import PageTextCache
+    return PageTextCache(Path(args.text_cache))
+
+
+# ==========================================
+# Commands
+# ==========================================
+
+def cmd_run(args):
+    """Run the full pipeline (Steps 1-3) on one PDF."""
+    from src.metrics import RunMetrics
+    
+    pdf_filename = args.pdf_filename
+    pdf_path = resolve_pdf_path(pdf_filename)
     base_name = Path(pdf_filename).stem
     
     # Create output directory for this PDF
@@ -81,117 +423,536 @@ def main():
     print(f"Output directory: {output_dir}")
     print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
+    metrics = RunMetrics(base_name)
+    
     try:
-        # ==========================================
-        # STEP 1: Extract text from PDF
-        # ==========================================
-        log_step(1, "PDF Text Extraction")
-        
-        pages = extract_text_from_pdf(pdf_path)
-        
-        if not pages:
-            log_error("No pages extracted from PDF")
-            sys.exit(1)
-        
-        log_success(f"Extracted {len(pages)} pages from PDF")
-        
-        # Save extracted pages
-        extracted_json_path = output_dir / "extracted.json"
-        with open(extracted_json_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                "source_file": pdf_filename,
-                "extraction_timestamp": datetime.now().isoformat(),
-                "total_pages": len(pages),
-                "pages": pages
-            }, f, indent=2, ensure_ascii=False)
-        log_success(f"Saved to: {extracted_json_path}")
-        
-        # Print page preview
-        print("\n  Page previews:")
-        for page in pages[:3]:  # Show first 3 pages
-            text_preview = page['text'][:80].replace('\n', ' ')
-            print(f"    Page {page['page_number']}: {text_preview}...")
-        
-        if len(pages) > 3:
-            print(f"    ... and {len(pages) - 3} more pages")
-        
-        # ==========================================
-        # STEP 2: Raw extraction (PASS 1)
-        # ==========================================
-        log_step(2, "Raw Data Extraction (PASS 1)")
-        
-        extractor = RawDataExtractor()
-        interim_data = extractor.extract_raw_data(pages)
-        
-        # Validate interim format
-        if not extractor.validate_interim_format(interim_data):
-            print("⚠ Warning: Extracted data may not have expected format")
-            print("  Continuing anyway...")
-        
-        log_success(f"Extracted data for {len(interim_data.get('employees', []))} employees")
-        
-        # Show extraction summary
-        if interim_data.get('report_metadata'):
-            meta = interim_data['report_metadata']
-            print(f"\n  Report: {meta.get('report_title', 'Unknown')}")
-            print(f"  Company: {meta.get('company_name', 'Unknown')}")
-            print(f"  Pay Period: {meta.get('pay_period_start', '?')} to {meta.get('pay_period_end', '?')}")
-        
-        if interim_data.get('employees'):
-            print(f"\n  Sample employee (first):")
-            emp = interim_data['employees'][0]
-            print(f"    Name: {emp.get('employee_name', 'Unknown')}")
-            print(f"    ID: {emp.get('employee_id', 'Unknown')}")
-            print(f"    Earnings: {len(emp.get('earnings', []))} lines")
-            print(f"    Deductions: {len(emp.get('deductions', []))} lines")
-            print(f"    Taxes: {len(emp.get('taxes', []))} lines")
-        
-        # Save interim JSON
-        interim_json_path = output_dir / "interim.json"
-        with open(interim_json_path, 'w', encoding='utf-8') as f:
-            json.dump(interim_data, f, indent=2, ensure_ascii=False)
-        log_success(f"Saved to: {interim_json_path}")
-        
-        # ==========================================
-        # STEP 3: Schema mapping (PASS 2)
-        # ==========================================
-        log_step(3, "Schema Mapping (PASS 2)")
-        
-        matcher = SchemaMatcher()
-        mapped_data = matcher.map_interim_to_schema(interim_data)
-        
-        log_success(f"Mapped {len(mapped_data.get('employees', []))} employees to global schema")
-        
-        # Show mapping summary
-        if mapped_data.get('employees'):
-            print(f"\n  Sample mapped employee:")
-            emp = mapped_data['employees'][0]
-            print(f"    Name: {emp['employee_info'].get('employee_name', 'Unknown')}")
-            print(f"    Earnings types: {len(emp.get('earnings', {}).get('earning_lines', []))} mapped")
-            print(f"    Deduction types: {len(emp.get('deductions', {}).get('deduction_lines', []))} mapped")
-            print(f"    Tax types: {len(emp.get('employee_taxes', {}).get('tax_lines', []))} mapped")
-        
-        # Save mapped JSON
-        mapped_json_path = output_dir / "mapped.json"
-        with open(mapped_json_path, 'w', encoding='utf-8') as f:
-            json.dump(mapped_data, f, indent=2, ensure_ascii=False)
-        log_success(f"Saved to: {mapped_json_path}")
-        
-        # ==========================================
-        # TODO: STEP 4: Validation
-        # ==========================================
-        print("\n" + "="*60)
-        print("Step 4: Coming next...")
-        print("="*60)
-        print("\n✓ Steps 1-3 completed successfully!")
-        print(f"✓ Output saved to: {output_dir}/")
-        
+        extractor = build_extractor(args, metrics)
+        classifier = build_classifier(args, metrics, extractor.client)
+        run_pipeline(pdf_path, output_dir, pdf_filename, metrics, extractor,
+                     compact=args.compact, drop_nulls=args.drop_nulls, classifier=classifier,
+                     jurisdictions_path=args.jurisdictions, text_cache=build_text_cache(args),
+                     artifact_format=args.artifact_format)
+        write_metrics(metrics, output_dir, args.prometheus)
+    
     except Exception as e:
         log_error(f"Pipeline failed: {e}")
+        write_metrics(metrics, output_dir, args.prometheus)
         import traceback
         traceback.print_exc()
         sys.exit(1)
 
 
+def cmd_extract_text(args):
+    """Step 1 only."""
+    from src.metrics import RunMetrics
+    
+    pdf_path = resolve_pdf_path(args.pdf_filename)
+    base_name = Path(args.pdf_filename).stem
+    output_dir = ensure_output_dir(base_name)
+    run_step1(pdf_path, output_dir, args.pdf_filename, RunMetrics(base_name), build_text_cache(args),
+              args.artifact_format)
+
+
+def cmd_extract_raw(args):
+    """Step 2 only, reading extracted.json."""
+    from src.metrics import RunMetrics
+    
+    extracted_path = Path(args.extracted_json)
+    data = load_json(extracted_path)
+    metrics = RunMetrics(extracted_path.parent.name)
+    extractor = build_extractor(args, metrics)
+    run_step2(data['pages'], extracted_path.parent, metrics, extractor, args.artifact_format)
+
+
+def cmd_map(args):
+    """Step 3 only, reading interim.json."""
+    from src.metrics import RunMetrics
+    
+    interim_path = Path(args.interim_json)
+    interim_data = load_json(interim_path)
+    metrics = RunMetrics(interim_path.parent.name)
+    run_step3(interim_data, interim_path.parent, metrics,
+              compact=args.compact, drop_nulls=args.drop_nulls,
+              classifier=build_classifier(args, metrics), jurisdictions_path=args.jurisdictions)
+
+
+def cmd_validate(args):
+    """Check the structure of interim.json."""
+    from src.step2_raw_extraction import validate_interim_format
+    
+    interim_data = load_json(Path(args.interim_json))
+    if not validate_interim_format(interim_data):
+        sys.exit(1)
+
+
+def cmd_rebuild(args):
+    """Rebuild stale stages across an outputs tree."""
+    from src.incremental import rebuild_tree
+    
+    results = rebuild_tree(Path(args.outputs_dir), jobs=args.jobs, dry_run=args.dry_run)
+    
+    failed = 0
+    for result in results:
+        if result["error"]:
+            failed += 1
+            log_error(f"{result['output_dir']}: {result['error']}")
+        elif result["actions"]:
+            print(f"{result['output_dir']}:")
+            for action in result["actions"]:
+                print(f"  - {action}")
+    
+    up_to_date = sum(1 for result in results if not result["actions"] and not result["error"])
+    verb = "would be rebuilt" if args.dry_run else "rebuilt"
+    log_success(f"{len(results) - up_to_date - failed} folders {verb}, {up_to_date} up to date, {failed} failed")
+    if failed:
+        sys.exit(1)
+
+
+def cmd_refine(args):
+    """Re-extract the weak lines of an already processed document."""
+    from src.metrics import RunMetrics
+    from src.refinement import SelectiveRefiner
+    from src.compact_output import load_mapped
+    from src.artifacts import write_artifact, write_mapped_artifact
+    
+    output_dir = Path(args.output_dir)
+    extracted = load_json(output_dir / "extracted.json")
+    interim_data = load_json(output_dir / "interim.json")
+    mapped_path = output_dir / "mapped.json"
+    if not mapped_path.exists():
+        log_error(f"File not found: {mapped_path}")
+        sys.exit(1)
+    mapped_data = load_mapped(mapped_path)
+    
+    metrics = RunMetrics(output_dir.name)
+    config = (mapped_data.get("build") or {}).get("config") or {}
+    # Re-map refined employees the way mapped.json was built (label cache lookups only)
+    from src.step3_schema_mapping import matcher_from_config
+    matcher = matcher_from_config(config, metrics)
+    refiner = SelectiveRefiner(build_extractor(args, metrics), threshold=args.threshold, matcher=matcher)
+    
+    try:
+        report = refiner.refine(extracted['pages'], interim_data, mapped_data)
+    except ValueError as e:
+        log_error(str(e))
+        sys.exit(1)
+    
+    if report["employees_refined"]:
+        # Patched interim lines keep the refinement if Step 3 is re-run later
+        write_artifact(output_dir / "interim.json", interim_data)
+        write_mapped_artifact(mapped_path, mapped_data, interim_data, config)
+    
+    report_path = output_dir / "refinement.json"
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    
+    metrics.print_summary()
+    share = report["snippet_chars"] / report["document_chars"] if report["document_chars"] else 0.0
+    log_success(f"{report['weak_lines']} weak lines, {report['lines_changed']} changed "
+                f"across {report['employees_refined']} employees ({share:.0%} of the document text sent)")
+    log_success(f"Report saved to: {report_path}")
+
+
+def cmd_diff(args):
+    """Compare two processed documents employee by employee."""
+    from src.mapped_diff import RegisterDiff, print_diff
+    
+    paths = []
+    for target in (args.old, args.new):
+        mapped_path = Path(target)
+        if mapped_path.is_dir():
+            mapped_path = mapped_path / "mapped.json"
+        if not mapped_path.exists():
+            log_error(f"File not found: {mapped_path}")
+            sys.exit(1)
+        paths.append(mapped_path)
+    
+    report = RegisterDiff(threshold=args.threshold, percent=args.percent).diff(*paths)
+    print_diff(report, limit=args.limit)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        log_success(f"Saved to: {args.output}")
+
+
+def cmd_analyze(args):
+    """Anomaly detection over one or more processed documents."""
+    from src.metrics import RunMetrics
+    from src.compact_output import load_mapped
+    
+    documents = []
+    for target in args.targets:
+        mapped_path = Path(target)
+        if mapped_path.is_dir():
+            mapped_path = mapped_path / "mapped.json"
+        if not mapped_path.exists():
+            log_error(f"File not found: {mapped_path}")
+            sys.exit(1)
+        documents.append((mapped_path.parent.name, load_mapped(mapped_path), mapped_path.parent))
+    
+    try:
+        from src.anomalies import AnomalyDetector
+    except ImportError:
+        log_error("Anomaly detection requires NumPy (pip install numpy)")
+        sys.exit(1)
+    
+    metrics = RunMetrics(documents[0][0] if len(documents) == 1 else None)
+    detector = AnomalyDetector(z_threshold=args.z_threshold, iqr_factor=args.iqr_factor,
+                               min_group_size=args.min_group_size, metrics=metrics)
+    run_analysis(documents, metrics, detector)
+
+
+def cmd_queue_submit(args):
+    """Queue PDFs for distributed processing."""
+    from src.job_queue import JobQueue
+    from src.step2_raw_extraction import DEFAULT_MODEL
+    
+    queue = JobQueue(Path(args.db))
+    mapped_config = {"compact": True, "drop_nulls": args.drop_nulls} if args.compact else {}
+    if args.classify_labels:
+        mapped_config.update({"classify_labels": True, "label_cache": args.label_cache})
+    if args.jurisdictions:
+        mapped_config["jurisdictions"] = args.jurisdictions
+    interim_config = {"model": DEFAULT_MODEL}
+    router = build_router(args)
+    if router:
+        # Workers build the same router from this, and it goes into the interim build record
+        interim_config["routing"] = router.config()
+    if args.wire_format:
+        interim_config["wire_format"] = True
+    config = {"interim": interim_config, "mapped": mapped_config,
+              "artifact_format": args.artifact_format}
+    
+    for pdf_filename in args.pdf_filenames:
+        pdf_path = Path(resolve_pdf_path(pdf_filename)).resolve()
+        document = pdf_path.stem
+        output_dir = (Path("./outputs") / document).resolve()
+        if queue.submit(document, pdf_path, output_dir, config, max_attempts=args.max_attempts):
+            log_success(f"Queued {document}")
+        else:
+            print(f"⚠ {document} is already queued")
+
+
+def cmd_queue_work(args):
+    """Run a worker that pulls Step 1/2/3 jobs from the queue."""
+    from src.job_queue import JobQueue, Worker
+    
+    queue = JobQueue(Path(args.db), lease_seconds=args.lease)
+    worker = Worker(queue, lambda metrics: build_extractor(args, metrics), worker_id=args.worker_id,
+                    kinds=args.kinds)
+    processed = worker.run(max_jobs=args.max_jobs, idle_timeout=args.idle_timeout)
+    log_success(f"Worker {worker.worker_id}: {processed} jobs ({worker.completed} committed, {worker.failed} failed)")
+    worker.metrics.print_summary()
+
+
+def cmd_queue_coordinate(args):
+    """Assemble per-document interim.json and track documents to completion."""
+    from src.job_queue import Coordinator, JobQueue
+    
+    queue = JobQueue(Path(args.db))
+    status = Coordinator(queue).run(until_done=not args.once)
+    print(json.dumps(status, indent=2))
+    if status["documents"].get("failed"):
+        sys.exit(1)
+
+
+def cmd_queue_status(args):
+    """Print document and job counts per state."""
+    from src.job_queue import JobQueue
+    
+    queue = JobQueue(Path(args.db))
+    print(json.dumps(queue.status(), indent=2))
+    for info in queue.documents():
+        line = f"  {info['document']}: {info['state']}"
+        if info["total_pages"] is not None:
+            pages = queue.job_states(info["document"], "page")
+            line += f" ({pages.get('done', 0)}/{info['total_pages']} pages)"
+        if info["error"]:
+            line += f" - {info['error']}"
+        print(line)
+
+
+def cmd_serve(args):
+    """Run the local HTTP service (Steps 1-3 on uploaded PDFs, warm between requests)."""
+    from src.metrics import RunMetrics
+    from src.service import PipelineService, serve
+    from src.step2_raw_extraction import DEFAULT_MODEL
+    
+    if args.stub_llm:
+        from src.replay import StubClient
+        client = StubClient(args.stub_response, latency=args.stub_latency)
+        log_success("Using the stub LLM backend")
+    else:
+        # Built once: the connection pool (and hedging statistics) stay warm across jobs
+        client = build_extractor(args, RunMetrics("service")).client
+    
+    mapped_config = {"compact": True, "drop_nulls": args.drop_nulls} if args.compact else {}
+    if args.jurisdictions:
+        mapped_config["jurisdictions"] = args.jurisdictions
+    
+    service = PipelineService(
+        client,
+        model=DEFAULT_MODEL,
+        router_factory=(lambda: build_router(args)) if args.route else None,
+        output_root=Path(args.output_root),
+        mapped_config=mapped_config,
+        artifact_format=args.artifact_format,
+        wire_format=args.wire_format,
+        text_cache=build_text_cache(args),
+        job_workers=args.job_workers,
+        pdf_workers=args.pdf_workers,
+        llm_concurrency=args.llm_concurrency,
+        max_pending=args.max_pending,
+        max_upload_bytes=int(args.max_upload_mb * 1024 * 1024),
+    )
+    serve(service, args.host, args.port)
+
+
+def add_artifact_options(parser: argparse.ArgumentParser):
+    """Storage format of the intermediate artifacts (extracted, interim)."""
+    parser.add_argument("--artifact-format", choices=["json", "msgpack"],
+                        help="Write extracted/interim as JSON or as binary MessagePack+zstd "
+                             "(<name>.msgpack.zst; needs msgpack and zstandard). "
+                             "Default: keep the existing artifact's format, else JSON")
+
+
+def add_llm_options(parser: argparse.ArgumentParser):
+    """Options shared by the commands that call Step 2."""
+    replay_group = parser.add_mutually_exclusive_group()
+    replay_group.add_argument("--record", metavar="DIR",
+                              help="Record Step 2 LLM calls into a cassette directory")
+    replay_group.add_argument("--replay", metavar="DIR",
+                              help="Replay Step 2 LLM calls from a cassette directory (no API key needed)")
+    parser.add_argument("--replay-latency", metavar="SECONDS",
+                        help='Simulated latency per replayed call: seconds or "recorded"')
+    parser.add_argument("--hedge", action="store_true",
+                        help="Send a duplicate LLM request when a call runs unusually long (see --hedge-percentile)")
+    parser.add_argument("--hedge-percentile", type=float, default=0.95, metavar="FRACTION",
+                        help="Observed-latency percentile after which a call is hedged (default: 0.95)")
+    parser.add_argument("--hedge-budget", type=float, default=0.1, metavar="RATE",
+                        help="Maximum duplicate requests as a fraction of all requests (default: 0.1)")
+
+
+def add_text_cache_options(parser: argparse.ArgumentParser):
+    """Options controlling the Step 1 text cache."""
+    parser.add_argument("--text-cache", metavar="DIR", default="./outputs/.text_cache",
+                        help="Step 1 page text cache directory (default: ./outputs/.text_cache)")
+    parser.add_argument("--no-text-cache", action="store_true",
+                        help="Always parse the PDF, without reading or writing the text cache")
+
+
+def add_routing_options(parser: argparse.ArgumentParser):
+    """Options controlling Step 2 model routing."""
+    parser.add_argument("--route", action="store_true",
+                        help="Send easy pages to the fast model and hard pages to a stronger one, "
+                             "escalating on truncation or parse failure")
+    parser.add_argument("--strong-model", metavar="MODEL", default="claude-3-5-sonnet-20241022",
+                        help="Model for hard pages and escalations (default: claude-3-5-sonnet-20241022)")
+    parser.add_argument("--route-threshold", type=float, default=0.6, metavar="SCORE",
+                        help="Page complexity score (0-1) at which pages go to the strong model (default: 0.6)")
+
+
+def add_wire_options(parser: argparse.ArgumentParser):
+    """Options controlling the Step 2 response format."""
+    parser.add_argument("--wire-format", action="store_true",
+                        help="Have the model answer in the compact positional wire format "
+                             "(fewer output tokens, fewer truncations; expanded to the usual interim.json)")
+
+
+def add_delta_options(parser: argparse.ArgumentParser):
+    """Options for extracting only what changed since a prior run."""
+    parser.add_argument("--delta-from", metavar="DIR",
+                        help="Output folder of a prior run of the same register (e.g. last week's): "
+                             "reuse its extraction for employee blocks whose text only changed in its "
+                             "numbers and send only new or changed blocks to the LLM")
+
+
+def add_output_options(parser: argparse.ArgumentParser):
+    """Options controlling how mapped.json is written."""
+    parser.add_argument("--compact", action="store_true",
+                        help="Write mapped.json without schema boilerplate, non-indented")
+    parser.add_argument("--drop-nulls", action="store_true",
+                        help="With --compact, also drop null values")
+
+
+def add_mapping_options(parser: argparse.ArgumentParser):
+    """Options controlling Step 3 label matching."""
+    parser.add_argument("--classify-labels", action="store_true",
+                        help="Classify descriptions no alias matches with one batched LLM call (cached)")
+    parser.add_argument("--label-cache", metavar="PATH", default="./outputs/label_cache.json",
+                        help="Label classification cache (default: ./outputs/label_cache.json)")
+    parser.add_argument("--jurisdictions", metavar="PATH",
+                        help="JSON file of per-client tax jurisdiction overrides (see src/jurisdictions.py)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(description="Payroll data extraction pipeline")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    run_parser = subparsers.add_parser("run", help="Run Steps 1-3 on a PDF")
+    run_parser.add_argument("pdf_filename", help="PDF path or file name in sample_pdfs/")
+    run_parser.add_argument("--prometheus", action="store_true",
+                            help="Also write metrics.prom in Prometheus text format")
+    add_text_cache_options(run_parser)
+    add_llm_options(run_parser)
+    add_routing_options(run_parser)
+    add_wire_options(run_parser)
+    add_delta_options(run_parser)
+    add_output_options(run_parser)
+    add_mapping_options(run_parser)
+    add_artifact_options(run_parser)
+    run_parser.set_defaults(handler=cmd_run)
+    
+    text_parser = subparsers.add_parser("extract-text", help="Step 1: PDF -> extracted.json")
+    text_parser.add_argument("pdf_filename", help="PDF path or file name in sample_pdfs/")
+    add_text_cache_options(text_parser)
+    add_artifact_options(text_parser)
+    text_parser.set_defaults(handler=cmd_extract_text)
+    
+    raw_parser = subparsers.add_parser("extract-raw", help="Step 2: extracted.json -> interim.json")
+    raw_parser.add_argument("extracted_json", help="Path to extracted.json (or extracted.msgpack.zst)")
+    add_llm_options(raw_parser)
+    add_routing_options(raw_parser)
+    add_wire_options(raw_parser)
+    add_delta_options(raw_parser)
+    add_artifact_options(raw_parser)
+    raw_parser.set_defaults(handler=cmd_extract_raw)
+    
+    map_parser = subparsers.add_parser("map", help="Step 3: interim.json -> mapped.json")
+    map_parser.add_argument("interim_json", help="Path to interim.json (or interim.msgpack.zst)")
+    add_output_options(map_parser)
+    add_mapping_options(map_parser)
+    map_parser.set_defaults(handler=cmd_map)
+    
+    validate_parser = subparsers.add_parser("validate", help="Check interim.json structure")
+    validate_parser.add_argument("interim_json", help="Path to interim.json (or interim.msgpack.zst)")
+    validate_parser.set_defaults(handler=cmd_validate)
+    
+    rebuild_parser = subparsers.add_parser("rebuild", help="Incrementally rebuild stale stages under an outputs tree")
+    rebuild_parser.add_argument("outputs_dir", nargs="?", default="./outputs", help="Outputs root (default: ./outputs)")
+    rebuild_parser.add_argument("--jobs", "-j", type=int, default=1, help="Folders to rebuild in parallel")
+    rebuild_parser.add_argument("--dry-run", action="store_true", help="Only list the stages that are stale")
+    rebuild_parser.set_defaults(handler=cmd_rebuild)
+    
+    refine_parser = subparsers.add_parser("refine", help="Re-extract only low-confidence lines of a processed PDF")
+    refine_parser.add_argument("output_dir", help="Folder with extracted/interim/mapped JSON")
+    refine_parser.add_argument("--threshold", type=float, default=0.5,
+                               help="Refine lines whose type or amount confidence is below this (default: 0.5)")
+    add_llm_options(refine_parser)
+    refine_parser.set_defaults(handler=cmd_refine)
+    
+    diff_parser = subparsers.add_parser("diff", help="Compare two processed PDFs (e.g. last week's and this week's)")
+    diff_parser.add_argument("old", help="Older output folder or mapped.json")
+    diff_parser.add_argument("new", help="Newer output folder or mapped.json")
+    diff_parser.add_argument("--threshold", default="0.01",
+                             help="Smallest amount change reported (default: 0.01)")
+    diff_parser.add_argument("--percent", type=float,
+                             help="Also require a change of at least this percent of the old amount")
+    diff_parser.add_argument("--output", metavar="PATH", help="Write the full diff as JSON")
+    diff_parser.add_argument("--limit", type=int, default=20,
+                             help="Employees listed per section on screen (default: 20)")
+    diff_parser.set_defaults(handler=cmd_diff)
+    
+    analyze_parser = subparsers.add_parser("analyze", help="Flag outlier employees in processed PDFs (NumPy)")
+    analyze_parser.add_argument("targets", nargs="+", metavar="output_dir|mapped.json",
+                                help="Processed documents; the same company's documents share statistics")
+    analyze_parser.add_argument("--z-threshold", type=float, default=3.5,
+                                help="|z-score| at which a value is an outlier (default: 3.5)")
+    analyze_parser.add_argument("--iqr-factor", type=float, default=3.0,
+                                help="IQR multiple beyond the quartiles that is an outlier (default: 3.0)")
+    analyze_parser.add_argument("--min-group-size", type=int, default=5,
+                                help="Smallest company/department that is scored (default: 5)")
+    analyze_parser.set_defaults(handler=cmd_analyze)
+    
+    queue_parser = subparsers.add_parser("queue", help="Distribute Steps 1-3 over worker processes or nodes")
+    queue_commands = queue_parser.add_subparsers(dest="queue_command", required=True)
+    
+    submit_parser = queue_commands.add_parser("submit", help="Queue PDFs")
+    submit_parser.add_argument("pdf_filenames", nargs="+", help="PDF paths or file names in sample_pdfs/")
+    submit_parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per job before it fails")
+    add_routing_options(submit_parser)
+    add_wire_options(submit_parser)
+    add_output_options(submit_parser)
+    add_mapping_options(submit_parser)
+    add_artifact_options(submit_parser)
+    submit_parser.set_defaults(handler=cmd_queue_submit)
+    
+    work_parser = queue_commands.add_parser("work", help="Run a worker")
+    work_parser.add_argument("--worker-id", help="Lease owner name (default: host:pid:random)")
+    work_parser.add_argument("--kinds", nargs="+", choices=["extract", "page", "map"],
+                             help="Only take these job kinds (default: all)")
+    work_parser.add_argument("--max-jobs", type=int, help="Exit after this many jobs")
+    work_parser.add_argument("--idle-timeout", type=float, default=5.0,
+                             help="Exit after this many seconds without work (default: 5)")
+    work_parser.add_argument("--lease", type=float, default=120.0,
+                             help="Lease length in seconds, renewed by heartbeats (default: 120)")
+    add_llm_options(work_parser)
+    work_parser.set_defaults(handler=cmd_queue_work)
+    
+    coordinate_parser = queue_commands.add_parser("coordinate", help="Assemble interim.json and track documents")
+    coordinate_parser.add_argument("--once", action="store_true", help="Advance documents once and exit")
+    coordinate_parser.set_defaults(handler=cmd_queue_coordinate)
+    
+    status_parser = queue_commands.add_parser("status", help="Show queue progress")
+    status_parser.set_defaults(handler=cmd_queue_status)
+    
+    for sub in (submit_parser, work_parser, coordinate_parser, status_parser):
+        sub.add_argument("--db", default="./outputs/queue.db", help="Queue database (default: ./outputs/queue.db)")
+    
+    serve_parser = subparsers.add_parser("serve", help="Run a local HTTP service that processes uploaded PDFs")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    serve_parser.add_argument("--output-root", default="./outputs/service",
+                              help="Per-job artifact folders (default: ./outputs/service)")
+    serve_parser.add_argument("--job-workers", type=int, default=4, help="Documents processed at once (default: 4)")
+    serve_parser.add_argument("--pdf-workers", type=int, default=2, help="PyMuPDF worker processes (default: 2)")
+    serve_parser.add_argument("--llm-concurrency", type=int, default=8,
+                              help="LLM calls in flight across all jobs (default: 8)")
+    serve_parser.add_argument("--max-pending", type=int, default=64,
+                              help="Queued plus running jobs before uploads get 503 (default: 64)")
+    serve_parser.add_argument("--max-upload-mb", type=float, default=50, help="Largest accepted PDF (default: 50)")
+    serve_parser.add_argument("--stub-llm", action="store_true",
+                              help="Answer LLM calls with a canned response (no API key; for testing)")
+    serve_parser.add_argument("--stub-response", metavar="PATH",
+                              help="With --stub-llm, JSON page response to return (default: no employees)")
+    serve_parser.add_argument("--stub-latency", type=float, default=0.0, metavar="SECONDS",
+                              help="With --stub-llm, simulated seconds per call")
+    serve_parser.add_argument("--jurisdictions", metavar="PATH",
+                              help="JSON file of per-client tax jurisdiction overrides (see src/jurisdictions.py)")
+    add_text_cache_options(serve_parser)
+    add_llm_options(serve_parser)
+    add_routing_options(serve_parser)
+    add_wire_options(serve_parser)
+    add_output_options(serve_parser)
+    add_artifact_options(serve_parser)
+    serve_parser.set_defaults(handler=cmd_serve)
+    
+    return parser
+
+
+def main(argv=None):
+    """Main orchestration function."""
+    argv = sys.argv[1:] if argv is None else argv
+    
+    # Backwards compatible shorthand: `main.py <pdf>` means `main.py run <pdf>`
+    if argv and argv[0] not in COMMANDS and not argv[0].startswith("-"):
+        argv = ["run"] + argv
+    
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    if not args.command:
+        parser.print_help()
+        print("\nAvailable PDFs in sample_pdfs/:")
+        sample_pdfs = list(Path("./sample_pdfs").glob("*.pdf"))
+        for pdf in sample_pdfs:
+            print(f"  - {pdf.name}")
+        sys.exit(1)
+    
+    args.handler(args)
+
+
 if __name__ == "__main__":
     main()
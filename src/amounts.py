@@ -0,0 +1,66 @@
+"""
+Amount parsing helpers.
+Converts raw amounts as extracted from payroll PDFs ("1,234.56", "(5.50)",
+"-5.50", "$12.00", numbers) into exact Decimal values.
+"""
+
+from decimal import Decimal, InvalidOperation
+from typing import Any, Optional
+
+
+def to_decimal(value: Any) -> Optional[Decimal]:
+    """
+    Convert a raw amount to Decimal.
+
+    Args:
+        value: Raw amount (number, numeric string, or None)
+
+    Returns:
+        Decimal value, or None if the value is missing or not numeric
+
+    Example:
+        to_decimal("1,234.56") -> Decimal("1234.56")
+        to_decimal("(5.50)")   -> Decimal("-5.50")
+    """
+    if value is None or isinstance(value, bool):
+        return None
+
+    if isinstance(value, int):
+        return Decimal(value)
+
+    if isinstance(value, float):
+        # repr() gives the shortest round-tripping form, so 0.1 stays 0.1
+        return Decimal(repr(value))
+
+    if not isinstance(value, str):
+        return None
+
+    text = value.strip().replace(",", "").replace("$", "").replace(" ", "")
+    if not text:
+        return None
+
+    negative = False
+    if text.startswith("(") and text.endswith(")"):
+        negative = True
+        text = text[1:-1]
+    elif text.endswith("-"):
+        # Some registers print trailing minus signs: "5.50-"
+        negative = True
+        text = text[:-1]
+
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+
+    if not amount.is_finite():
+        return None
+
+    return -amount if negative else amount
+
+
+def decimal_to_json(value: Optional[Decimal]) -> Optional[float]:
+    """Convert an exact Decimal sum to a JSON-serializable number."""
+    if value is None:
+        return None
+    return float(value)
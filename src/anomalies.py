@@ -0,0 +1,359 @@
+"""
+Anomaly Detection
+Flags mapped employees whose figures are plausible-looking but out of line
+with their peers (e.g. net pay 100x the department's, a tax rate far off for
+the gross) or internally impossible (current above year-to-date).
+Output: anomalies.json next to mapped.json, listing flagged employees with reasons
+
+Employees are flattened once into NumPy columns (current-period gross, taxes,
+deductions, net pay and their YTD values); every check after that is
+vectorized over all employees at once.
+
+Checks:
+    current_exceeds_ytd - a current amount larger than its YTD amount
+    tax_rate_range      - effective tax rate (taxes / gross) outside 0-60%
+    net_exceeds_gross   - net pay above gross pay
+    zscore              - |z| >= z_threshold within the company or department
+    iqr                 - outside [Q1 - k*IQR, Q3 + k*IQR] within the company or department
+
+Peer statistics cover net pay and gross pay (on a log10 scale, so "100x" is a
+fixed distance regardless of pay level), the effective tax rate and the
+deduction ratio (deductions / gross). Groups smaller than min_group_size are
+not scored. Companies are keyed by the report's company name (or the document
+name when it has none), departments by company and department.
+
+Requires NumPy (pip install numpy).
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.amounts import to_decimal
+from src.metrics import RunMetrics
+
+STAGE = "anomaly_detection"
+
+DEFAULT_Z_THRESHOLD = 3.5
+DEFAULT_IQR_FACTOR = 3.0
+DEFAULT_MIN_GROUP_SIZE = 5
+MAX_TAX_RATE = 0.6
+
+# Amount columns: (name, employee_totals key, line list key, line amount key)
+AMOUNTS = [
+    ("gross_pay", "gross_pay", ("earnings", "earning_lines"), "amount"),
+    ("taxes", "total_employee_taxes", ("employee_taxes", "tax_lines"), "tax_amount"),
+    ("deductions", "total_deductions", ("deductions", "deduction_lines"), "amount"),
+    ("net_pay", "net_pay", None, None),
+]
+
+# Metrics scored against peers: name -> (log scale, minimum IQR spread)
+# The spread floor keeps a group of identical values from flagging every
+# cent of difference (0.05 in log10 is about 12%).
+PEER_METRICS = {
+    "net_pay": (True, 0.05),
+    "gross_pay": (True, 0.05),
+    "effective_tax_rate": (False, 0.02),
+    "deduction_ratio": (False, 0.02),
+}
+
+SCOPES = ("company", "department")
+
+
+def _number(value) -> float:
+    """A mapped amount as float (NaN when missing or not numeric)."""
+    if value.__class__ is float or value.__class__ is int:
+        return float(value)
+    amount = to_decimal(value)
+    return float(amount) if amount is not None else math.nan
+
+
+def _line_sum(lines: List[Dict], amount_key: str, period: str) -> float:
+    """Sum of one period's line amounts (NaN if no line has one)."""
+    total = math.nan
+    for line in lines:
+        value = _number((line.get(amount_key) or {}).get(period))
+        if value == value:
+            total = value if total != total else total + value
+    return total
+
+
+def company_name(mapped: Dict, default: str) -> str:
+    """Company a mapped document belongs to."""
+    employer = mapped.get('metadata', {}).get('report_metadata', {}).get('employer_info', {})
+    return employer.get('company_name') or default
+
+
+class EmployeeArrays:
+    """Column arrays over the employees of one or more mapped documents."""
+
+    def __init__(self, documents: Iterable[Tuple[str, Dict]]):
+        """
+        Args:
+            documents: (document name, mapped data) pairs
+        """
+        columns = {f"{name}_{period}": [] for name, *_ in AMOUNTS for period in ("current", "ytd")}
+        self.rows: List[Tuple[str, int, Dict]] = []  # (document, employee index, employee)
+        company_ids: Dict[str, int] = {}
+        department_ids: Dict[Tuple[str, str], int] = {}
+        companies, departments = [], []
+
+        for document, mapped in documents:
+            company = company_name(mapped, document)
+            company_id = company_ids.setdefault(company, len(company_ids))
+            for index, emp in enumerate(mapped.get('employees', [])):
+                self.rows.append((document, index, emp))
+                totals = emp.get('employee_totals') or {}
+                for name, totals_key, lines_path, amount_key in AMOUNTS:
+                    block = totals.get(totals_key) or {}
+                    lines = None
+                    for period in ("current", "ytd"):
+                        value = _number(block.get(period))
+                        if value != value and lines_path is not None:
+                            # No totals row: fall back to the line items
+                            if lines is None:
+                                lines = (emp.get(lines_path[0]) or {}).get(lines_path[1]) or []
+                            value = _line_sum(lines, amount_key, period)
+                        columns[f"{name}_{period}"].append(value)
+
+                department = (emp.get('employee_info') or {}).get('department')
+                companies.append(company_id)
+                if department in (None, ""):
+                    departments.append(-1)
+                else:
+                    key = (company, str(department))
+                    departments.append(department_ids.setdefault(key, len(department_ids)))
+
+        self.columns = {name: np.array(values, dtype=np.float64) for name, values in columns.items()}
+        self.groups = {
+            "company": np.array(companies, dtype=np.int64),
+            "department": np.array(departments, dtype=np.int64),
+        }
+        self.group_names = {
+            "company": list(company_ids),
+            "department": [f"{company} / {department}" for company, department in department_ids],
+        }
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def derived(self) -> Dict[str, np.ndarray]:
+        """Current-period ratios to gross pay (NaN where gross is missing or not positive)."""
+        gross = self.columns["gross_pay_current"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            safe_gross = np.where(gross > 0, gross, np.nan)
+            return {
+                "effective_tax_rate": self.columns["taxes_current"] / safe_gross,
+                "deduction_ratio": self.columns["deductions_current"] / safe_gross,
+                "net_ratio": self.columns["net_pay_current"] / safe_gross,
+            }
+
+
+def group_statistics(values: np.ndarray, groups: np.ndarray, group_count: int) -> Dict[str, np.ndarray]:
+    """
+    Per-group count, mean, sample standard deviation and quartiles, ignoring NaN
+    values and rows with a negative group id.
+
+    Returns:
+        {"count", "mean", "std", "q1", "median", "q3"}, each of length group_count
+    """
+    valid = ~np.isnan(values) & (groups >= 0)
+    v, g = values[valid], groups[valid]
+    count = np.bincount(g, minlength=group_count)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.bincount(g, weights=v, minlength=group_count) / count
+        deviation = v - mean[g]
+        variance = np.bincount(g, weights=deviation * deviation, minlength=group_count) / (count - 1)
+    std = np.sqrt(np.where(count > 1, variance, np.nan))
+
+    # Sort by group, then value; each group's values are then one contiguous run
+    ordered = v[np.lexsort((v, g))]
+    starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+
+    def quantile(q: float) -> np.ndarray:
+        position = starts + q * np.maximum(count - 1, 0)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        result = np.full(group_count, np.nan)
+        present = count > 0
+        fraction = position[present] - low[present]
+        result[present] = ordered[low[present]] * (1 - fraction) + ordered[high[present]] * fraction
+        return result
+
+    return {"count": count, "mean": mean, "std": std,
+            "q1": quantile(0.25), "median": quantile(0.5), "q3": quantile(0.75)}
+
+
+class AnomalyDetector:
+    """Vectorized rule and peer-outlier checks over mapped employees."""
+
+    def __init__(self, z_threshold: float = DEFAULT_Z_THRESHOLD, iqr_factor: float = DEFAULT_IQR_FACTOR,
+                 min_group_size: int = DEFAULT_MIN_GROUP_SIZE, metrics: Optional[RunMetrics] = None):
+        """
+        Args:
+            z_threshold: |z-score| at or above which a value is an outlier
+            iqr_factor: IQR multiple beyond the quartiles at which a value is an outlier
+            min_group_size: Smallest company/department that gets peer statistics
+            metrics: Optional run metrics
+        """
+        self.z_threshold = z_threshold
+        self.iqr_factor = iqr_factor
+        self.min_group_size = min_group_size
+        self.metrics = metrics or RunMetrics()
+
+    def config(self) -> Dict:
+        return {"z_threshold": self.z_threshold, "iqr_factor": self.iqr_factor,
+                "min_group_size": self.min_group_size}
+
+    def detect(self, documents: Iterable[Tuple[str, Dict]]) -> Dict[str, List[Dict]]:
+        """
+        Check the employees of one or more mapped documents together.
+
+        Args:
+            documents: (document name, mapped data) pairs; documents of the same
+                       company share peer statistics
+
+        Returns:
+            Document name -> flagged employees, each
+            {"employee_index", "employee_name", "employee_id", "company", "department", "reasons"}
+        """
+        with self.metrics.stage(STAGE) as stage_info:
+            arrays = EmployeeArrays(documents)
+            reasons: Dict[int, List[Dict]] = {}
+            if len(arrays):
+                self._rule_checks(arrays, reasons)
+                self._peer_checks(arrays, reasons)
+            flagged = self._flagged(arrays, reasons)
+            stage_info["employees"] = len(arrays)
+            stage_info["flagged"] = len(reasons)
+        self.metrics.increment("anomalies", len(reasons))
+        return flagged
+
+    def _rule_checks(self, arrays: EmployeeArrays, reasons: Dict[int, List[Dict]]):
+        columns = arrays.columns
+        for name, *_ in AMOUNTS:
+            current, ytd = columns[f"{name}_current"], columns[f"{name}_ytd"]
+            # Compare magnitudes with a cent of tolerance; NaN compares False
+            hits = np.abs(current) > np.abs(ytd) + 0.01
+            for row in np.flatnonzero(hits):
+                reasons.setdefault(int(row), []).append({
+                    "check": "current_exceeds_ytd", "metric": name,
+                    "value": float(current[row]), "expected": float(ytd[row]),
+                    "message": f"{name} current {current[row]:,.2f} exceeds YTD {ytd[row]:,.2f}",
+                })
+
+        derived = arrays.derived()
+        rate = derived["effective_tax_rate"]
+        for row in np.flatnonzero((rate < 0) | (rate > MAX_TAX_RATE)):
+            reasons.setdefault(int(row), []).append({
+                "check": "tax_rate_range", "metric": "effective_tax_rate", "value": round(float(rate[row]), 4),
+                "message": f"effective tax rate {rate[row]:.1%} is outside 0-{MAX_TAX_RATE:.0%}",
+            })
+
+        net_ratio = derived["net_ratio"]
+        for row in np.flatnonzero(net_ratio > 1.0001):
+            reasons.setdefault(int(row), []).append({
+                "check": "net_exceeds_gross", "metric": "net_pay", "value": float(columns["net_pay_current"][row]),
+                "expected": float(columns["gross_pay_current"][row]),
+                "message": (f"net pay {columns['net_pay_current'][row]:,.2f} exceeds gross pay "
+                            f"{columns['gross_pay_current'][row]:,.2f}"),
+            })
+
+    def _peer_checks(self, arrays: EmployeeArrays, reasons: Dict[int, List[Dict]]):
+        derived = arrays.derived()
+        for metric, (log_scale, min_spread) in PEER_METRICS.items():
+            raw = derived[metric] if metric in derived else arrays.columns[f"{metric}_current"]
+            if log_scale:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    values = np.where(raw > 0, np.log10(raw), np.nan)
+            else:
+                values = raw
+
+            for scope in SCOPES:
+                if not arrays.group_names[scope]:
+                    continue  # e.g. no employee has a department
+                groups = arrays.groups[scope]
+                stats = group_statistics(values, groups, len(arrays.group_names[scope]))
+                scored = groups >= 0
+                row_group = np.where(scored, groups, 0)
+                scored &= ~np.isnan(values) & (stats["count"][row_group] >= self.min_group_size)
+
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    z = (values - stats["mean"][row_group]) / stats["std"][row_group]
+                spread = np.maximum(stats["q3"] - stats["q1"], min_spread)[row_group]
+                low = stats["q1"][row_group] - self.iqr_factor * spread
+                high = stats["q3"][row_group] + self.iqr_factor * spread
+
+                z_hits = scored & (np.abs(z) >= self.z_threshold)
+                iqr_hits = scored & ((values < low) | (values > high))
+                for row in np.flatnonzero(z_hits | iqr_hits):
+                    group = int(row_group[row])
+                    median = stats["median"][group]
+                    reasons.setdefault(int(row), []).append(self._peer_reason(
+                        metric, scope, arrays.group_names[scope][group], float(raw[row]),
+                        10 ** median if log_scale else median, float(z[row]),
+                        bool(z_hits[row]), bool(iqr_hits[row]), log_scale,
+                    ))
+
+    def _peer_reason(self, metric: str, scope: str, group: str, value: float, median: float,
+                     z: float, z_hit: bool, iqr_hit: bool, log_scale: bool) -> Dict:
+        checks = [name for name, hit in (("zscore", z_hit), ("iqr", iqr_hit)) if hit]
+        if log_scale:
+            described = f"{value:,.2f} is {value / median:.3g}x the {scope} median ({median:,.2f})"
+        else:
+            described = f"{value:.1%} vs. a {scope} median of {median:.1%}"
+        return {
+            "check": "+".join(checks), "metric": metric, "scope": scope, "group": group,
+            "value": round(value, 6), "expected": round(float(median), 6),
+            "zscore": round(z, 2) if z == z else None,
+            "message": f"{metric} {described}, z={z:.1f}",
+        }
+
+    def _flagged(self, arrays: EmployeeArrays, reasons: Dict[int, List[Dict]]) -> Dict[str, List[Dict]]:
+        flagged: Dict[str, List[Dict]] = {}
+        company_names = arrays.group_names["company"]
+        for row in sorted(reasons):
+            document, index, emp = arrays.rows[row]
+            info = emp.get('employee_info') or {}
+            flagged.setdefault(document, []).append({
+                "employee_index": index,
+                "employee_name": info.get('employee_name'),
+                "employee_id": info.get('employee_id'),
+                "company": company_names[arrays.groups["company"][row]],
+                "department": info.get('department'),
+                "reasons": reasons[row],
+            })
+        return flagged
+
+
+def write_anomalies(path: Path, flagged: List[Dict], employee_count: int, config: Dict) -> Path:
+    """
+    Write anomalies.json for one document.
+
+    Args:
+        path: Output path (normally next to mapped.json)
+        flagged: The document's flagged employees from AnomalyDetector.detect()
+        employee_count: Employees checked in the document
+        config: Detector settings (AnomalyDetector.config())
+
+    Returns:
+        The path written
+    """
+    by_check: Dict[str, int] = {}
+    for entry in flagged:
+        for reason in entry["reasons"]:
+            for check in reason["check"].split("+"):
+                by_check[check] = by_check.get(check, 0) + 1
+
+    path = Path(path)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "summary": {"employees": employee_count, "flagged": len(flagged), "reasons_by_check": by_check},
+            "config": config,
+            "anomalies": flagged,
+        }, f, indent=2, ensure_ascii=False)
+    return path
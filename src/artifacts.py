@@ -0,0 +1,321 @@
+"""
+Pipeline Artifacts
+Reads and writes the per-document artifacts (extracted.json, interim.json,
+mapped.json) together with a build record describing what each one was
+built from: hashes of its inputs, a hash of the code that produced it, and
+the configuration used.
+
+Build record (stored under the artifact's top-level "build" key):
+    {
+        "stage": "interim",
+        "inputs": {"extracted": "<content hash>"},
+        "code_version": "<hash of the stage's source files>",
+        "config": {"model": "claude-3-haiku-20240307"},
+        "built_at": "2026-01-05T20:17:27"
+    }
+
+Intermediate artifacts (extracted, interim) can also be stored in a binary
+format, MessagePack compressed with zstd, as <name>.msgpack.zst in place of
+<name>.json. read_artifact() loads either form (detected from the file's
+first bytes, so a path to either name works); mapped.json and other
+human-facing exports stay JSON. The binary format needs the optional msgpack
+and zstandard packages.
+"""
+
+import gc
+import hashlib
+import json
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Artifact file name per stage, in pipeline order
+ARTIFACTS = {
+    "extracted": "extracted.json",
+    "interim": "interim.json",
+    "mapped": "mapped.json",
+}
+
+# Source files whose contents determine each stage's output
+STAGE_CODE = {
+    "extracted": [
+        "src/step1_pdf_extraction.py",
+    ],
+    "interim": [
+        "src/step2_raw_extraction.py",
+        "src/model_router.py",
+        "src/prompts/extractor_prompt.py",
+        "src/interim_validator.py",
+        "src/wire_format.py",
+        "src/grounding.py",
+        "src/amounts.py",
+    ],
+    "mapped": [
+        "src/step3_schema_mapping.py",
+        "src/fuzzy_matcher.py",
+        "src/jurisdictions.py",
+        "src/rollups.py",
+        "src/amounts.py",
+        "src/compact_output.py",
+        "src/label_classifier.py",
+        "src/prompts/mapper_prompt.py",
+        "schemas/global_schema.py",
+    ],
+}
+
+# Formats for the intermediate artifacts
+ARTIFACT_FORMATS = ("json", "msgpack")
+BINARY_SUFFIX = ".msgpack.zst"
+ZSTD_LEVEL = 3
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Keys that describe how an artifact was produced rather than what it contains
+VOLATILE_KEYS = ("build", "extraction_timestamp")
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash(data: Dict) -> str:
+    """
+    Hash an artifact's content, ignoring its build record and timestamps.
+
+    Rebuilding a stage that produces identical content therefore leaves the
+    downstream stages up to date.
+    """
+    payload = {key: value for key, value in data.items() if key not in VOLATILE_KEYS}
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def pages_hash(pages) -> str:
+    """Content hash of Step 1 pages (the input Step 2 depends on)."""
+    return content_hash({"pages": pages})
+
+
+@lru_cache(maxsize=None)
+def code_version(stage: str) -> str:
+    """Hash of the source files (and library versions) a stage depends on."""
+    digest = hashlib.sha256()
+    for relative in STAGE_CODE[stage]:
+        path = ROOT / relative
+        digest.update(relative.encode("utf-8"))
+        if path.exists():
+            digest.update(path.read_bytes())
+
+    if stage == "extracted":
+        # Text extraction output depends on the PyMuPDF release
+        from importlib import metadata
+        try:
+            digest.update(metadata.version("pymupdf").encode("utf-8"))
+        except metadata.PackageNotFoundError:
+            pass
+
+    return digest.hexdigest()
+
+
+def build_record(stage: str, inputs: Dict[str, Any], config: Optional[Dict] = None) -> Dict:
+    """
+    Create the build record for an artifact.
+
+    Args:
+        stage: One of ARTIFACTS
+        inputs: Input name -> hash (or {"path": ..., "sha256": ...} for the PDF)
+        config: Stage configuration that affects the output
+
+    Returns:
+        Build record dictionary
+    """
+    return {
+        "stage": stage,
+        "inputs": inputs,
+        "code_version": code_version(stage),
+        "config": config or {},
+        "built_at": datetime.now().isoformat(),
+    }
+
+
+def write_json_artifact(path: Path, data: Dict, build: Optional[Dict] = None, indent: Optional[int] = 2) -> Path:
+    """
+    Write an artifact as JSON, attaching its build record.
+
+    Args:
+        path: Output file path
+        data: Artifact content (modified in place to carry the build record)
+        build: Build record from build_record()
+        indent: JSON indent (None for the most compact output)
+
+    Returns:
+        The path written
+    """
+    path = Path(path)
+    if build is not None:
+        data["build"] = build
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    return path
+
+
+def write_mapped_artifact(path: Path, mapped: Dict, interim: Dict, config: Optional[Dict] = None) -> Path:
+    """
+    Write mapped.json with its build record, in full or compact form.
+
+    Args:
+        path: Output file path
+        mapped: Mapped data in full schema shape
+        interim: The interim data it was mapped from (hashed as the input)
+        config: Output config, e.g. {"compact": True, "drop_nulls": False}
+
+    Returns:
+        The path written
+    """
+    config = config or {}
+    build = build_record("mapped", {"interim": content_hash(interim)}, config)
+    if config.get("compact"):
+        from src.compact_output import write_compact_mapped
+        return write_compact_mapped(path, mapped, config.get("drop_nulls", False), build)
+    return write_json_artifact(path, mapped, build)
+
+
+def read_json_artifact(path: Path) -> Dict:
+    """Load a JSON artifact."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def json_path(path: Path) -> Path:
+    """The .json name of an artifact given either of its names."""
+    path = Path(path)
+    if path.name.endswith(BINARY_SUFFIX):
+        return path.with_name(path.name[:-len(BINARY_SUFFIX)] + ".json")
+    return path
+
+
+def binary_path(path: Path) -> Path:
+    """The .msgpack.zst name of an artifact given either of its names."""
+    path = json_path(path)
+    return path.with_name(path.stem + BINARY_SUFFIX)
+
+
+def artifact_path(path: Path) -> Optional[Path]:
+    """The existing file for an artifact in either format (None if neither exists)."""
+    for candidate in (Path(path), binary_path(path), json_path(path)):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def artifact_format(path: Path) -> Optional[str]:
+    """Format of the existing file for an artifact ("json", "msgpack", or None if missing)."""
+    found = artifact_path(path)
+    if found is None:
+        return None
+    with open(found, 'rb') as f:
+        return "msgpack" if f.read(4) == _ZSTD_MAGIC else "json"
+
+
+def write_artifact(path: Path, data: Dict, build: Optional[Dict] = None, format: Optional[str] = None) -> Path:
+    """
+    Write an intermediate artifact as JSON or binary, attaching its build record.
+
+    The other format's file, if any, is removed so that reads are unambiguous.
+
+    Args:
+        path: Artifact path (either name)
+        data: Artifact content (modified in place to carry the build record)
+        build: Build record from build_record()
+        format: "json" or "msgpack" (default: the existing file's format, else JSON)
+
+    Returns:
+        The path written
+    """
+    format = format or artifact_format(path) or "json"
+    if format not in ARTIFACT_FORMATS:
+        raise ValueError(f"Unknown artifact format: {format}")
+
+    if format == "json":
+        target, stale = json_path(path), binary_path(path)
+        write_json_artifact(target, data, build)
+    else:
+        target, stale = binary_path(path), json_path(path)
+        if build is not None:
+            data["build"] = build
+        msgpack, zstandard = _binary_modules()
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(msgpack.packb(data, use_bin_type=True))
+        # Write then rename, so a reader never sees a truncated frame
+        temporary = target.with_name(target.name + ".tmp")
+        temporary.write_bytes(payload)
+        temporary.replace(target)
+
+    if stale.exists():
+        stale.unlink()
+    return target
+
+
+def read_artifact(path: Path) -> Dict:
+    """
+    Load an intermediate artifact written in either format.
+
+    Args:
+        path: Artifact path (either name; the existing file is used)
+
+    Raises:
+        FileNotFoundError: If the artifact exists in neither format
+    """
+    found = artifact_path(path)
+    if found is None:
+        raise FileNotFoundError(f"No such artifact: {path}")
+    with open(found, 'rb') as f:
+        raw = f.read()
+    binary = raw[:4] == _ZSTD_MAGIC
+    if binary:
+        msgpack, zstandard = _binary_modules()
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+
+    # Decoding creates millions of small dicts and lists, none of them cyclic
+    # garbage; pausing the cyclic GC meanwhile roughly halves the load time
+    paused = gc.isenabled()
+    gc.disable()
+    try:
+        if binary:
+            return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+        return json.loads(raw)
+    finally:
+        if paused:
+            gc.enable()
+
+
+def _binary_modules():
+    try:
+        import msgpack
+        import zstandard
+    except ImportError as e:
+        raise ImportError("The binary artifact format needs msgpack and zstandard "
+                          "(pip install msgpack zstandard)") from e
+    return msgpack, zstandard
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Export a binary artifact as JSON for reading: python -m src.artifacts <artifact> [out.json]
+    if len(sys.argv) < 2:
+        print("Usage: python -m src.artifacts <interim.msgpack.zst> [output.json]")
+        sys.exit(1)
+
+    data = read_artifact(Path(sys.argv[1]))
+    if len(sys.argv) > 2:
+        write_json_artifact(Path(sys.argv[2]), data)
+        print(f"✓ Saved to: {sys.argv[2]}")
+    else:
+        print(json.dumps(data, indent=2, ensure_ascii=False))
@@ -0,0 +1,187 @@
+"""
+Compact Output Mode
+Strips schema boilerplate from mapped.json and restores it on load.
+
+mapped.json is built from a deep copy of GLOBAL_PAYROLL_SCHEMA, so every
+employee carries the template's description strings, allowed_values lists
+and empty notes. The compact form keeps only data: a key is dropped when
+its value is exactly the template default for that position, and inflating
+against the template puts it back.
+
+Inflating is not an exact round trip: it fills in every template key, so
+keys the original never had come back too. Step 3 writes line items without
+the template's "description", "allowed_values" and "taxable_flags", and an
+inflated line has them with their template defaults. Every value the
+original had is restored unchanged.
+
+Compact files are marked with a top-level "format": "compact-v1" key and
+written without indentation.
+"""
+
+import copy
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+from schemas.global_schema import GLOBAL_PAYROLL_SCHEMA
+
+COMPACT_FORMAT = "compact-v1"
+
+_MISSING = object()
+
+
+def compact_mapped(mapped: Dict, drop_nulls: bool = False) -> Dict:
+    """
+    Remove schema boilerplate from mapped data.
+
+    Args:
+        mapped: Mapped data in full global schema shape
+        drop_nulls: Also drop null values whose template default is null
+
+    Returns:
+        Compact dictionary (marked with "format": COMPACT_FORMAT)
+    """
+    compact = _compact_node(mapped, GLOBAL_PAYROLL_SCHEMA, drop_nulls)
+    compact["format"] = COMPACT_FORMAT
+    return compact
+
+
+def inflate_mapped(compact: Dict) -> Dict:
+    """
+    Restore compact mapped data to the full global schema shape.
+
+    Args:
+        compact: Dictionary produced by compact_mapped()
+
+    Returns:
+        Mapped data with template descriptions, allowed values, notes and
+        null defaults filled in (including template keys the original did not have)
+    """
+    data = {key: value for key, value in compact.items() if key != "format"}
+    return _inflate_node(data, GLOBAL_PAYROLL_SCHEMA)
+
+
+def is_compact(data: Dict) -> bool:
+    """True if data is in compact form."""
+    return isinstance(data, dict) and data.get("format") == COMPACT_FORMAT
+
+
+def write_compact_mapped(path: Path, mapped: Dict, drop_nulls: bool = False,
+                         build: Optional[Dict] = None) -> Path:
+    """
+    Write mapped data in compact form with the non-indented JSON encoder.
+
+    Args:
+        path: Output file path
+        mapped: Mapped data in full shape
+        drop_nulls: Also drop template-default nulls
+        build: Optional build record to attach
+
+    Returns:
+        The path written
+    """
+    compact = compact_mapped(mapped, drop_nulls=drop_nulls)
+    if build is not None:
+        compact["build"] = build
+    path = Path(path)
+    # json.dumps takes the C encoder's one-shot path; json.dump streams through the Python encoder
+    text = json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+def load_mapped(path: Path, inflate: bool = True) -> Dict:
+    """
+    Load mapped.json in either full or compact form.
+
+    Args:
+        path: Path to mapped.json
+        inflate: Re-inflate compact files to the full schema shape
+
+    Returns:
+        Mapped data (full shape unless inflate=False and the file is compact)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if inflate and is_compact(data):
+        return inflate_mapped(data)
+    return data
+
+
+def _compact_node(node: Any, template: Any, drop_nulls: bool) -> Any:
+    """Recursively drop values equal to their template defaults."""
+    if isinstance(node, dict):
+        return _compact_dict(node, template if isinstance(template, dict) else None, drop_nulls)
+    if isinstance(node, list):
+        return _compact_list(node, template, drop_nulls)
+    return node
+
+
+def _compact_dict(node: Dict, template: Optional[Dict], drop_nulls: bool) -> Dict:
+    result = {}
+    for key, value in node.items():
+        default = template.get(key, _MISSING) if template is not None else _MISSING
+        value_type = type(value)
+
+        if value_type is dict:
+            child = _compact_dict(value, default if type(default) is dict else None, drop_nulls)
+            if not child and value and type(default) is dict:
+                # Everything inside was a default; the template restores it
+                continue
+            result[key] = child
+        elif value_type is list:
+            if key == "allowed_values" and value == default:
+                continue
+            result[key] = _compact_list(value, default, drop_nulls)
+        else:
+            if default is not _MISSING:
+                if key == "description" and value == default:
+                    continue
+                if key == "notes" and value == "" and default == "":
+                    continue
+                if drop_nulls and value is None and default is None:
+                    continue
+            result[key] = value
+    return result
+
+
+def _compact_list(node: list, template: Any, drop_nulls: bool) -> list:
+    element = template[0] if type(template) is list and template and type(template[0]) is dict else None
+    return [
+        _compact_dict(item, element, drop_nulls) if type(item) is dict else _compact_node(item, None, drop_nulls)
+        for item in node
+    ]
+
+
+def _inflate_node(node: Any, template: Any) -> Any:
+    """Recursively fill missing keys from the template."""
+    if type(node) is dict and type(template) is dict:
+        result = {}
+        matched = 0
+        for key, default in template.items():
+            if key in node:
+                result[key] = _inflate_node(node[key], default)
+                matched += 1
+            else:
+                result[key] = _default(default)
+        if matched < len(node):
+            # Keys the template does not know about (e.g. "build")
+            for key, value in node.items():
+                if key not in template:
+                    result[key] = value
+        return result
+
+    if type(node) is list and type(template) is list and template and type(template[0]) is dict:
+        element = template[0]
+        return [_inflate_node(item, element) for item in node]
+
+    return node
+
+
+def _default(default: Any) -> Any:
+    """Fresh copy of a template default (scalars are shared, containers copied)."""
+    if type(default) is dict:
+        return {key: _default(value) for key, value in default.items()}
+    if type(default) is list:
+        return copy.deepcopy(default)
+    return default
@@ -0,0 +1,419 @@
+"""
+Delta Extraction
+Re-extracts only what changed since a prior run of the same register.
+Step 1 pages are aligned against the prior run's pages. Employees whose
+block of text changed only in its numbers are carried over, with those
+numbers updated locally. Only new or changed blocks are sent to Step 2.
+Output: interim data in the same shape as RawDataExtractor.extract_raw_data
+
+Alignment works on masked lines: every number is replaced by "#", so
+"0-Regular Pay" followed by "40.00" and "790.00" matches whatever the hours
+and amounts are this week. Masked lines are grouped into chunks (a label
+line and the number lines after it), and the chunks are diffed by hash.
+Each prior page is split into employee blocks between the employees' name
+lines, where the lines' numbers best match the prior employees' own values.
+A block is unchanged when all of its masked lines align in order, and
+contiguously, to lines of the new page with the same page number.
+
+The aligned lines give a positional map from prior numeric tokens to this
+week's, which rewrites every number in the prior employee. An employee is
+reused only if two conditions hold:
+- each of its numbers occurs in its block and maps to a single new token
+  there and in the few lines around it, so a slightly misplaced block
+  boundary cannot pick the wrong occurrence;
+- all of its values are then found in the new page text (src/grounding.py).
+
+Anything else is re-extracted. Step 2 gets the page's leading column header
+lines plus every line not covered by a reused block. The employees it
+returns are merged with the reused ones in page order. A page is left
+without a call only when all of its prior employees were reused and every
+other line is a column header or blank.
+
+Report metadata is carried over the same way from the first page. If its
+numbers cannot be mapped, that page is re-extracted in full with the header
+prompt. Employees that moved to another page (e.g. after a new hire on an
+earlier page) are not matched across pages and are re-extracted.
+"""
+
+import difflib
+import re
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.artifacts import read_artifact
+from src.grounding import UNGROUNDED_KEY, ground_employees
+from src.metrics import RunMetrics
+from src.prompts.extractor_prompt import PROMPT_TEMPLATES
+from src.refinement import REFINED_KEY, find_name_lines
+from src.step2_raw_extraction import STAGE, has_report_header, merge_page_results
+from src.step3_schema_mapping import HINT_KEY
+
+# Standalone numbers ("790.00", "5,530.00", the "2024" of "01/10/2024"), not digits inside words ("401K")
+_NUMBER = re.compile(r"(?<![\w.])\d[\d,]*(?:\.\d+)?(?![\w.])")
+
+_LABEL = re.compile(r"[A-Za-z]")
+
+# Lines either side of a block whose numbers must also map unambiguously
+BOUNDARY_MARGIN = 2
+
+# Interim keys that are bookkeeping, not values read from the page
+_SKIP_KEYS = {"page_number", UNGROUNDED_KEY, REFINED_KEY, HINT_KEY}
+
+
+class _Unmapped(Exception):
+    """A prior value has no unambiguous counterpart in this week's text."""
+
+
+def mask(line: str) -> str:
+    """A line with every number replaced by "#"."""
+    return _NUMBER.sub("#", line)
+
+
+def _number_value(token: str) -> Decimal:
+    return Decimal(token.replace(",", ""))
+
+
+class TokenMap:
+    """Prior numeric tokens -> this week's tokens at the same aligned positions."""
+
+    def __init__(self):
+        self.by_text: Dict[str, set] = {}
+        self.by_value: Dict[Decimal, set] = {}
+
+    def add_lines(self, old_line: str, new_line: str):
+        for old, new in zip(_NUMBER.findall(old_line), _NUMBER.findall(new_line)):
+            self.by_text.setdefault(old, set()).add(new)
+            self.by_value.setdefault(_number_value(old), set()).add(new)
+
+    def update(self, other: "TokenMap"):
+        for old, new in other.by_text.items():
+            self.by_text.setdefault(old, set()).update(new)
+        for old, new in other.by_value.items():
+            self.by_value.setdefault(old, set()).update(new)
+
+
+def _lookup(own: TokenMap, around: TokenMap, token: str) -> str:
+    """The new token for a prior one: it must occur in own and map to a single token in around."""
+    if token in own.by_text:
+        candidates = around.by_text[token]
+    else:
+        value = _number_value(token)
+        if value not in own.by_value:
+            raise _Unmapped(token)
+        candidates = around.by_value[value]
+    if len(candidates) != 1:
+        raise _Unmapped(token)
+    return next(iter(candidates))
+
+
+def remap(value, own: TokenMap, around: TokenMap):
+    """
+    Rewrite every number in an interim value (dict, list or scalar) with this week's.
+
+    Raises:
+        _Unmapped: If a number cannot be mapped unambiguously
+    """
+    if isinstance(value, dict):
+        return {key: item if key in _SKIP_KEYS else remap(item, own, around) for key, item in value.items()}
+    if isinstance(value, list):
+        return [remap(item, own, around) for item in value]
+    if isinstance(value, str):
+        return _NUMBER.sub(lambda match: _lookup(own, around, match.group()), value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        new = _number_value(_lookup(own, around, str(value)))
+        return int(new) if isinstance(value, int) and new == new.to_integral_value() else float(new)
+    return value
+
+
+def _values(value) -> set:
+    """Values of every number in an interim value (dict, list or scalar)."""
+    found = set()
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key not in _SKIP_KEYS:
+                found |= _values(item)
+    elif isinstance(value, list):
+        for item in value:
+            found |= _values(item)
+    elif isinstance(value, str):
+        found.update(_number_value(token) for token in _NUMBER.findall(value))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        found.add(Decimal(str(value)))
+    return found
+
+
+def _chunks(masked: List[str]) -> List[Tuple[Tuple[str, ...], int]]:
+    """
+    Group masked lines into (lines, first line index) chunks, one per label line
+    and the number-only lines after it. Aligning chunks instead of lines keeps
+    the thousands of identical "#" lines of a page out of the diff.
+    """
+    chunks = []
+    start = 0
+    for i in range(1, len(masked) + 1):
+        if i == len(masked) or _LABEL.search(masked[i]):
+            chunks.append((tuple(masked[start:i]), start))
+            start = i
+    return chunks
+
+
+def _split(line_values: List[set], before: set, after: set, first: int, second: int) -> int:
+    """
+    Where the block of the employee named on line second starts.
+
+    Picks the boundary between the two name lines that puts the most lines
+    with numbers next to the employee whose values they are (the earliest
+    one on ties, so trailing label lines go to the next block).
+    """
+    def owned(i, values):
+        return 1 if line_values[i] and line_values[i] <= values else 0
+
+    score = sum(owned(i, after) for i in range(first + 1, second))
+    best, best_score = first + 1, score
+    for boundary in range(first + 2, second + 1):
+        score += owned(boundary - 1, before) - owned(boundary - 1, after)
+        if score > best_score:
+            best, best_score = boundary, score
+    return best
+
+
+class PageAlignment:
+    """A prior page aligned to this week's page, split into the prior employees' blocks."""
+
+    def __init__(self, old_text: str, new_text: str, employees: List[Dict]):
+        self.old_lines = old_text.split('\n')
+        self.new_lines = new_text.split('\n')
+        old_masked = [mask(line) for line in self.old_lines]
+        new_masked = [mask(line) for line in self.new_lines]
+
+        # Prior line index -> new line index, for lines whose masked text aligned
+        self.old_to_new: List[Optional[int]] = [None] * len(self.old_lines)
+        if old_masked == new_masked:
+            self.old_to_new = list(range(len(self.old_lines)))
+        else:
+            old_chunks, new_chunks = _chunks(old_masked), _chunks(new_masked)
+            matcher = difflib.SequenceMatcher(None, [key for key, _ in old_chunks],
+                                              [key for key, _ in new_chunks], autojunk=False)
+            for tag, i1, i2, j1, _ in matcher.get_opcodes():
+                if tag == "equal":
+                    for offset in range(i2 - i1):
+                        old_start, new_start = old_chunks[i1 + offset][1], new_chunks[j1 + offset][1]
+                        for line in range(len(old_chunks[i1 + offset][0])):
+                            self.old_to_new[old_start + line] = new_start + line
+
+        # Column headers: leading lines without numbers, always sent with changed blocks
+        self.preamble = next((i for i, line in enumerate(self.old_lines) if _NUMBER.search(line)),
+                             len(self.old_lines))
+        self.name_lines = find_name_lines(self.old_lines, [emp.get('employee_name') for emp in employees])
+        self.blocks: List[Tuple[int, int]] = []
+        if employees and None not in self.name_lines:
+            self.preamble = min(self.preamble, self.name_lines[0])
+            line_values = [{_number_value(token) for token in _NUMBER.findall(line)} for line in self.old_lines]
+            values = [_values(emp) for emp in employees]
+            starts = [self.preamble] + [
+                _split(line_values, values[k], values[k + 1], self.name_lines[k], self.name_lines[k + 1])
+                for k in range(len(employees) - 1)]
+            self.blocks = list(zip(starts, starts[1:] + [len(self.old_lines)]))
+
+    def _token_map(self, start: int, end: int) -> TokenMap:
+        token_map = TokenMap()
+        for i in range(max(0, start), min(end, len(self.old_lines))):
+            if self.old_to_new[i] is not None:
+                token_map.add_lines(self.old_lines[i], self.new_lines[self.old_to_new[i]])
+        return token_map
+
+    def page_map(self) -> TokenMap:
+        return self._token_map(0, len(self.old_lines))
+
+    def block_maps(self, index: int) -> Tuple[TokenMap, TokenMap]:
+        """
+        Token maps of block index, and of the block plus BOUNDARY_MARGIN lines
+        either side (used to reject numbers that are ambiguous near its edges).
+        """
+        start, end = self.blocks[index]
+        return self._token_map(start, end), self._token_map(start - BOUNDARY_MARGIN, end + BOUNDARY_MARGIN)
+
+    def unchanged(self, index: int) -> bool:
+        """True if block index aligned line for line to a contiguous run of new lines."""
+        start, end = self.blocks[index]
+        first = self.old_to_new[start]
+        return first is not None and all(self.old_to_new[i] == first + i - start for i in range(start, end))
+
+    def new_lines_of(self, index: int) -> range:
+        start, end = self.blocks[index]
+        first = self.old_to_new[start]
+        return range(first, first + end - start)
+
+    def new_preamble(self) -> set:
+        return {j for j in self.old_to_new[:self.preamble] if j is not None}
+
+
+class DeltaExtractor:
+    """Step 2 against a prior run: reuses unchanged employee blocks, extracts the rest."""
+
+    def __init__(self, extractor, prior_dir: Path, metrics: Optional[RunMetrics] = None):
+        """
+        Args:
+            extractor: RawDataExtractor used for new and changed blocks
+            prior_dir: Output folder of the prior run (extracted + interim artifacts)
+            metrics: Run metrics (default: the extractor's)
+
+        Raises:
+            FileNotFoundError: If the prior run's artifacts are missing
+        """
+        self.extractor = extractor
+        self.prior_dir = Path(prior_dir)
+        self.metrics = metrics or extractor.metrics
+        self.client = extractor.client
+
+        prior_pages = read_artifact(self.prior_dir / "extracted.json")["pages"]
+        prior_interim = read_artifact(self.prior_dir / "interim.json")
+        self.prior_texts = {page['page_number']: page['text'] for page in prior_pages}
+        self.prior_metadata = prior_interim.get('report_metadata') or {}
+        self.prior_employees: Dict[int, List[Dict]] = {}
+        for emp in prior_interim.get('employees') or []:
+            if isinstance(emp, dict) and emp.get('page_number') is not None:
+                self.prior_employees.setdefault(emp['page_number'], []).append(emp)
+        if prior_interim.get('employees') and not self.prior_employees:
+            print("  ⚠ Prior interim data has no page numbers; every page will be extracted")
+
+    def interim_config(self) -> Dict:
+        return self.extractor.interim_config()
+
+    def validate_interim_format(self, data: Dict) -> bool:
+        return self.extractor.validate_interim_format(data)
+
+    def extract_raw_data(self, pages: List[Dict]) -> Dict:
+        """
+        Extract raw payroll data, reusing the prior run where the text allows.
+
+        Args:
+            pages: List of page dictionaries with 'page_number' and 'text'
+
+        Returns:
+            Dictionary with raw extracted payroll data
+        """
+        page_results = []
+        employee_count = 0
+        metrics = self.metrics
+        prompt_roles = {role: 0 for role in PROMPT_TEMPLATES}
+        report = {"prior": str(self.prior_dir), "reused_employees": 0, "extracted_employees": 0,
+                  "pages_without_call": 0, "sent_chars": 0, "page_chars": 0}
+        header_found = False
+
+        with metrics.stage(STAGE) as stage_info:
+            for page in pages:
+                role = "employees" if header_found else "header"
+                page_result, sent_role = self._extract_page(page, employee_count, role, report)
+                employee_count += len(page_result["employees"] or [])
+                page_results.append(page_result)
+                if sent_role:
+                    prompt_roles[sent_role] += 1
+                if role == "header" and has_report_header(page_result["report_metadata"]):
+                    header_found = True
+
+            result = merge_page_results(page_results)
+            stage_info["pages"] = len(pages)
+            stage_info["prompt_roles"] = prompt_roles
+            stage_info["employees"] = len(result["employees"])
+            stage_info["delta"] = report
+
+        print(f"\n✓ Total employees extracted: {len(result['employees'])} "
+              f"({report['reused_employees']} reused from {self.prior_dir})")
+        if report["page_chars"]:
+            print(f"  Sent {report['sent_chars'] / report['page_chars']:.0%} of the page text to the LLM")
+        if result["skipped_pages"]:
+            print(f"⚠ Pages skipped due to size/parse issues: {result['skipped_pages']}")
+        return result
+
+    def _extract_page(self, page: Dict, offset: int, role: str, report: Dict):
+        """
+        One page: reuse unchanged blocks, send the rest to Step 2.
+
+        Returns:
+            Tuple of (page result for merge_page_results, prompt role sent or None)
+        """
+        page_number = page['page_number']
+        text = page['text']
+        report["page_chars"] += len(text)
+        prior_employees = self.prior_employees.get(page_number)
+        if page_number not in self.prior_texts or not prior_employees:
+            return self._send(page, offset, role, report), role
+
+        alignment = PageAlignment(self.prior_texts[page_number], text, prior_employees)
+        if not alignment.blocks:
+            print(f"  ↻ Page {page_number}: prior employees not found in its text, extracting the whole page")
+            return self._send(page, offset, role, report), role
+        metadata = None
+        if role == "header":
+            metadata = self._carry_metadata(alignment)
+            if metadata is None:
+                print(f"  ↻ Page {page_number}: report header not carried over, extracting the whole page")
+                return self._send(page, offset, role, report), role
+
+        reused = []
+        covered = set()
+        for index, emp in enumerate(prior_employees):
+            if not alignment.unchanged(index):
+                continue
+            try:
+                emp = remap(emp, *alignment.block_maps(index))
+            except _Unmapped:
+                continue
+            emp.pop('page_number', None)
+            if ground_employees([emp], page):
+                continue
+            lines = alignment.new_lines_of(index)
+            reused.append((alignment.old_to_new[alignment.name_lines[index]], emp))
+            covered.update(lines)
+
+        new_lines = alignment.new_lines
+        preamble = alignment.new_preamble()
+        uncovered = [j for j in range(len(new_lines)) if j not in covered]
+        changed = [j for j in uncovered if j not in preamble and new_lines[j].strip()]
+
+        employees = [emp for _, emp in reused]
+        sent_role = None
+        with self.metrics.page(STAGE, page_number) as page_info:
+            page_info["delta"] = {"reused": len(reused), "prior_employees": len(prior_employees),
+                                  "changed_lines": len(changed), "lines": len(new_lines)}
+        self.metrics.increment("reused_employees", len(reused), page_number, STAGE)
+        report["reused_employees"] += len(reused)
+        print(f"Page {page_number}: reusing {len(reused)} of {len(prior_employees)} employees, "
+              f"{len(changed)} changed lines")
+
+        # The blocks span the whole prior page, so with every employee reused any other line is new text
+        if changed or len(reused) < len(prior_employees):
+            reduced = dict(page, text='\n'.join(new_lines[j] for j in uncovered))
+            reduced.pop('words', None)
+            sent_role = "employees"
+            result = self._send(reduced, offset + len(reused), sent_role, report)
+            extracted = result["employees"] or []
+            # Place them by their name among the lines that were sent
+            positions = find_name_lines([new_lines[j] for j in uncovered],
+                                        [emp.get('employee_name') for emp in extracted])
+            found = [(len(new_lines) if position is None else uncovered[position], emp)
+                     for position, emp in zip(positions, extracted)]
+            employees = [emp for _, emp in sorted(reused + found, key=lambda item: item[0])]
+        else:
+            report["pages_without_call"] += 1
+
+        return {"page_number": page_number, "employees": employees or None,
+                "report_metadata": metadata}, sent_role
+
+    def _send(self, page: Dict, offset: int, role: str, report: Dict) -> Dict:
+        report["sent_chars"] += len(page['text'])
+        result = self.extractor.extract_page(page, offset, role)
+        report["extracted_employees"] += len(result["employees"] or [])
+        return result
+
+    def _carry_metadata(self, alignment: PageAlignment) -> Optional[Dict]:
+        """The prior report_metadata with this week's numbers, or None if it cannot be mapped."""
+        if not has_report_header(self.prior_metadata):
+            return None
+        try:
+            page_map = alignment.page_map()
+            return remap(self.prior_metadata, page_map, page_map)
+        except _Unmapped:
+            return None
@@ -0,0 +1,179 @@
+"""
+Fuzzy Alias Matching
+Matches raw earning/deduction/tax descriptions to normalized types, tolerating
+the typos and abbreviations PDF text extraction produces ("Reg. Pay",
+"0-Regulr Pay", "Medcare").
+Output: (normalized type, confidence) per description
+
+Matching runs in three tiers, stopping at the first hit:
+    1. exact      - normalized description equals an alias       (0.95)
+    2. contains   - an alias appears as whole words in it,
+                    longest alias first                          (0.85)
+    3. fuzzy      - closest alias by bounded edit distance         (0.85 * similarity)
+
+Candidates for the fuzzy tier come from a character-trigram inverted index
+over all aliases, so only aliases sharing trigrams with the description are
+scored. Descriptions longer than an alias are compared window by window
+(same number of words as the alias).
+"""
+
+import heapq
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EXACT_CONFIDENCE = 0.95
+CONTAINS_CONFIDENCE = 0.85
+FUZZY_SCALE = 0.85
+
+# Minimum edit similarity (1 - distance / length) for a fuzzy match
+MIN_SIMILARITY = 0.75
+
+# Aliases shorter than this ("OT", "SS", "Med") only match exactly or as whole words
+MIN_FUZZY_LENGTH = 4
+
+# Index candidates scored with edit distance per description
+MAX_CANDIDATES = 5
+
+_CODE_PREFIX = re.compile(r'^\s*\d+\s*-\s*')
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lower-case, drop a leading numeric code ("0-", "31-") and collapse punctuation to spaces."""
+    text = _CODE_PREFIX.sub('', (text or '').lower())
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def trigrams(text: str) -> set:
+    """Character trigrams of a normalized string, padded at both ends."""
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein distance between a and b, or limit + 1 if it exceeds limit.
+
+    Only the diagonal band of width 2 * limit + 1 is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+
+    over = limit + 1
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        low = max(1, i - limit)
+        high = min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= limit else over
+        char = a[i - 1]
+        row_min = current[0]
+        for j in range(low, high + 1):
+            cost = 0 if char == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return over
+        previous = current
+    return previous[len(b)] if previous[len(b)] <= limit else over
+
+
+class FuzzyAliasMatcher:
+    """Alias matcher for one section (earnings, deductions or taxes)."""
+
+    def __init__(self, aliases: Dict[str, Iterable[str]]):
+        """
+        Args:
+            aliases: Normalized type -> alias strings (one FIELD_ALIASES section)
+        """
+        self.exact: Dict[str, str] = {}
+        # (normalized alias, type, word count), longest first
+        self.entries: List[Tuple[str, str, int]] = []
+        self.index: Dict[str, List[int]] = {}
+        self.gram_counts: Dict[int, int] = {}
+
+        seen = set()
+        for normalized_type, patterns in aliases.items():
+            for pattern in list(patterns) + [normalized_type]:
+                alias = normalize(pattern)
+                if not alias or alias in seen:
+                    continue
+                seen.add(alias)
+                self.exact.setdefault(alias, normalized_type)
+                self.entries.append((alias, normalized_type, alias.count(' ') + 1))
+
+        self.entries.sort(key=lambda entry: -len(entry[0]))
+        self.max_words = max((entry[2] for entry in self.entries), default=0)
+        for entry_id, (alias, _, _) in enumerate(self.entries):
+            if len(alias) >= MIN_FUZZY_LENGTH:
+                grams = trigrams(alias)
+                self.gram_counts[entry_id] = len(grams)
+                for gram in grams:
+                    self.index.setdefault(gram, []).append(entry_id)
+
+    def match(self, description: Optional[str]) -> Tuple[Optional[str], float]:
+        """
+        Find the normalized type for a raw description.
+
+        Returns:
+            (type, confidence), or (None, 0.0) if nothing is close enough
+        """
+        text = normalize(description)
+        if not text:
+            return None, 0.0
+
+        exact = self.exact.get(text)
+        if exact is not None:
+            return exact, EXACT_CONFIDENCE
+
+        # Whole-word containment: look up every run of words, longest runs first
+        words = text.split(' ')
+        for size in range(min(self.max_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                contained = self.exact.get(' '.join(words[start:start + size]))
+                if contained is not None:
+                    return contained, CONTAINS_CONFIDENCE
+
+        return self._fuzzy(text, words)
+
+    def _fuzzy(self, text: str, words: List[str]) -> Tuple[Optional[str], float]:
+        grams = trigrams(text)
+        shared = Counter()
+        for gram in grams:
+            postings = self.index.get(gram)
+            if postings:
+                shared.update(postings)
+        if not shared:
+            return None, 0.0
+
+        # Rank candidates by trigram Jaccard similarity, then verify the best few
+        gram_count = len(grams)
+        gram_counts = self.gram_counts
+        candidates = heapq.nlargest(
+            MAX_CANDIDATES, shared.items(),
+            key=lambda item: item[1] / (gram_count + gram_counts[item[0]] - item[1])
+        )
+
+        best_type, best_similarity = None, 0.0
+        for entry_id, _ in candidates:
+            alias, normalized_type, word_count = self.entries[entry_id]
+            limit = int(len(alias) * (1 - MIN_SIMILARITY))
+            if limit < 1:
+                continue
+            for start in range(max(1, len(words) - word_count + 1)):
+                window = ' '.join(words[start:start + word_count])
+                distance = bounded_edit_distance(window, alias, limit)
+                if distance > limit:
+                    continue
+                similarity = 1 - distance / max(len(window), len(alias))
+                if similarity > best_similarity:
+                    best_type, best_similarity = normalized_type, similarity
+
+        if best_type is None or best_similarity < MIN_SIMILARITY:
+            return None, 0.0
+        return best_type, round(FUZZY_SCALE * best_similarity, 2)
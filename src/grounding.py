@@ -0,0 +1,107 @@
+"""
+Amount Grounding
+Checks that the numbers Step 2 returned actually appear on the page they
+were extracted from, so a hallucinated or shifted amount is flagged instead
+of flowing silently into mapped.json.
+Output: "ungrounded": [field, ...] on interim lines whose values are not on the page
+
+Every numeric token of a page (from the Step 1 text, or from the PyMuPDF
+word boxes when the page has them) is parsed once into a set of magnitudes;
+each amount_*, hours_* and rate value is then a single set lookup, cheap
+enough to run inline on every page. Signs are ignored, since registers print
+negatives as "(5.50)", "5.50-" or "-5.50" and the model may normalize them,
+and zero is always accepted (registers often leave zero amounts blank).
+
+Step 3 gives ungrounded values UNGROUNDED_CONFIDENCE, below the `refine`
+threshold, so they are re-read by the next refinement pass.
+"""
+
+import re
+from decimal import Decimal
+from typing import Dict, FrozenSet, List, Optional
+
+from src.amounts import to_decimal
+
+UNGROUNDED_KEY = "ungrounded"
+UNGROUNDED_CONFIDENCE = 0.3
+
+# Interim line sections whose values are checked
+LINE_SECTIONS = ("earnings", "deductions", "taxes")
+
+# Digits with thousands separators and decimals; signs, "$" and parentheses are ignored
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def is_grounded_field(name: str) -> bool:
+    """True for the interim line fields that are checked against the page."""
+    return name == "rate" or name.startswith(("amount_", "hours_"))
+
+
+def page_numbers(page: Dict) -> FrozenSet[Decimal]:
+    """
+    Magnitudes of all numeric tokens on a page.
+
+    Args:
+        page: Step 1 page with "text" (and optionally "words" boxes)
+    """
+    words = page.get("words")
+    if words:
+        text = " ".join(word[4] for word in words)
+    else:
+        text = page.get("text") or ""
+    return frozenset(Decimal(token.replace(",", "")) for token in _NUMBER.findall(text))
+
+
+def ground_line(line: Dict, numbers: FrozenSet[Decimal]) -> List[str]:
+    """
+    Mark the fields of one interim line whose values are not among the page's numbers.
+
+    Sets line["ungrounded"] to the list of such fields (and removes it when
+    all values are found, e.g. after a refinement corrected them).
+
+    Returns:
+        The ungrounded field names
+    """
+    ungrounded = []
+    for name, value in line.items():
+        if value is None or not is_grounded_field(name):
+            continue
+        amount = to_decimal(value)
+        if amount is None or amount == 0:
+            continue
+        if abs(amount) not in numbers:
+            ungrounded.append(name)
+
+    if ungrounded:
+        line[UNGROUNDED_KEY] = ungrounded
+    else:
+        line.pop(UNGROUNDED_KEY, None)
+    return ungrounded
+
+
+def ground_employees(employees: List, page: Dict, numbers: Optional[FrozenSet[Decimal]] = None) -> int:
+    """
+    Ground every line of the employees extracted from one page.
+
+    Args:
+        employees: Interim employees (lines are marked in place)
+        page: The Step 1 page they were extracted from
+        numbers: page_numbers(page), if already computed
+
+    Returns:
+        Number of ungrounded values
+    """
+    if numbers is None:
+        numbers = page_numbers(page)
+    count = 0
+    for emp in employees:
+        if not isinstance(emp, dict):
+            continue
+        for section in LINE_SECTIONS:
+            lines = emp.get(section)
+            if not isinstance(lines, list):
+                continue
+            for line in lines:
+                if isinstance(line, dict):
+                    count += len(ground_line(line, numbers))
+    return count
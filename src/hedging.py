@@ -0,0 +1,194 @@
+"""
+Hedged LLM Requests
+Cuts tail latency of messages.create calls: when a request has been running
+longer than a percentile of recently observed latencies, a duplicate request
+is sent and whichever returns a valid response first is used.
+Output: the first valid response message per call, plus hedging stats
+
+Hedges are limited by a budget on the extra request rate (e.g. 0.1 = at most
+one hedge per ten requests), so a slow API does not double the load. Until
+enough latencies are observed to estimate the percentile, no hedges are sent
+(or, with initial_delay, the fixed delay is used).
+
+The losing request cannot be interrupted inside the HTTP client; it is
+abandoned on a daemon thread and its response discarded (its tokens are still
+billed). Requests that have not started yet are cancelled.
+
+Usage:
+    client = HedgingClient(Anthropic(), percentile=0.95, budget=0.1)
+    extractor = RawDataExtractor(client=client)
+"""
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict, Optional
+
+from src.metrics import RunMetrics
+
+DEFAULT_PERCENTILE = 0.95
+DEFAULT_BUDGET = 0.1
+
+# Latencies needed before the percentile is trusted, and how many are kept
+MIN_SAMPLES = 20
+WINDOW = 500
+
+
+def parses_as_json(message) -> bool:
+    """Default validity check: the response is complete and its text is JSON."""
+    if getattr(message, "stop_reason", None) == "max_tokens":
+        return False
+    try:
+        json.loads(message.content[0].text)
+    except (AttributeError, IndexError, TypeError, json.JSONDecodeError):
+        return False
+    return True
+
+
+def _percentile(values, fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty collection."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+class _HedgingMessages:
+    def __init__(self, hedging: "HedgingClient"):
+        self._hedging = hedging
+
+    def create(self, **kwargs):
+        return self._hedging.create(**kwargs)
+
+
+class HedgingClient:
+    """Wraps a client exposing messages.create and hedges slow calls."""
+
+    def __init__(self, client, percentile: float = DEFAULT_PERCENTILE, budget: float = DEFAULT_BUDGET,
+                 initial_delay: Optional[float] = None, validate: Callable = parses_as_json,
+                 metrics: Optional[RunMetrics] = None, min_samples: int = MIN_SAMPLES):
+        """
+        Args:
+            client: Client whose messages.create is hedged
+            percentile: Observed-latency percentile after which a hedge is sent
+            budget: Maximum hedges as a fraction of requests
+            initial_delay: Hedge delay in seconds until min_samples latencies are known
+                           (None sends no hedges until then)
+            validate: Called with a response message; False means keep waiting
+                      for the other request
+            metrics: Optional run metrics to count hedges into
+            min_samples: Latencies to observe before using the percentile
+        """
+        self.client = client
+        self.percentile = percentile
+        self.budget = budget
+        self.initial_delay = initial_delay
+        self.validate = validate
+        self.metrics = metrics
+        self.min_samples = min_samples
+        self.messages = _HedgingMessages(self)
+
+        self.latencies = deque(maxlen=WINDOW)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging the next request (None = do not hedge)."""
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return self.initial_delay
+            return _percentile(self.latencies, self.percentile)
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.requests += 1
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._timed_call(kwargs)
+
+        primary = self._submit(kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        if not self._take_budget():
+            return primary.result()
+
+        hedge = self._submit(kwargs)
+        self._count("hedged_requests")
+        pending = {primary, hedge}
+        fallback = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    continue
+                message = future.result()
+                if self.validate(message):
+                    for other in pending:
+                        other.cancel()
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                        self._count("hedge_wins")
+                    return message
+                fallback = fallback or message
+
+        # Neither response was valid: hand back what we have and let the caller
+        # repair or report it, or re-raise the primary's error
+        if fallback is not None:
+            return fallback
+        return primary.result()
+
+    def stats(self) -> Dict:
+        """Hedging counts and the current hedge delay."""
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "budget_denied": self.budget_denied,
+                "hedge_rate": round(self.hedges / self.requests, 4) if self.requests else 0.0,
+                "hedge_delay_seconds": round(delay, 4) if delay is not None else None,
+            }
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                self.budget_denied += 1
+                return False
+            self.hedges += 1
+            return True
+
+    def _timed_call(self, kwargs: Dict):
+        """One messages.create call, recording its latency."""
+        start = time.perf_counter()
+        message = self.client.messages.create(**kwargs)
+        with self._lock:
+            self.latencies.append(time.perf_counter() - start)
+        return message
+
+    def _submit(self, kwargs: Dict) -> Future:
+        """Run one messages.create call on a daemon thread."""
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._timed_call(kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def _count(self, name: str):
+        if self.metrics is not None:
+            self.metrics.increment(name)
@@ -0,0 +1,256 @@
+"""
+Incremental Rebuild
+Make-style rebuild of pipeline stages from the artifacts already on disk.
+A stage is rebuilt only when one of its inputs, its code version or its
+configuration differs from the build record stored in its artifact.
+
+Stages (see src/artifacts.py):
+    extracted.json  <- source PDF           (Step 1)
+    interim.json    <- extracted.json       (Step 2, LLM)
+    mapped.json     <- interim.json         (Step 3)
+
+Artifacts written before build records existed are "adopted": the current
+hashes are recorded without re-running the stage, except mapped.json, which
+is cheap to rebuild and is always rebuilt when it has no record.
+Rebuilt extracted/interim artifacts keep their format (JSON or binary).
+"""
+
+import contextlib
+import io
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.artifacts import (
+    ARTIFACTS,
+    build_record,
+    code_version,
+    content_hash,
+    file_sha256,
+    artifact_path,
+    binary_path,
+    pages_hash,
+    read_artifact,
+    read_json_artifact,
+    write_artifact,
+    write_mapped_artifact,
+)
+from src.step2_raw_extraction import DEFAULT_MODEL
+
+
+def find_output_dirs(root: Path) -> List[Path]:
+    """Find every folder under root that contains pipeline artifacts."""
+    root = Path(root)
+    dirs = set()
+    for name in ARTIFACTS.values():
+        for pattern in (name, binary_path(Path(name)).name):
+            for path in root.rglob(pattern):
+                dirs.add(path.parent)
+    return sorted(dirs)
+
+
+def _pdf_source(extracted: Dict) -> Optional[Path]:
+    """Locate the source PDF recorded for an extracted.json."""
+    build = extracted.get("build") or {}
+    recorded = (build.get("inputs") or {}).get("pdf") or {}
+    candidates = [recorded.get("path"), extracted.get("source_file")]
+    if extracted.get("source_file"):
+        candidates.append(str(Path("sample_pdfs") / extracted["source_file"]))
+    for candidate in candidates:
+        if candidate and Path(candidate).exists():
+            return Path(candidate)
+    return None
+
+
+def _check(stage: str, build: Optional[Dict], inputs: Dict, config: Dict) -> Optional[str]:
+    """Return why a stage is stale, or None if its build record is current."""
+    if build is None:
+        return "no build record"
+    if build.get("code_version") != code_version(stage):
+        return "code changed"
+    if (build.get("config") or {}) != config:
+        return "config changed"
+    for name, value in inputs.items():
+        if (build.get("inputs") or {}).get(name) != value:
+            return f"{name} changed"
+    return None
+
+
+class IncrementalBuilder:
+    """Checks and rebuilds the artifacts of one output folder."""
+
+    def __init__(self, output_dir: Path, model: str = DEFAULT_MODEL, dry_run: bool = False):
+        """
+        Args:
+            output_dir: Folder containing extracted/interim/mapped JSON
+            model: Model Step 2 should use (part of interim.json's config)
+            dry_run: Only report which stages are stale
+        """
+        self.output_dir = Path(output_dir)
+        self.model = model
+        self.dry_run = dry_run
+        self.actions: List[str] = []
+
+    def path(self, stage: str) -> Path:
+        return self.output_dir / ARTIFACTS[stage]
+
+    def run(self) -> List[str]:
+        """
+        Bring all stages up to date, in pipeline order.
+
+        Returns:
+            Actions taken (or that would be taken in a dry run)
+        """
+        extracted = self._extracted()
+        if extracted is None:
+            return self.actions
+        interim = self._interim(extracted)
+        if interim is None:
+            return self.actions
+        self._mapped(interim)
+        return self.actions
+
+    def _note(self, message: str):
+        self.actions.append(message)
+
+    def _extracted(self) -> Optional[Dict]:
+        path = self.path("extracted")
+        if artifact_path(path) is None:
+            self._note("extracted: missing, cannot rebuild without a source PDF")
+            return None
+
+        extracted = read_artifact(path)
+        build = extracted.get("build")
+        pdf_path = _pdf_source(extracted)
+
+        if pdf_path is None:
+            # Nothing to compare against; keep what is there
+            return extracted
+
+        pdf_input = {"path": str(pdf_path.resolve()), "sha256": file_sha256(pdf_path)}
+
+        if build is None:
+            self._note("extracted: adopted existing artifact")
+            if not self.dry_run:
+                write_artifact(path, extracted, build_record("extracted", {"pdf": pdf_input}))
+            return extracted
+
+        recorded_pdf = (build.get("inputs") or {}).get("pdf") or {}
+        reason = _check("extracted", build, {}, {})
+        if reason is None and recorded_pdf.get("sha256") != pdf_input["sha256"]:
+            reason = "pdf changed"
+        if reason is None:
+            return extracted
+
+        self._note(f"extracted: rebuilt ({reason})")
+        if self.dry_run:
+            return extracted
+
+        from src.step1_pdf_extraction import extract_text_from_pdf
+        from src.text_cache import PageTextCache
+
+        pages = extract_text_from_pdf(str(pdf_path), cache=PageTextCache(), pdf_sha256=pdf_input["sha256"])
+        extracted = {
+            "source_file": extracted.get("source_file", pdf_path.name),
+            "extraction_timestamp": datetime.now().isoformat(),
+            "total_pages": len(pages),
+            "pages": pages,
+        }
+        write_artifact(path, extracted, build_record("extracted", {"pdf": pdf_input}))
+        return extracted
+
+    def _interim(self, extracted: Dict) -> Optional[Dict]:
+        path = self.path("interim")
+        inputs = {"extracted": pages_hash(extracted["pages"])}
+        config = {"model": self.model}
+
+        interim = read_artifact(path) if artifact_path(path) is not None else None
+        recorded = ((interim or {}).get("build") or {}).get("config") or {}
+        if recorded.get("routing"):
+            # Keep the model routing the artifact was extracted with
+            config["routing"] = recorded["routing"]
+        if recorded.get("wire_format"):
+            config["wire_format"] = True
+        if interim is not None and interim.get("build") is None:
+            # Re-running Step 2 costs LLM calls; trust artifacts from before build records
+            self._note("interim: adopted existing artifact")
+            if not self.dry_run:
+                write_artifact(path, interim, build_record("interim", inputs, config))
+            return interim
+
+        reason = "missing" if interim is None else _check("interim", interim.get("build"), inputs, config)
+        if reason is None:
+            return interim
+
+        self._note(f"interim: rebuilt ({reason})")
+        if self.dry_run:
+            return interim
+
+        from src.step2_raw_extraction import RawDataExtractor
+        from src.model_router import ModelRouter
+
+        router = ModelRouter(**config["routing"]) if config.get("routing") else None
+        extractor = RawDataExtractor(model=self.model, router=router, wire_format=bool(config.get("wire_format")))
+        interim = extractor.extract_raw_data(extracted["pages"])
+        write_artifact(path, interim, build_record("interim", inputs, config))
+        return interim
+
+    def _mapped(self, interim: Dict):
+        path = self.path("mapped")
+        inputs = {"interim": content_hash(interim)}
+
+        mapped = read_json_artifact(path) if path.exists() else None
+        build = mapped.get("build") if mapped else None
+        # Keep the output format (full or compact) the artifact was written with
+        config = (build or {}).get("config") or {}
+
+        reason = "missing" if mapped is None else _check("mapped", build, inputs, config)
+        if reason is None:
+            return
+
+        self._note(f"mapped: rebuilt ({reason})")
+        if self.dry_run:
+            return
+
+        from src.step3_schema_mapping import matcher_from_config
+
+        mapped = matcher_from_config(config, model=self.model).map_interim_to_schema(interim)
+        write_mapped_artifact(path, mapped, interim, config)
+
+
+def _rebuild_one(output_dir: str, model: str, dry_run: bool) -> Dict:
+    """Worker entry point: rebuild one folder, capturing step output."""
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            actions = IncrementalBuilder(Path(output_dir), model=model, dry_run=dry_run).run()
+        return {"output_dir": output_dir, "actions": actions, "error": None}
+    except Exception as e:
+        return {"output_dir": output_dir, "actions": [], "error": f"{e}", "log": log.getvalue()}
+
+
+def rebuild_tree(root: Path, jobs: int = 1, model: str = DEFAULT_MODEL, dry_run: bool = False) -> List[Dict]:
+    """
+    Rebuild stale stages in every output folder under root.
+
+    Args:
+        root: Outputs root (e.g. ./outputs)
+        jobs: Number of worker processes
+        model: Model Step 2 should use
+        dry_run: Only report which stages are stale
+
+    Returns:
+        One result dictionary per folder: output_dir, actions, error
+    """
+    output_dirs = [str(path) for path in find_output_dirs(root)]
+
+    if jobs <= 1:
+        return [_rebuild_one(output_dir, model, dry_run) for output_dir in output_dirs]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_rebuild_one, output_dir, model, dry_run) for output_dir in output_dirs]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return sorted(results, key=lambda result: result["output_dir"])
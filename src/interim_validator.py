@@ -0,0 +1,233 @@
+"""
+Interim Data Validator
+Checks every employee and line of Step 2 output against the interim format,
+reporting each problem with its exact path.
+Output: list of (path, message) errors, e.g.
+    ("employees[1204].earnings[2].amount_current", "not a number: '1.234.5'")
+
+The interim format is read from the JSON skeleton in EXTRACTOR_PROMPT_TEMPLATE
+(field names, nesting, which fields are line arrays). Amount fields are those
+Step 3 copies into the current/ytd amount objects of GLOBAL_PAYROLL_SCHEMA
+(*_current, *_ytd) plus rate; they accept numbers, numeric strings as parsed
+by to_decimal ("1,234.56", "(5.50)") and null.
+
+The format is compiled once into specialized Python source (one straight-line
+check per field, no generic tree walk) and exec'd; error paths are only
+formatted when a check fails, so valid data costs a type check per field.
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from schemas.global_schema import GLOBAL_PAYROLL_SCHEMA
+from src.amounts import to_decimal
+from src.prompts.extractor_prompt import EXTRACTOR_PROMPT_TEMPLATE
+
+# Employee fields Step 3 cannot do without
+REQUIRED_EMPLOYEE_FIELDS = ("employee_name", "earnings", "deductions", "taxes")
+
+# Common amount spellings accepted without calling to_decimal
+_AMOUNT = re.compile(r"-?\$?\d[\d,]*(?:\.\d+)?|\(\$?\d[\d,]*(?:\.\d+)?\)|\$?\d[\d,]*(?:\.\d+)?-")
+
+# Amount strings already seen to be valid ("280.00" recurs on every page)
+_KNOWN_AMOUNTS = set()
+MAX_KNOWN_AMOUNTS = 100_000
+
+_MISSING = object()
+
+ValidationError = Tuple[str, str]
+
+
+def interim_skeleton() -> Dict:
+    """The example JSON object in the extractor prompt."""
+    text = EXTRACTOR_PROMPT_TEMPLATE.format(payroll_text="")
+    skeleton, _ = json.JSONDecoder().raw_decode(text, text.index("{"))
+    return skeleton
+
+
+def amount_suffixes(schema: Dict = GLOBAL_PAYROLL_SCHEMA) -> Tuple[str, ...]:
+    """Members of the schema's amount objects (objects with both "current" and "ytd")."""
+    suffixes = set()
+
+    def visit(node):
+        if isinstance(node, dict):
+            if "current" in node and "ytd" in node:
+                suffixes.update(("current", "ytd"))
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value)
+
+    visit(schema)
+    return tuple(sorted(suffixes))
+
+
+def _type_name(value) -> str:
+    return "null" if value is None else {
+        dict: "object", list: "array", str: "text", bool: "boolean",
+    }.get(type(value), type(value).__name__)
+
+
+def _is_amount_text(value: str) -> bool:
+    """Whether a string is an amount to_decimal accepts (remembered if so)."""
+    if _AMOUNT.fullmatch(value) is None and to_decimal(value) is None:
+        return False
+    if len(_KNOWN_AMOUNTS) < MAX_KNOWN_AMOUNTS:
+        _KNOWN_AMOUNTS.add(value)
+    return True
+
+
+class _Compiler:
+    """Generates the checking source for the interim skeleton."""
+
+    def __init__(self, suffixes: Tuple[str, ...]):
+        self.suffixes = tuple(f"_{suffix}" for suffix in suffixes)
+        self.lines: List[str] = []
+
+    def is_amount(self, name: str) -> bool:
+        return name == "rate" or name.endswith(self.suffixes)
+
+    def emit(self, depth: int, line: str):
+        self.lines.append("    " * depth + line)
+
+    @staticmethod
+    def error(path: str, message: str) -> str:
+        return f"errors.append((f{path!r}, {message}))"
+
+    def object_fields(self, fields: Dict, var: str, path: str, depth: int, level: int,
+                      required: Tuple[str, ...] = ()):
+        """Checks for each field of an object already known to be a dict."""
+        for name, spec in fields.items():
+            value = f"v{level}"
+            field_path = f"{path}.{name}" if path else name
+            is_required = name in required
+            if is_required:
+                self.emit(depth, f"{value} = {var}.get({name!r}, _MISSING)")
+                self.emit(depth, f"if {value} is _MISSING:")
+                self.emit(depth + 1, self.error(field_path, "'missing'"))
+                if isinstance(spec, (list, dict)):
+                    self.emit(depth, f"elif {value} is None:")
+                    self.emit(depth + 1, self.error(field_path, f"'expected {self.kind(spec)}, got null'"))
+                    branch = "elif"
+                else:
+                    branch = f"elif {value} is not None and"
+            else:
+                self.emit(depth, f"{value} = {var}.get({name!r})")
+                branch = f"if {value} is not None and"
+
+            if isinstance(spec, list):
+                self.emit(depth, f"{branch} {value}.__class__ is not list:")
+                self.emit(depth + 1, self.error(field_path, f"'expected array, got ' + _type_name({value})"))
+                self.emit(depth, "else:" if is_required else f"elif {value} is not None:")
+                self.array(spec[0], value, field_path, depth + 1, level + 1)
+            elif isinstance(spec, dict):
+                self.emit(depth, f"{branch} {value}.__class__ is not dict:")
+                self.emit(depth + 1, self.error(field_path, f"'expected object, got ' + _type_name({value})"))
+                self.emit(depth, "else:" if is_required else f"elif {value} is not None:")
+                self.object_fields(spec, value, field_path, depth + 1, level + 1)
+            elif self.is_amount(name):
+                self.emit(depth, f"{branch} {value}.__class__ is not float and {value}.__class__ is not int:")
+                self.emit(depth + 1, f"if {value}.__class__ is not str:")
+                self.emit(depth + 2, self.error(field_path, f"'expected number, got ' + _type_name({value})"))
+                self.emit(depth + 1, f"elif {value} not in _KNOWN_AMOUNTS and not _is_amount_text({value}):")
+                self.emit(depth + 2, self.error(field_path, f"'not a number: ' + repr({value})"))
+            else:
+                self.emit(depth, f"{branch} {value}.__class__ not in _SCALARS:")
+                self.emit(depth + 1, self.error(field_path, f"'expected text or number, got ' + _type_name({value})"))
+
+    def array(self, item_spec, var: str, path: str, depth: int, level: int,
+              offset: str = "0", required: Tuple[str, ...] = ()):
+        """Loop over an array of objects already known to be a list."""
+        index, item = f"i{level}", f"e{level}"
+        item_path = f"{path}[{{{index}}}]"
+        self.emit(depth, f"for {index}, {item} in enumerate({var}, {offset}):")
+        self.emit(depth + 1, f"if {item}.__class__ is not dict:")
+        self.emit(depth + 2, self.error(item_path, f"'expected object, got ' + _type_name({item})"))
+        self.emit(depth + 2, "continue")
+        self.object_fields(item_spec, item, item_path, depth + 1, level, required)
+
+    @staticmethod
+    def kind(spec) -> str:
+        if isinstance(spec, list):
+            return "array"
+        if isinstance(spec, dict):
+            return "object"
+        return "value"
+
+    def compile(self, skeleton: Dict) -> str:
+        employee = skeleton["employees"][0]
+        self.emit(0, "def check_employees(employees, errors, offset=0):")
+        self.array(employee, "employees", "employees", 1, 0, "offset", REQUIRED_EMPLOYEE_FIELDS)
+        self.emit(0, "")
+        self.emit(0, "def check_interim(data, errors):")
+        self.emit(1, "if data.__class__ is not dict:")
+        self.emit(2, "errors.append(('$', 'expected object, got ' + _type_name(data)))")
+        self.emit(2, "return")
+        header = {name: spec for name, spec in skeleton.items() if name != "employees"}
+        self.object_fields(header, "data", "", 1, 0)
+        self.emit(1, "employees = data.get('employees', _MISSING)")
+        self.emit(1, "if employees is _MISSING:")
+        self.emit(2, "errors.append(('employees', 'missing'))")
+        self.emit(1, "elif employees.__class__ is not list:")
+        self.emit(2, "errors.append(('employees', 'expected array, got ' + _type_name(employees)))")
+        self.emit(1, "else:")
+        self.emit(2, "check_employees(employees, errors)")
+        return "\n".join(self.lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def compiled_source() -> str:
+    """Generated checking source (useful for debugging the validator)."""
+    return _Compiler(amount_suffixes()).compile(interim_skeleton())
+
+
+@lru_cache(maxsize=None)
+def _compiled() -> Dict:
+    namespace = {
+        "_MISSING": _MISSING,
+        "_KNOWN_AMOUNTS": _KNOWN_AMOUNTS,
+        "_SCALARS": frozenset((str, int, float)),
+        "_type_name": _type_name,
+        "_is_amount_text": _is_amount_text,
+    }
+    exec(compile(compiled_source(), "<interim_validator>", "exec"), namespace)
+    return namespace
+
+
+def validate_interim(data) -> List[ValidationError]:
+    """
+    Check a whole interim document.
+
+    Returns:
+        (path, message) for every problem found; empty if the data is valid
+    """
+    errors: List[ValidationError] = []
+    _compiled()["check_interim"](data, errors)
+    return errors
+
+
+def validate_employees(employees: List, offset: int = 0) -> List[ValidationError]:
+    """
+    Check a list of employee records (e.g. one page of Step 2 output).
+
+    Args:
+        employees: Employee records
+        offset: Index of the first record within the document, used in paths
+
+    Returns:
+        (path, message) for every problem found
+    """
+    errors: List[ValidationError] = []
+    _compiled()["check_employees"](employees, errors, offset)
+    return errors
+
+
+def print_errors(errors: List[ValidationError], limit: Optional[int] = 20):
+    """Print validation errors, at most limit of them."""
+    for path, message in errors[:limit]:
+        print(f"  ✗ {path}: {message}")
+    if limit is not None and len(errors) > limit:
+        print(f"  ... and {len(errors) - limit} more")
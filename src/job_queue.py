@@ -0,0 +1,617 @@
+"""
+Distributed Job Queue
+SQLite-backed work queue that lets several worker processes, on one machine or
+on several machines sharing the database file and the outputs folder, run
+the pipeline over many documents.
+Output: extracted.json, interim.json and mapped.json per document, as with `main.py run`
+
+Work units:
+    extract  - one document: Step 1, then one `page` job per page
+    page     - one page: Step 2 LLM extraction; the page result is stored in the queue
+               (payload: the Step 1 page and its prompt role, "header" for page 1)
+    map      - one document: Step 3 on the assembled interim.json
+
+As in a single-process Step 2, a page asked for the report header that has
+none hands the header role on: the worker re-queues the next page with role
+"header" before committing its own result.
+
+The coordinator assembles a document's interim.json from its page results
+once all of them are committed (with merge_page_results, exactly as Step 2
+does in a single process) and then queues its map job.
+
+Jobs are leased for lease_seconds and kept alive by worker heartbeats. When
+a lease expires (the worker crashed or hung) the job becomes available
+again; a job that fails or expires max_attempts times is marked failed.
+Committing a result is idempotent: only the worker holding the lease can
+commit, once; later commits (e.g. from a worker whose expired lease was
+taken over, or of a job re-queued meanwhile) are ignored.
+
+The database must live on a filesystem with working file locks (local disk,
+or a network share that supports them).
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from src.metrics import RunMetrics
+
+DEFAULT_DB_PATH = Path("./outputs") / "queue.db"
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+
+KINDS = ("extract", "page", "map")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    document     TEXT PRIMARY KEY,
+    pdf_path     TEXT NOT NULL,
+    output_dir   TEXT NOT NULL,
+    config       TEXT NOT NULL,
+    state        TEXT NOT NULL DEFAULT 'pending',
+    total_pages  INTEGER,
+    error        TEXT,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind          TEXT NOT NULL,
+    document      TEXT NOT NULL,
+    page_number   INTEGER NOT NULL DEFAULT 0,
+    payload       TEXT NOT NULL,
+    state         TEXT NOT NULL DEFAULT 'pending',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    result        TEXT,
+    error         TEXT,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL,
+    UNIQUE (kind, document, page_number)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, id);
+CREATE INDEX IF NOT EXISTS jobs_by_document ON jobs (document, kind, state);
+"""
+
+
+def default_worker_id() -> str:
+    """host:pid:random, unique per worker process."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """Documents and their extract/page/map jobs in one SQLite database."""
+
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """
+        Args:
+            db_path: SQLite database file (created if missing)
+            lease_seconds: How long a leased job stays reserved without a heartbeat
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), timeout=60, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    # ------------------------------------------
+    # Producers
+    # ------------------------------------------
+
+    def submit(self, document: str, pdf_path: Path, output_dir: Path, config: Optional[Dict] = None,
+               max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> bool:
+        """
+        Queue a document (its extract job). Re-submitting a known document is a no-op.
+
+        Args:
+            document: Document name (unique key, e.g. the PDF stem)
+            pdf_path: PDF the workers read (must be reachable from every worker)
+            output_dir: Folder the artifacts are written to
+            config: {"interim": {...}, "mapped": {...}} stage configs (see build records)
+            max_attempts: Attempts per job before it is marked failed
+
+        Returns:
+            True if the document was newly queued
+        """
+        now = time.time()
+        config = config or {}
+        with self._transaction():
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO documents (document, pdf_path, output_dir, config, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (document, str(pdf_path), str(output_dir), json.dumps(config), now, now),
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._enqueue("extract", document, 0, {}, max_attempts, now)
+        return True
+
+    def enqueue(self, kind: str, document: str, page_number: int = 0, payload: Optional[Dict] = None,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> bool:
+        """Queue one job; returns False if the same (kind, document, page) already exists."""
+        with self._transaction():
+            return self._enqueue(kind, document, page_number, payload or {}, max_attempts, time.time())
+
+    def enqueue_many(self, kind: str, document: str, jobs: Iterable[tuple],
+                     max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        """Queue (page_number, payload) jobs in one transaction; returns the number added."""
+        now = time.time()
+        added = 0
+        with self._transaction():
+            for page_number, payload in jobs:
+                added += self._enqueue(kind, document, page_number, payload, max_attempts, now)
+        return added
+
+    def requeue(self, kind: str, document: str, page_number: int, **payload) -> bool:
+        """
+        Run an existing job again with some payload fields changed (even if it is done).
+
+        Returns:
+            False if the job does not exist or already has that payload
+        """
+        with self._transaction():
+            row = self._db.execute(
+                "SELECT id, payload FROM jobs WHERE kind = ? AND document = ? AND page_number = ?",
+                (kind, document, page_number),
+            ).fetchone()
+            if row is None:
+                return False
+            current = json.loads(row["payload"])
+            updated = {**current, **payload}
+            if updated == current:
+                return False
+            self._db.execute(
+                "UPDATE jobs SET payload = ?, state = 'pending', attempts = 0, lease_owner = NULL, "
+                "lease_expires = NULL, result = NULL, error = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(updated, ensure_ascii=False), time.time(), row["id"]),
+            )
+        return True
+
+    def _enqueue(self, kind: str, document: str, page_number: int, payload: Dict,
+                 max_attempts: int, now: float) -> bool:
+        if kind not in KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO jobs (kind, document, page_number, payload, max_attempts, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (kind, document, page_number, json.dumps(payload, ensure_ascii=False), max_attempts, now, now),
+        )
+        return cursor.rowcount == 1
+
+    # ------------------------------------------
+    # Workers
+    # ------------------------------------------
+
+    def lease(self, worker_id: str, kinds: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """
+        Reserve the oldest available job (pending, or leased with an expired lease).
+
+        Args:
+            worker_id: Identifier of the leasing worker
+            kinds: Only lease these job kinds (default: any)
+
+        Returns:
+            Job dictionary (payload decoded), or None if nothing is available
+        """
+        kinds = tuple(kinds or KINDS)
+        placeholders = ",".join("?" * len(kinds))
+        now = time.time()
+        with self._transaction():
+            # Expired leases that used up their attempts are given up on
+            self._db.execute(
+                "UPDATE jobs SET state = 'failed', error = COALESCE(error, 'lease expired'), "
+                "lease_owner = NULL, updated_at = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = self._db.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({placeholders}) AND "
+                "(state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                "ORDER BY id LIMIT 1",
+                (*kinds, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + self.lease_seconds, now, row["id"]),
+            )
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["attempts"] += 1
+        job["lease_owner"] = worker_id
+        return job
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """Extend a lease; False if the worker no longer holds it."""
+        now = time.time()
+        with self._transaction():
+            cursor = self._db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (now + self.lease_seconds, now, job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: Optional[Dict] = None) -> bool:
+        """
+        Commit a job's result. Idempotent: only the first commit by the lease holder is kept.
+
+        Returns:
+            True if this call committed the result (False if worker_id no longer holds the lease)
+        """
+        with self._transaction():
+            cursor = self._db.execute(
+                "UPDATE jobs SET state = 'done', result = ?, lease_expires = NULL, "
+                "error = NULL, updated_at = ? WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (json.dumps(result, ensure_ascii=False), time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> str:
+        """
+        Release a job after an error: retried if attempts remain, otherwise failed.
+
+        Returns:
+            The job's new state ("pending", "failed", or unchanged if no longer leased by worker_id)
+        """
+        with self._transaction():
+            self._db.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+                "error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (error, time.time(), job_id, worker_id),
+            )
+            row = self._db.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["state"] if row else "missing"
+
+    # ------------------------------------------
+    # Coordinator / status
+    # ------------------------------------------
+
+    def document(self, document: str) -> Optional[Dict]:
+        rows = self._query("SELECT * FROM documents WHERE document = ?", (document,))
+        if not rows:
+            return None
+        info = dict(rows[0])
+        info["config"] = json.loads(info["config"])
+        return info
+
+    def documents(self, states: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Documents, optionally only those in the given states."""
+        rows = self._query("SELECT document FROM documents ORDER BY created_at")
+        documents = [self.document(row["document"]) for row in rows]
+        if states is not None:
+            states = set(states)
+            documents = [info for info in documents if info["state"] in states]
+        return documents
+
+    def update_document(self, document: str, **fields):
+        """Set document columns (state, total_pages, error)."""
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._transaction():
+            self._db.execute(
+                f"UPDATE documents SET {assignments}, updated_at = ? WHERE document = ?",
+                (*fields.values(), time.time(), document),
+            )
+
+    def job_states(self, document: str, kind: str) -> Dict[str, int]:
+        """Job count per state for one document and job kind."""
+        rows = self._query(
+            "SELECT state, COUNT(*) AS n FROM jobs WHERE document = ? AND kind = ? GROUP BY state",
+            (document, kind),
+        )
+        return {row["state"]: row["n"] for row in rows}
+
+    def results(self, document: str, kind: str) -> List[Dict]:
+        """Committed results of a document's jobs of one kind, by page number."""
+        rows = self._query(
+            "SELECT result FROM jobs WHERE document = ? AND kind = ? AND state = 'done' ORDER BY page_number",
+            (document, kind),
+        )
+        return [json.loads(row["result"]) for row in rows]
+
+    def errors(self, document: str) -> List[str]:
+        rows = self._query(
+            "SELECT kind, page_number, error FROM jobs WHERE document = ? AND state = 'failed' ORDER BY id",
+            (document,),
+        )
+        return [f"{row['kind']} page {row['page_number']}: {row['error']}" if row["kind"] == "page"
+                else f"{row['kind']}: {row['error']}" for row in rows]
+
+    def status(self) -> Dict:
+        """Counts of documents and jobs per state."""
+        documents = self._query("SELECT state, COUNT(*) AS n FROM documents GROUP BY state")
+        jobs = self._query("SELECT kind, state, COUNT(*) AS n FROM jobs GROUP BY kind, state")
+        retried = self._query("SELECT COUNT(*) AS n FROM jobs WHERE attempts > 1")[0]
+        job_counts: Dict[str, Dict[str, int]] = {}
+        for row in jobs:
+            job_counts.setdefault(row["kind"], {})[row["state"]] = row["n"]
+        return {
+            "documents": {row["state"]: row["n"] for row in documents},
+            "jobs": job_counts,
+            "retried_jobs": retried["n"],
+        }
+
+    def _transaction(self):
+        return _Transaction(self._db, self._lock)
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """Run a read query (the connection is shared with the heartbeat thread)."""
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, serialized across threads sharing a connection."""
+
+    def __init__(self, db: sqlite3.Connection, lock: threading.Lock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.db
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+        return False
+
+
+class Worker:
+    """Leases jobs and runs the pipeline step each one stands for."""
+
+    def __init__(self, queue: JobQueue, extractor_factory: Callable[[RunMetrics], object],
+                 worker_id: Optional[str] = None, kinds: Optional[Iterable[str]] = None,
+                 metrics: Optional[RunMetrics] = None):
+        """
+        Args:
+            queue: The job queue
+            extractor_factory: Called with run metrics, returns a RawDataExtractor
+                               (e.g. with a replay client); created once per worker
+            worker_id: Lease owner name (default: host:pid:random)
+            kinds: Job kinds this worker takes (default: all)
+            metrics: Metrics accumulated over all jobs this worker runs
+        """
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.kinds = tuple(kinds or KINDS)
+        self.metrics = metrics or RunMetrics(self.worker_id)
+        self.extractor_factory = extractor_factory
+        self._extractor = None
+        self.completed = 0
+        self.failed = 0
+
+    def run(self, max_jobs: Optional[int] = None, idle_timeout: float = 0.0, poll_seconds: float = 1.0) -> int:
+        """
+        Process jobs until max_jobs are done or no job appears for idle_timeout seconds.
+
+        Returns:
+            Number of jobs processed
+        """
+        processed = 0
+        idle_since = time.monotonic()
+        while max_jobs is None or processed < max_jobs:
+            job = self.queue.lease(self.worker_id, self.kinds)
+            if job is None:
+                if time.monotonic() - idle_since >= idle_timeout:
+                    break
+                time.sleep(poll_seconds)
+                continue
+            self.process(job)
+            processed += 1
+            idle_since = time.monotonic()
+        return processed
+
+    def process(self, job: Dict):
+        """Run one leased job, heartbeating while it runs, and commit or release it."""
+        label = job["kind"] if job["kind"] != "page" else f"page {job['page_number']}"
+        print(f"[{self.worker_id}] {job['document']}: {label} (attempt {job['attempts']})")
+        if job["attempts"] > 1:
+            # Leased again after a failure or an expired lease
+            self.metrics.increment("retries")
+        stop = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job, stop), daemon=True)
+        beat.start()
+        try:
+            result = getattr(self, f"_run_{job['kind']}")(job)
+        except Exception as e:
+            state = self.queue.fail(job["id"], self.worker_id, f"{type(e).__name__}: {e}")
+            self.failed += 1
+            print(f"  ✗ {job['document']}: {label} failed ({e}); job is now {state}")
+            return
+        finally:
+            stop.set()
+            beat.join()
+
+        if self.queue.complete(job["id"], self.worker_id, result):
+            self.completed += 1
+        else:
+            print(f"  ⚠ {job['document']}: {label} is no longer leased by this worker; result discarded")
+
+    def _heartbeat(self, job: Dict, stop: threading.Event):
+        interval = max(self.queue.lease_seconds / 3, 0.05)
+        while not stop.wait(interval):
+            if not self.queue.heartbeat(job["id"], self.worker_id):
+                print(f"  ⚠ Lost lease on {job['document']} {job['kind']} {job['page_number']}")
+                return
+
+    def extractor(self):
+        if self._extractor is None:
+            self._extractor = self.extractor_factory(self.metrics)
+        return self._extractor
+
+    def _run_extract(self, job: Dict) -> Dict:
+        """Step 1: write extracted.json and queue one page job per page."""
+        from src.artifacts import build_record, file_sha256, write_artifact
+        from src.step1_pdf_extraction import extract_text_from_pdf
+        from src.text_cache import PageTextCache
+
+        info = self.queue.document(job["document"])
+        pdf_path = Path(info["pdf_path"])
+        output_dir = Path(info["output_dir"])
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        pdf_sha256 = file_sha256(pdf_path)
+        pages = extract_text_from_pdf(str(pdf_path), metrics=self.metrics, cache=PageTextCache(),
+                                      pdf_sha256=pdf_sha256)
+        write_artifact(output_dir / "extracted.json", {
+            "source_file": pdf_path.name,
+            "extraction_timestamp": datetime.now().isoformat(),
+            "total_pages": len(pages),
+            "pages": pages,
+        }, build_record("extracted", {"pdf": {"path": str(pdf_path.resolve()), "sha256": pdf_sha256}}),
+            info["config"].get("artifact_format"))
+
+        self.queue.update_document(job["document"], total_pages=len(pages))
+        self.queue.enqueue_many("page", job["document"], (
+            (page["page_number"], {"page_number": page["page_number"], "text": page["text"],
+                                   "role": "header" if page["page_number"] == 1 else "employees"})
+            for page in pages
+        ), max_attempts=job["max_attempts"])
+        return {"total_pages": len(pages)}
+
+    def _run_page(self, job: Dict) -> Dict:
+        """Step 2 for one page; the result is merged by the coordinator."""
+        from src.model_router import ModelRouter
+        from src.step2_raw_extraction import has_report_header
+
+        extractor = self.extractor()
+        info = self.queue.document(job["document"])
+        interim_config = info["config"].get("interim") or {}
+        if interim_config.get("model"):
+            extractor.model = interim_config["model"]
+        routing = interim_config.get("routing")
+        extractor.router = ModelRouter(**routing) if routing else None
+        extractor.wire_format = bool(interim_config.get("wire_format"))
+        page = dict(job["payload"])
+        role = page.pop("role", None)
+        result = extractor.extract_page(page, role=role)
+        if result.get("error"):
+            # API errors are retried by the queue rather than skipping the page
+            raise RuntimeError(result["error"])
+
+        # Before this page is committed, so the document cannot be assembled without the header pass
+        page_number = job["page_number"]
+        if (role == "header" and not has_report_header(result["report_metadata"])
+                and page_number < (info["total_pages"] or 0)
+                and self.queue.requeue("page", job["document"], page_number + 1, role="header")):
+            print(f"  ⚠ No report header on page {page_number}; asking for it on page {page_number + 1}")
+        return result
+
+    def _run_map(self, job: Dict) -> Dict:
+        """Step 3 on the assembled interim.json."""
+        from src.artifacts import read_artifact, write_mapped_artifact
+        from src.step3_schema_mapping import matcher_from_config
+
+        info = self.queue.document(job["document"])
+        output_dir = Path(info["output_dir"])
+        mapped_config = info["config"].get("mapped") or {}
+        interim = read_artifact(output_dir / "interim.json")
+        mapped = matcher_from_config(mapped_config, metrics=self.metrics).map_interim_to_schema(interim)
+        write_mapped_artifact(output_dir / "mapped.json", mapped, interim, mapped_config)
+        return {"employees": len(mapped.get("employees", []))}
+
+
+class Coordinator:
+    """Assembles interim.json from committed page results and tracks documents to completion."""
+
+    def __init__(self, queue: JobQueue):
+        self.queue = queue
+
+    def step(self) -> List[str]:
+        """
+        Advance every unfinished document once.
+
+        Returns:
+            Messages describing what changed
+        """
+        messages = []
+        for info in self.queue.documents(states=("pending", "mapping")):
+            document = info["document"]
+            if self.queue.job_states(document, "extract").get("failed"):
+                messages.append(self._fail(document))
+                continue
+
+            if info["state"] == "pending":
+                total = info["total_pages"]
+                if total is None:
+                    continue
+                pages = self.queue.job_states(document, "page")
+                if pages.get("failed"):
+                    messages.append(self._fail(document))
+                elif pages.get("done", 0) == total:
+                    messages.append(self.assemble(info))
+            else:
+                maps = self.queue.job_states(document, "map")
+                if maps.get("failed"):
+                    messages.append(self._fail(document))
+                elif maps.get("done"):
+                    self.queue.update_document(document, state="done")
+                    messages.append(f"✓ {document}: mapped.json written")
+        return messages
+
+    def assemble(self, info: Dict) -> str:
+        """Write interim.json from the page results and queue the map job."""
+        from src.artifacts import build_record, pages_hash, read_artifact, write_artifact
+        from src.step2_raw_extraction import merge_page_results, validate_interim_format
+
+        document = info["document"]
+        output_dir = Path(info["output_dir"])
+        extracted = read_artifact(output_dir / "extracted.json")
+        interim = merge_page_results(self.queue.results(document, "page"))
+        if not validate_interim_format(interim):
+            print(f"⚠ Warning: {document}: extracted data may not have expected format")
+
+        interim_config = info["config"].get("interim") or {}
+        write_artifact(output_dir / "interim.json", interim,
+                       build_record("interim", {"extracted": pages_hash(extracted["pages"])}, interim_config),
+                       info["config"].get("artifact_format"))
+        self.queue.enqueue("map", document)
+        self.queue.update_document(document, state="mapping")
+        return f"✓ {document}: interim.json assembled from {info['total_pages']} pages " \
+               f"({len(interim['employees'])} employees)"
+
+    def run(self, poll_seconds: float = 1.0, until_done: bool = True) -> Dict:
+        """
+        Advance documents until none are unfinished (or once, if until_done is False).
+
+        Returns:
+            Queue status
+        """
+        while True:
+            for message in self.step():
+                print(message)
+            if not until_done or not self.queue.documents(states=("pending", "mapping")):
+                return self.queue.status()
+            time.sleep(poll_seconds)
+
+    def _fail(self, document: str) -> str:
+        errors = self.queue.errors(document)
+        self.queue.update_document(document, state="failed", error="; ".join(errors))
+        return f"✗ {document}: failed ({'; '.join(errors)})"
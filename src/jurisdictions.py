@@ -0,0 +1,228 @@
+"""
+Tax Jurisdictions
+Finds the state and locality a tax line belongs to from its description
+("MA: State WH", "OH: Columbus City Tax", "PA EIT", "NYC WH", "State WH - GA").
+Output: (state, locality, authority) per description
+
+All state codes, state names and locality names are compiled into one regex
+(names as a character trie), so a lookup is a single pass over the
+description whose cost does not grow with the table. Per-client overrides
+(e.g. a vendor's own local tax codes) are compiled into the same regex and
+take priority over the built-in table.
+
+Override file format (JSON):
+    {
+        "CITY1": {"state": "OH", "locality": "CITY1", "authority": "Local"},
+        "ORSTT": {"state": "OR", "authority": "State"}
+    }
+"""
+
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+STATES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California",
+    "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware", "FL": "Florida", "GA": "Georgia",
+    "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "IA": "Iowa",
+    "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine", "MD": "Maryland",
+    "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota", "MS": "Mississippi", "MO": "Missouri",
+    "MT": "Montana", "NE": "Nebraska", "NV": "Nevada", "NH": "New Hampshire", "NJ": "New Jersey",
+    "NM": "New Mexico", "NY": "New York", "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio",
+    "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina",
+    "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont",
+    "VA": "Virginia", "WA": "Washington", "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming",
+    "DC": "District of Columbia",
+}
+
+TERRITORIES = {
+    "PR": "Puerto Rico", "GU": "Guam", "VI": "Virgin Islands", "AS": "American Samoa",
+    "MP": "Northern Mariana Islands",
+}
+
+# Locality name or code as printed -> (state, jurisdiction code)
+LOCALITIES = {
+    # New York
+    "NYC": ("NY", "NYC"),
+    "NEW YORK CITY": ("NY", "NYC"),
+    "NY CITY": ("NY", "NYC"),
+    "YONKERS": ("NY", "YONKERS"),
+    "YNK": ("NY", "YONKERS"),
+    # Pennsylvania: Act 32 earned income tax, local services tax, city wage taxes
+    "EIT": ("PA", "PA EIT"),
+    "EARNED INCOME TAX": ("PA", "PA EIT"),
+    "LST": ("PA", "PA LST"),
+    "LOCAL SERVICES TAX": ("PA", "PA LST"),
+    "EMST": ("PA", "PA LST"),
+    "PHILADELPHIA": ("PA", "PHILADELPHIA"),
+    "PHILA": ("PA", "PHILADELPHIA"),
+    "PITTSBURGH": ("PA", "PITTSBURGH"),
+    "SCRANTON": ("PA", "SCRANTON"),
+    "READING": ("PA", "READING"),
+    # Ohio municipal income taxes and collection agencies
+    "COLUMBUS": ("OH", "COLUMBUS"),
+    "CLEVELAND": ("OH", "CLEVELAND"),
+    "CINCINNATI": ("OH", "CINCINNATI"),
+    "TOLEDO": ("OH", "TOLEDO"),
+    "AKRON": ("OH", "AKRON"),
+    "DAYTON": ("OH", "DAYTON"),
+    "YOUNGSTOWN": ("OH", "YOUNGSTOWN"),
+    "CANTON": ("OH", "CANTON"),
+    "RITA": ("OH", "RITA"),
+    "CCA": ("OH", "CCA"),
+    "SCHOOL DISTRICT": ("OH", "OH SCHOOL DISTRICT"),
+    # Michigan city income taxes
+    "DETROIT": ("MI", "DETROIT"),
+    "GRAND RAPIDS": ("MI", "GRAND RAPIDS"),
+    "LANSING": ("MI", "LANSING"),
+    "FLINT": ("MI", "FLINT"),
+    "SAGINAW": ("MI", "SAGINAW"),
+    # Missouri earnings taxes
+    "KANSAS CITY": ("MO", "KANSAS CITY"),
+    "KCMO": ("MO", "KANSAS CITY"),
+    "ST LOUIS": ("MO", "ST LOUIS"),
+    "SAINT LOUIS": ("MO", "ST LOUIS"),
+    # Kentucky occupational taxes
+    "LOUISVILLE": ("KY", "LOUISVILLE"),
+    "LEXINGTON": ("KY", "LEXINGTON"),
+    # Other employee-side local taxes
+    "DENVER": ("CO", "DENVER"),
+    "WILMINGTON": ("DE", "WILMINGTON"),
+    "NEWARK": ("NJ", "NEWARK"),
+    "BIRMINGHAM": ("AL", "BIRMINGHAM"),
+    "TRIMET": ("OR", "TRIMET"),
+    "LANE TRANSIT": ("OR", "LANE TRANSIT"),
+}
+
+_NORMALIZE = re.compile(r"[^A-Z0-9:\-]+")
+_NORMALIZE_PRINTED = re.compile(r"[^A-Za-z0-9:\-]+")
+
+
+def _normalize(description: Optional[str]) -> str:
+    """Upper-case, with punctuation other than ':' and '-' collapsed to single spaces."""
+    return _NORMALIZE.sub(" ", (description or "").upper()).strip()
+
+
+def trie_regex(words: Iterable[str]) -> str:
+    """
+    Build a regex alternation for words, factored as a character trie.
+
+    Longer words sharing a prefix become optional suffixes, so the regex
+    prefers the longest match ("KANSAS CITY" over "KANSAS").
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            if len(branches) == 1 and len(branches[0]) == 1:
+                return body + "?"
+            return "(?:" + body + ")?"
+        return body
+
+    return render(trie)
+
+
+class JurisdictionIndex:
+    """Precompiled state/locality lookup for tax descriptions."""
+
+    def __init__(self, overrides: Optional[Dict[str, Dict]] = None):
+        """
+        Args:
+            overrides: Name/code as printed -> {"state", "locality", "authority"}
+                       entries that take priority over the built-in table
+        """
+        self.codes: Dict[str, str] = {**STATES, **TERRITORIES}
+
+        # Printed name -> (state, locality code or None, authority)
+        self.names: Dict[str, Tuple[Optional[str], Optional[str], str]] = {}
+        for code, name in self.codes.items():
+            self.names[name.upper()] = (code, None, "State")
+        for name, (state, locality) in LOCALITIES.items():
+            self.names[name] = (state, locality, "Local")
+
+        self.overrides: Dict[str, Tuple[Optional[str], Optional[str], str]] = {}
+        for name, entry in (overrides or {}).items():
+            locality = entry.get("locality")
+            authority = entry.get("authority") or ("Local" if locality else "State")
+            self.overrides[_normalize(name)] = (entry.get("state"), locality, authority)
+
+        codes = "|".join(sorted(self.codes))
+        # Overrides come first so they win even where they overlap a state code
+        override = (rf"(?<![A-Z0-9])(?P<override>{trie_regex(self.overrides)})(?![A-Z0-9])|"
+                    if self.overrides else "")
+        self.pattern = re.compile(
+            override
+            # "MA: ...", "PA-EIT", "CA SDI" (state code first, in capitals; checked in lookup)
+            + rf"^(?P<lead>{codes})(?=\s*[:\-]|\s)"
+            # "... - GA", "WH GA" (state code last), "Tax OH: ..." (code before a colon)
+            rf"|(?<=[\s\-])(?P<code>{codes})(?=\s*:|$)"
+            # State, territory and locality names, longest first via the trie
+            rf"|(?<![A-Z0-9])(?P<name>{trie_regex(self.names)})(?![A-Z0-9])"
+        )
+
+    @classmethod
+    def from_file(cls, path: Path) -> "JurisdictionIndex":
+        """Build an index with per-client overrides loaded from a JSON file."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def lookup(self, description: Optional[str]) -> Optional[Tuple[Optional[str], Optional[str], str]]:
+        """
+        Find the jurisdiction of a tax description.
+
+        Returns:
+            (state, locality, authority) with authority "State" or "Local"
+            (or as overridden), or None if no jurisdiction is mentioned
+        """
+        text = _normalize(description)
+        if not text:
+            return None
+        # Same positions as text, original case: a leading code must be printed in capitals
+        printed = _NORMALIZE_PRINTED.sub(" ", description).strip()
+
+        state = None
+        named = None
+        for match in self.pattern.finditer(text):
+            groups = match.groupdict()
+            if groups.get("override"):
+                return self.overrides[groups["override"]]
+            if groups["lead"] and len(printed) == len(text) and not printed[:match.end()].isupper():
+                continue  # "In-State Tax" is not Indiana
+            code = groups["lead"] or groups["code"]
+            if code:
+                state = state or code
+                continue
+            entry = self.names.get(groups["name"])
+            if entry is None:
+                continue
+            # A locality is more specific than a state name
+            if named is None or (entry[1] and not named[1]):
+                named = entry
+
+        if named is not None:
+            named_state, locality, authority = named
+            if locality and state and named_state != state:
+                # e.g. "GA: Columbus ..." is not Columbus, Ohio
+                return state, None, "State"
+            return named_state or state, locality, authority
+        if state is not None:
+            return state, None, "State"
+        return None
+
+
+@lru_cache(maxsize=None)
+def default_index() -> JurisdictionIndex:
+    """Shared index with the built-in table only."""
+    return JurisdictionIndex()
@@ -0,0 +1,220 @@
+"""
+Label Classification
+LLM fallback for earning/deduction/tax descriptions that no alias matches.
+Output: label_cache.json, a persistent label -> type dictionary
+
+Step 3 collects the unique unmatched descriptions of a whole document and
+classifies them with batched calls using the mapper prompt
+(src/prompts/mapper_prompt.py). Every answer, including "Other", is stored in
+the cache and checked before any call, so recurring vendor labels are only
+ever classified once.
+
+Cache format:
+    {
+        "version": 1,
+        "labels": {
+            "deductions|3-caf dental": {"type": "Dental Insurance", "confidence": 0.9,
+                                        "model": "...", "classified_at": "..."}
+        }
+    }
+"""
+
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.metrics import RunMetrics
+from src.prompts.mapper_prompt import get_mapper_prompt
+from src.step2_raw_extraction import DEFAULT_MODEL
+from src.step3_schema_mapping import LINE_TYPES
+
+STAGE = "label_classification"
+CACHE_VERSION = 1
+DEFAULT_CACHE_PATH = Path("./outputs") / "label_cache.json"
+
+# Labels per LLM call
+BATCH_SIZE = 100
+
+# LLM classifications never outrank an alias match (0.85)
+MAX_CONFIDENCE = 0.8
+
+# Section name -> "type" value used in the mapper prompt
+PROMPT_TYPES = {"earnings": "earning", "deductions": "deduction", "taxes": "tax"}
+
+
+def label_key(section: str, description: str) -> str:
+    """Cache key: section plus the whitespace-collapsed, lower-cased description."""
+    normalized = re.sub(r'\s+', ' ', description or '').strip().lower()
+    return f"{section}|{normalized}"
+
+
+class LabelClassifier:
+    """Persistent, batched LLM classifier for unmatched labels."""
+
+    def __init__(self, client=None, model: str = DEFAULT_MODEL,
+                 cache_path: Optional[Path] = DEFAULT_CACHE_PATH,
+                 metrics: Optional[RunMetrics] = None, batch_size: int = BATCH_SIZE):
+        """
+        Args:
+            client: Client exposing messages.create; a live Anthropic client is
+                    created on first use if None (never, when the cache is warm)
+            model: Claude model to classify with
+            cache_path: JSON cache file (None keeps the cache in memory only)
+            metrics: Optional run metrics to record API usage into
+            batch_size: Maximum labels per LLM call
+        """
+        self.client = client
+        self.model = model
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.metrics = metrics or RunMetrics()
+        self.batch_size = batch_size
+        self.labels: Dict[str, Dict] = self._load()
+
+    def lookup(self, section: str, description: str) -> Optional[Tuple[str, float]]:
+        """Cached (type, confidence) for a label, or None if never classified."""
+        entry = self.labels.get(label_key(section, description))
+        if entry is None:
+            return None
+        return entry["type"], entry["confidence"]
+
+    def classify(self, labels: Iterable[Tuple[str, str]]) -> int:
+        """
+        Make sure every (section, description) label is in the cache.
+
+        Labels are de-duplicated and only cache misses are sent to the LLM.
+
+        Args:
+            labels: (section, raw description) pairs
+
+        Returns:
+            Number of labels newly classified
+        """
+        missing: Dict[str, Tuple[str, str]] = {}
+        hits = 0
+        for section, description in labels:
+            if not description:
+                continue
+            key = label_key(section, description)
+            if key in self.labels:
+                hits += 1
+            elif key not in missing:
+                missing[key] = (section, description)
+
+        self.metrics.increment("label_cache_hits", hits)
+        if not missing:
+            return 0
+
+        classified = 0
+        with self.metrics.stage(STAGE) as stage_info:
+            pending = list(missing.items())
+            for start in range(0, len(pending), self.batch_size):
+                classified += self._classify_batch(pending[start:start + self.batch_size])
+            stage_info["labels"] = len(pending)
+            stage_info["classified"] = classified
+
+        if classified:
+            self._save()
+        self.metrics.increment("labels_classified", classified)
+        return classified
+
+    def _classify_batch(self, batch: List[Tuple[str, Tuple[str, str]]]) -> int:
+        """Classify one batch with a single call; returns the number cached."""
+        prompt_labels = [
+            {"id": index, "type": PROMPT_TYPES[section], "raw_description": description}
+            for index, (_, (section, description)) in enumerate(batch)
+        ]
+        print(f"Classifying {len(batch)} unmatched labels...")
+
+        try:
+            client = self._client()
+            start = time.perf_counter()
+            message = client.messages.create(
+                model=self.model,
+                max_tokens=4096,
+                temperature=0,
+                messages=[
+                    {"role": "user", "content": get_mapper_prompt(prompt_labels, LINE_TYPES)}
+                ]
+            )
+            self.metrics.record_api_call(STAGE, None, self.model, message, time.perf_counter() - start)
+            answers = json.loads(message.content[0].text)
+        except json.JSONDecodeError as e:
+            print(f"  ✗ Error parsing label classification: {e}")
+            self.metrics.increment("parse_failures")
+            return 0
+        except Exception as e:
+            print(f"  ✗ Error classifying labels: {e}")
+            return 0
+
+        if not isinstance(answers, list):
+            print("  ✗ Label classification did not return a JSON array")
+            self.metrics.increment("parse_failures")
+            return 0
+
+        classified_at = datetime.now().isoformat()
+        cached = 0
+        for answer in answers:
+            if not isinstance(answer, dict) or not isinstance(answer.get('id'), int):
+                continue
+            if not 0 <= answer['id'] < len(batch):
+                continue
+            key, (section, _) = batch[answer['id']]
+            mapped_type = answer.get('mapped_type')
+            if mapped_type not in LINE_TYPES[section]:
+                mapped_type = "Other"
+            try:
+                confidence = float(answer.get('confidence') or 0.0)
+            except (TypeError, ValueError):
+                confidence = 0.0
+            if mapped_type == "Other":
+                confidence = 0.3
+            self.labels[key] = {
+                "type": mapped_type,
+                "confidence": round(min(max(confidence, 0.0), MAX_CONFIDENCE), 2),
+                "model": self.model,
+                "classified_at": classified_at,
+            }
+            cached += 1
+
+        print(f"  ✓ Classified {cached} of {len(batch)} labels")
+        return cached
+
+    def _client(self):
+        """Client for live calls, created lazily so a warm cache needs no API key."""
+        if self.client is None:
+            from src.step2_raw_extraction import RawDataExtractor
+            self.client = RawDataExtractor(model=self.model, metrics=self.metrics).client
+        return self.client
+
+    def _load(self) -> Dict[str, Dict]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠ Warning: Ignoring unreadable label cache {self.cache_path}: {e}")
+            return {}
+        if data.get("version") != CACHE_VERSION:
+            return {}
+        return data.get("labels") or {}
+
+    def _save(self):
+        """Write the cache atomically, merging entries other processes added meanwhile."""
+        if self.cache_path is None:
+            return
+        labels = self._load()
+        labels.update(self.labels)
+        self.labels = labels
+
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_path.parent, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"version": CACHE_VERSION, "labels": labels}, f, indent=1,
+                      ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.cache_path)
@@ -0,0 +1,388 @@
+"""
+Register Diff
+Compares two mapped.json outputs (e.g. last week's and this week's register)
+employee by employee and line by line.
+Output: added/removed employees and per-employee line changes, e.g.
+    {"employee_name": "Doe, Jane", "changes": [{"section": "earnings",
+     "type": "Overtime", "code": "1", "change": "amount", "old": 120.0,
+     "new": 310.5, "delta": 190.5}]}
+
+Employees are joined on employee_id, falling back to the normalized name
+when either side has no ID. Line items are keyed by section, normalized type
+and code (the description when there is no code); lines sharing a key are
+summed. Current-period amounts and the employee totals are compared, and
+only deltas of at least the threshold are reported (YTD amounts grow every
+period, so they are not compared).
+
+Both files are read as a stream (one employee at a time, full or compact
+format). The old file is reduced to a hash table of per-employee line sums
+and the new file is probed against it, so the diff is O(n) in time and only
+holds one side's line sums in memory.
+"""
+
+import json
+import re
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.amounts import to_decimal, decimal_to_json
+
+DEFAULT_THRESHOLD = Decimal("0.01")
+
+READ_CHUNK = 1 << 20
+
+# (section, line list, code key, description key, type key, amount key)
+LINE_SECTIONS = [
+    ("earnings", ("earnings", "earning_lines"), "earning_code", "earning_description", "earning_type", "amount"),
+    ("deductions", ("deductions", "deduction_lines"), "deduction_code", "deduction_description",
+     "deduction_type", "amount"),
+    ("taxes", ("employee_taxes", "tax_lines"), "tax_code", "tax_description", "tax_type", "tax_amount"),
+]
+
+TOTAL_FIELDS = ["gross_pay", "total_employee_taxes", "total_deductions", "net_pay"]
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+LineKey = Tuple[str, str, str]
+
+
+class MappedReader:
+    """
+    Streams the employees of a mapped.json without loading the whole file.
+
+    Usage:
+        reader = MappedReader(path)
+        for emp in reader.employees():
+            ...
+        reader.header  # every other top-level key (metadata, build, ...)
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.header: Dict = {}
+        self._decoder = json.JSONDecoder()
+
+    def employees(self) -> Iterator[Dict]:
+        """Yield employees in file order; header fills in as keys are passed."""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self._file = f
+            self._buffer = ""
+            self._pos = 0
+            self._eof = False
+
+            self._expect("{")
+            if self._peek() == "}":
+                return
+            while True:
+                key = self._value()
+                self._expect(":")
+                if key == "employees" and self._peek() == "[":
+                    yield from self._array()
+                else:
+                    self.header[key] = self._value()
+                if self._next_char() == "}":
+                    return
+                # Otherwise it was the "," before the next key
+
+    def _array(self) -> Iterator[Dict]:
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._next_char() == "]":
+                return
+
+    def _fill(self) -> bool:
+        """Read more of the file into the buffer; False at end of file."""
+        if self._eof:
+            return False
+        if self._pos > READ_CHUNK:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        # Reading as much again as is buffered keeps large values linear to decode
+        chunk = self._file.read(max(READ_CHUNK, len(self._buffer) - self._pos))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def _peek(self) -> str:
+        """Next non-whitespace character (not consumed)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError(f"{self.path}: unexpected end of file")
+
+    def _next_char(self) -> str:
+        char = self._peek()
+        self._pos += 1
+        return char
+
+    def _expect(self, char: str):
+        found = self._next_char()
+        if found != char:
+            raise ValueError(f"{self.path}: expected {char!r} at offset {self._pos - 1}, found {found!r}")
+
+    def _value(self):
+        """Decode the next JSON value, reading more of the file until it is complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number at the buffer's end may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+def normalize(text) -> str:
+    """Case- and punctuation-insensitive form of a name, type or code."""
+    if text is None:
+        return ""
+    return _NON_WORD.sub(" ", str(text)).strip().casefold()
+
+
+def employee_keys(emp: Dict) -> Tuple[Optional[str], str]:
+    """(normalized employee_id or None, normalized name) join keys."""
+    info = emp.get('employee_info') or {}
+    employee_id = normalize(info.get('employee_id')).lstrip("0") or None
+    return employee_id, normalize(info.get('employee_name'))
+
+
+def _block(node: Dict, *path: str) -> Dict:
+    for key in path:
+        node = node.get(key) or {}
+    return node
+
+
+@lru_cache(maxsize=65536)
+def _label_key(text) -> str:
+    """normalize() for line types, codes and descriptions, which repeat across employees."""
+    return normalize(text)
+
+
+def summarize_employee(emp: Dict) -> Dict:
+    """
+    Reduce a mapped employee to what the diff compares.
+
+    Amounts are kept as found in the file (equal raw values need no parsing);
+    lines sharing a key are summed as Decimals.
+
+    Returns:
+        {"employee_name", "employee_id", "department",
+         "lines": {(section, type, code): amount},
+         "labels": {(section, type, code): (type, code or description)},
+         "totals": {field: amount}}
+    """
+    info = emp.get('employee_info') or {}
+    lines: Dict[LineKey, Any] = {}
+    labels: Dict[LineKey, tuple] = {}
+    for section, path, code_key, description_key, type_key, amount_key in LINE_SECTIONS:
+        for line in _block(emp, path[0]).get(path[1]) or []:
+            type_value = (line.get(type_key) or {}).get('value')
+            code = line.get(code_key)
+            if code is None:
+                code = line.get(description_key)
+            key = (section, _label_key(type_value), _label_key(code))
+            amount = (line.get(amount_key) or {}).get('current')
+            if key in lines:
+                total, amount = to_decimal(lines[key]), to_decimal(amount)
+                if amount is not None:
+                    lines[key] = amount if total is None else total + amount
+            else:
+                lines[key] = amount
+                labels[key] = (type_value, code)
+
+    totals_block = emp.get('employee_totals') or {}
+    return {
+        "employee_name": info.get('employee_name'),
+        "employee_id": info.get('employee_id'),
+        "department": info.get('department'),
+        "lines": lines,
+        "labels": labels,
+        "totals": {field: (totals_block.get(field) or {}).get('current') for field in TOTAL_FIELDS},
+    }
+
+
+def _delta(old: Optional[Decimal], new: Optional[Decimal]) -> Decimal:
+    return (new or Decimal(0)) - (old or Decimal(0))
+
+
+class RegisterDiff:
+    """Streaming hash-join diff of two mapped outputs."""
+
+    def __init__(self, threshold: Decimal = DEFAULT_THRESHOLD, percent: Optional[float] = None):
+        """
+        Args:
+            threshold: Smallest absolute amount change reported
+            percent: Optionally also require a change of at least this many
+                     percent of the old amount
+        """
+        self.threshold = Decimal(str(threshold))
+        self.percent = percent
+
+    def diff(self, old_path: Path, new_path: Path) -> Dict:
+        """
+        Compare two mapped.json files.
+
+        Returns:
+            {"old", "new", "threshold", "summary", "added", "removed", "changed"}
+        """
+        old_reader, new_reader = MappedReader(old_path), MappedReader(new_path)
+
+        # Build side: the old file's employees, reduced to line sums
+        table: Dict[int, Dict] = {}
+        by_id: Dict[str, List[int]] = {}
+        by_name: Dict[str, List[int]] = {}
+        for row, emp in enumerate(old_reader.employees()):
+            employee_id, name = employee_keys(emp)
+            table[row] = summarize_employee(emp)
+            table[row]["_id"] = employee_id
+            if employee_id:
+                by_id.setdefault(employee_id, []).append(row)
+            by_name.setdefault(name, []).append(row)
+        old_count = len(table)
+
+        # Probe side: stream the new file against the table
+        added, changed = [], []
+        matched = matched_by_name = new_count = 0
+        for emp in new_reader.employees():
+            new_count += 1
+            employee_id, name = employee_keys(emp)
+            row, on_name = self._match(table, by_id, by_name, employee_id, name)
+            summary = summarize_employee(emp)
+            if row is None:
+                added.append(self._employee_entry(summary))
+                continue
+            old = table.pop(row)
+            matched += 1
+            matched_by_name += on_name
+            changes = self._compare(old, summary)
+            if changes:
+                entry = self._employee_entry(summary)
+                entry["matched_on"] = "name" if on_name else "employee_id"
+                entry["changes"] = changes
+                changed.append(entry)
+
+        removed = [self._employee_entry(old) for old in table.values()]
+        return {
+            "old": self._describe(old_path, old_reader.header),
+            "new": self._describe(new_path, new_reader.header),
+            "threshold": decimal_to_json(self.threshold),
+            "percent": self.percent,
+            "summary": {
+                "old_employees": old_count,
+                "new_employees": new_count,
+                "matched": matched,
+                "matched_by_name": matched_by_name,
+                "added": len(added),
+                "removed": len(removed),
+                "changed": len(changed),
+            },
+            "added": added,
+            "removed": removed,
+            "changed": changed,
+        }
+
+    @staticmethod
+    def _match(table: Dict[int, Dict], by_id: Dict[str, List[int]], by_name: Dict[str, List[int]],
+               employee_id: Optional[str], name: str) -> Tuple[Optional[int], bool]:
+        """Unmatched old-side row for a new employee, and whether it matched on name."""
+        if employee_id:
+            for row in by_id.get(employee_id, ()):
+                if row in table:
+                    return row, False
+        # Fall back to the name, but never pair two different employee IDs
+        for row in by_name.get(name, ()):
+            if row in table and (table[row]["_id"] is None or employee_id is None):
+                return row, True
+        return None, False
+
+    def _compare(self, old: Dict, new: Dict) -> List[Dict]:
+        changes = []
+        for field in TOTAL_FIELDS:
+            change = self._change(old["totals"][field], new["totals"][field])
+            if change:
+                changes.append({"section": "totals", "field": field, **change})
+
+        old_lines, new_lines = old["lines"], new["lines"]
+        for key in dict.fromkeys([*old_lines, *new_lines]):
+            in_old, in_new = key in old_lines, key in new_lines
+            kind = "amount" if in_old and in_new else ("added" if in_new else "removed")
+            change = self._change(old_lines.get(key), new_lines.get(key), kind)
+            if change:
+                label = " ".join(str(part) for part in new["labels"].get(key) or old["labels"][key] if part)
+                changes.append({"section": key[0], "type": key[1] or None, "code": key[2] or None,
+                                "label": label, **change})
+        return changes
+
+    def _change(self, old, new, kind: str = "amount") -> Optional[Dict]:
+        """A reportable change (amount change, added or removed line), or None if below the threshold."""
+        if old == new and old.__class__ is new.__class__:
+            return None
+        old, new = to_decimal(old), to_decimal(new)
+        delta = _delta(old, new)
+        if not delta or abs(delta) < self.threshold:
+            return None
+        if kind == "amount" and self.percent is not None and old:
+            if abs(delta) * 100 < abs(old) * Decimal(str(self.percent)):
+                return None
+        return {"change": kind, "old": decimal_to_json(old), "new": decimal_to_json(new),
+                "delta": decimal_to_json(delta)}
+
+    @staticmethod
+    def _employee_entry(summary: Dict) -> Dict:
+        return {"employee_name": summary["employee_name"], "employee_id": summary["employee_id"],
+                "department": summary["department"]}
+
+    @staticmethod
+    def _describe(path: Path, header: Dict) -> Dict:
+        report = _block(header, 'metadata', 'report_metadata')
+        period = report.get('report_period') or {}
+        return {
+            "path": str(path),
+            "company_name": _block(report, 'employer_info').get('company_name'),
+            "period_start_date": period.get('period_start_date'),
+            "period_end_date": period.get('period_end_date'),
+            "check_date": period.get('check_date'),
+        }
+
+
+def print_diff(report: Dict, limit: Optional[int] = 20):
+    """Print a diff summary with up to limit entries per list."""
+    summary = report["summary"]
+    for side in ("old", "new"):
+        info = report[side]
+        print(f"  {side}: {info['path']} ({info['company_name'] or '?'}, "
+              f"{info['period_start_date'] or '?'} to {info['period_end_date'] or '?'})")
+    print(f"  Employees: {summary['old_employees']} -> {summary['new_employees']} "
+          f"({summary['matched']} matched, {summary['matched_by_name']} by name)")
+    print(f"  Added: {summary['added']}, removed: {summary['removed']}, changed: {summary['changed']}")
+
+    for title, entries in (("Added", report["added"]), ("Removed", report["removed"])):
+        for entry in entries[:limit]:
+            print(f"    {'+' if title == 'Added' else '-'} {entry['employee_name']} ({entry['employee_id'] or 'no ID'})")
+        if limit is not None and len(entries) > limit:
+            print(f"    ... and {len(entries) - limit} more {title.lower()}")
+
+    for entry in report["changed"][:limit]:
+        print(f"    ~ {entry['employee_name']} ({entry['employee_id'] or 'no ID'})")
+        for change in entry["changes"]:
+            label = change.get("field") or change.get("label") or change["section"]
+            print(f"        {change['section']}: {label}: {change['change']} "
+                  f"{change['old']} -> {change['new']} ({change['delta']:+})")
+    if limit is not None and len(report["changed"]) > limit:
+        print(f"    ... and {len(report['changed']) - limit} more changed")
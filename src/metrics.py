@@ -0,0 +1,237 @@
+"""
+Run Metrics
+Records per-stage and per-page timings, LLM token usage, stop reasons and
+peak memory for a pipeline run.
+Output: metrics.json (and optionally metrics.prom in Prometheus text format)
+"""
+
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Counters every run reports, even when zero
+RUN_COUNTERS = [
+    "api_calls",
+    "input_tokens",
+    "output_tokens",
+    "retries",
+    "escalations",
+    "hedged_requests",
+    "hedge_wins",
+    "truncations",
+    "repairs",
+    "parse_failures",
+    "skipped_pages",
+    "validation_errors",
+    "label_cache_hits",
+    "labels_classified",
+    "text_cache_hits",
+    "text_cache_misses",
+    "anomalies",
+    "ungrounded_values",
+    "reused_employees",
+]
+
+
+def peak_memory_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RunMetrics:
+    """Collects instrumentation for one document run."""
+
+    def __init__(self, document: Optional[str] = None):
+        """
+        Args:
+            document: Name of the document being processed (used as a label)
+        """
+        self.document = document
+        self.started_at = datetime.now().isoformat()
+        self._start = time.perf_counter()
+        self.stages: Dict[str, Dict] = {}
+        self.pages: Dict[int, Dict[str, Dict]] = {}
+        self.counters = Counter({name: 0 for name in RUN_COUNTERS})
+        self.stop_reasons = Counter()
+        self.models: Dict[str, Dict] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a pipeline stage.
+
+        Usage:
+            with metrics.stage("step1_pdf_extraction") as info:
+                ...
+                info["pages"] = len(pages)
+        """
+        info = self.stages.setdefault(name, {})
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield info
+        finally:
+            info["wall_seconds"] = round(info.get("wall_seconds", 0.0) + time.perf_counter() - wall_start, 6)
+            info["cpu_seconds"] = round(info.get("cpu_seconds", 0.0) + time.process_time() - cpu_start, 6)
+            info["peak_memory_bytes"] = peak_memory_bytes()
+
+    @contextmanager
+    def page(self, stage: str, page_number: int):
+        """
+        Time the work done for one page within a stage.
+
+        Yields the page record so callers can attach extra fields.
+        """
+        record = self.pages.setdefault(page_number, {}).setdefault(stage, {})
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = round(record.get("wall_seconds", 0.0) + time.perf_counter() - start, 6)
+
+    def increment(self, name: str, amount: int = 1, page_number: Optional[int] = None,
+                  stage: Optional[str] = None):
+        """Increment a run counter, and the page's copy of it if a page is given."""
+        self.counters[name] += amount
+        if page_number is not None and stage is not None:
+            record = self.pages.setdefault(page_number, {}).setdefault(stage, {})
+            record[name] = record.get(name, 0) + amount
+
+    def record_api_call(self, stage: str, page_number: Optional[int], model: str,
+                        message, elapsed: float):
+        """
+        Record one LLM call from its response message.
+
+        Args:
+            stage: Stage the call belongs to
+            page_number: Page the call was made for (None for document-level calls)
+            model: Model name used for the call
+            message: Anthropic response message (uses .usage and .stop_reason)
+            elapsed: Wall time of the call in seconds
+        """
+        usage = getattr(message, "usage", None)
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        stop_reason = getattr(message, "stop_reason", None)
+
+        self.increment("api_calls", 1, page_number, stage)
+        self.increment("input_tokens", input_tokens, page_number, stage)
+        self.increment("output_tokens", output_tokens, page_number, stage)
+        self.stop_reasons[stop_reason or "unknown"] += 1
+
+        model_stats = self.models.setdefault(model, {
+            "api_calls": 0, "input_tokens": 0, "output_tokens": 0, "api_seconds": 0.0
+        })
+        model_stats["api_calls"] += 1
+        model_stats["input_tokens"] += input_tokens
+        model_stats["output_tokens"] += output_tokens
+        model_stats["api_seconds"] = round(model_stats["api_seconds"] + elapsed, 6)
+
+        if page_number is not None:
+            record = self.pages.setdefault(page_number, {}).setdefault(stage, {})
+            record["api_seconds"] = round(record.get("api_seconds", 0.0) + elapsed, 6)
+            record["model"] = model
+            record.setdefault("stop_reasons", []).append(stop_reason)
+
+    def to_dict(self) -> Dict:
+        """Return all metrics as a JSON-serializable dictionary."""
+        return {
+            "document": self.document,
+            "started_at": self.started_at,
+            "total_wall_seconds": round(time.perf_counter() - self._start, 6),
+            "peak_memory_bytes": peak_memory_bytes(),
+            "counters": dict(self.counters),
+            "stop_reasons": dict(self.stop_reasons),
+            "models": self.models,
+            "stages": self.stages,
+            "pages": {str(number): stages for number, stages in sorted(self.pages.items())},
+        }
+
+    def write_json(self, path: Path) -> Path:
+        """Write metrics.json."""
+        path = Path(path)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def to_prometheus(self) -> str:
+        """Render the metrics in Prometheus text exposition format."""
+        doc = _escape_label(self.document or "")
+        lines = []
+
+        def metric(name: str, help_text: str, kind: str, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ",".join([f'document="{doc}"'] + [
+                    f'{key}="{_escape_label(str(val))}"' for key, val in labels.items()
+                ])
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        data = self.to_dict()
+
+        metric("payroll_run_seconds", "Total wall time of the run", "gauge",
+               [({}, data["total_wall_seconds"])])
+        metric("payroll_peak_memory_bytes", "Peak resident memory of the process", "gauge",
+               [({}, data["peak_memory_bytes"])])
+        metric("payroll_stage_seconds", "Wall time per pipeline stage", "gauge",
+               [({"stage": stage}, info.get("wall_seconds")) for stage, info in self.stages.items()])
+        metric("payroll_stage_cpu_seconds", "CPU time per pipeline stage", "gauge",
+               [({"stage": stage}, info.get("cpu_seconds")) for stage, info in self.stages.items()])
+
+        for counter in sorted(self.counters):
+            metric(f"payroll_{counter}_total", f"Run counter: {counter}", "counter",
+                   [({}, self.counters[counter])])
+
+        metric("payroll_stop_reasons_total", "LLM responses by stop reason", "counter",
+               [({"reason": reason}, count) for reason, count in self.stop_reasons.items()])
+        metric("payroll_model_api_calls_total", "LLM calls per model", "counter",
+               [({"model": model}, stats["api_calls"]) for model, stats in self.models.items()])
+        metric("payroll_model_tokens_total", "LLM tokens per model", "counter",
+               [({"model": model, "direction": direction}, stats[f"{direction}_tokens"])
+                for model, stats in self.models.items() for direction in ("input", "output")])
+        metric("payroll_page_seconds", "Wall time per page and stage", "gauge",
+               [({"stage": stage, "page": number}, record.get("wall_seconds"))
+                for number, stages in sorted(self.pages.items()) for stage, record in stages.items()])
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path) -> Path:
+        """Write metrics in Prometheus text format (e.g. for a textfile collector)."""
+        path = Path(path)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        return path
+
+    def print_summary(self):
+        """Print a short per-stage summary."""
+        print("\n  Run metrics:")
+        for stage, info in self.stages.items():
+            print(f"    {stage}: {info.get('wall_seconds', 0.0):.2f}s")
+        c = self.counters
+        print(f"    API calls: {c['api_calls']} "
+              f"(tokens in/out: {c['input_tokens']}/{c['output_tokens']}, "
+              f"truncations: {c['truncations']}, repairs: {c['repairs']}, retries: {c['retries']}, "
+              f"escalations: {c['escalations']})")
+
+
+def _escape_label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
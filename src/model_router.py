@@ -0,0 +1,153 @@
+"""
+Model Routing for Step 2
+Scores each page's extraction difficulty and sends easy pages to a fast model
+and hard pages to a stronger one, escalating to the stronger model when the
+fast model's answer is truncated or unparseable.
+Output: routed model per page, plus per-model routing/latency/cost stats
+
+Difficulty score (0-1) is a weighted sum of three features, each capped at 1:
+    employee blocks   - "Last, First M." name lines or masked SSNs   (weight 0.5, full at 8)
+    numeric density   - share of whitespace tokens that are amounts  (weight 0.25, full at 0.5)
+    text length       - characters of page text                      (weight 0.25, full at 4,000)
+
+Pages scoring at or above the threshold go straight to the strong model.
+Tune the threshold with the per-model stats written to metrics.json.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from src.metrics import RunMetrics
+from src.step2_raw_extraction import DEFAULT_MODEL
+
+STRONG_MODEL = "claude-3-5-sonnet-20241022"
+DEFAULT_THRESHOLD = 0.6
+
+WEIGHTS = {"employee_blocks": 0.5, "numeric_density": 0.25, "text_length": 0.25}
+SATURATION = {"employee_blocks": 8, "numeric_density": 0.5, "text_length": 4000}
+
+# Output token limit per model (escalation also buys a larger response budget)
+MAX_TOKENS = {
+    "claude-3-haiku-20240307": 4096,
+    "claude-3-5-haiku-20241022": 8192,
+    "claude-3-5-sonnet-20241022": 8192,
+}
+DEFAULT_MAX_TOKENS = 4096
+
+# USD per million (input, output) tokens, for cost estimates only
+PRICES = {
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+}
+
+_NAME_LINE = re.compile(r"^[A-Z][A-Za-z'\-]+, [A-Z][A-Za-z'\-]+(?: [A-Z]\.?)?$", re.M)
+_MASKED_SSN = re.compile(r"(?:\*{3,}|XXX-XX-)\d{4}")
+_AMOUNT = re.compile(r"^-?\$?\(?[\d,]*\d(?:\.\d+)?\)?-?$")
+
+
+def page_features(text: str) -> Dict[str, float]:
+    """Raw difficulty features of one page's text."""
+    tokens = text.split()
+    amounts = sum(1 for token in tokens if _AMOUNT.match(token))
+    return {
+        "employee_blocks": max(len(_NAME_LINE.findall(text)), len(_MASKED_SSN.findall(text))),
+        "numeric_density": round(amounts / len(tokens), 3) if tokens else 0.0,
+        "text_length": len(text),
+    }
+
+
+def complexity_score(features: Dict[str, float]) -> float:
+    """Weighted, capped combination of page features (0 = trivial, 1 = hardest)."""
+    score = sum(
+        weight * min(features[name] / SATURATION[name], 1.0)
+        for name, weight in WEIGHTS.items()
+    )
+    return round(score, 3)
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    """Estimated USD cost of the given token usage (None for unpriced models)."""
+    price = PRICES.get(model)
+    if price is None:
+        return None
+    return round((input_tokens * price[0] + output_tokens * price[1]) / 1_000_000, 6)
+
+
+class ModelRouter:
+    """Chooses the Step 2 model for each page."""
+
+    def __init__(self, fast_model: str = DEFAULT_MODEL, strong_model: str = STRONG_MODEL,
+                 threshold: float = DEFAULT_THRESHOLD):
+        """
+        Args:
+            fast_model: Model for pages scoring below the threshold
+            strong_model: Model for hard pages and for escalations
+            threshold: Score at or above which a page goes to the strong model
+        """
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.threshold = threshold
+        # Model -> {"pages": routed first, "escalations": received as escalation target}
+        self.routed: Dict[str, Dict[str, int]] = {}
+
+    def config(self) -> Dict:
+        """Routing settings, recorded in the interim build record."""
+        return {"fast_model": self.fast_model, "strong_model": self.strong_model,
+                "threshold": self.threshold}
+
+    def plan(self, page: Dict, page_info: Optional[Dict] = None) -> List[str]:
+        """
+        Models to try for a page, in order (the first one plus escalations).
+
+        Args:
+            page: Page dictionary with 'text'
+            page_info: Optional per-page metrics record to annotate with the score
+
+        Returns:
+            [fast_model, strong_model] for easy pages, [strong_model] for hard ones
+        """
+        features = page_features(page.get('text') or '')
+        score = complexity_score(features)
+        models = [self.strong_model] if score >= self.threshold else [self.fast_model, self.strong_model]
+        # Same model twice (e.g. --strong-model equal to the default) never escalates
+        models = list(dict.fromkeys(models))
+
+        self.routed.setdefault(models[0], {"pages": 0, "escalations": 0})["pages"] += 1
+        if page_info is not None:
+            page_info["route_score"] = score
+            page_info["route_features"] = features
+            page_info["routed_model"] = models[0]
+        return models
+
+    def max_tokens(self, model: str) -> int:
+        """Output token limit to request from model."""
+        return MAX_TOKENS.get(model, DEFAULT_MAX_TOKENS)
+
+    def escalated(self, model: str):
+        """Record that a page was escalated to model."""
+        self.routed.setdefault(model, {"pages": 0, "escalations": 0})["escalations"] += 1
+
+    def report(self, metrics: RunMetrics) -> Dict:
+        """
+        Per-model routing, latency and cost stats for tuning the threshold.
+
+        Returns:
+            {"threshold": ..., "models": {model: {"pages", "escalations", "api_calls",
+             "mean_latency_seconds", "input_tokens", "output_tokens", "estimated_cost_usd"}}}
+        """
+        models = {}
+        for model in dict.fromkeys([*self.routed, *metrics.models]):
+            usage = metrics.models.get(model, {})
+            calls = usage.get("api_calls", 0)
+            input_tokens = usage.get("input_tokens", 0)
+            output_tokens = usage.get("output_tokens", 0)
+            models[model] = {
+                **self.routed.get(model, {"pages": 0, "escalations": 0}),
+                "api_calls": calls,
+                "mean_latency_seconds": round(usage.get("api_seconds", 0.0) / calls, 3) if calls else None,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "estimated_cost_usd": estimate_cost(model, input_tokens, output_tokens),
+            }
+        return {**self.config(), "models": models}
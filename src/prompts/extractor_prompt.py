@@ -1,15 +1,25 @@
-"""Payroll extraction prompt - optimized for Haiku token limits"""
+"""Payroll extraction prompts - optimized for Haiku token limits
 
-EXTRACTOR_PROMPT_TEMPLATE = """Extract payroll data AS-IS to JSON. Keep exact codes/descriptions.
+Two page roles share the same rules and employee format:
+    header     - report_metadata + employees (the first page, or later pages
+                 until a report header has been found)
+    employees  - employees only, so pages after the header do not re-emit
+                 the metadata block in every response
+
+Either role can ask for the compact positional wire format instead of keyed
+JSON (WIRE_PROMPT_TEMPLATE, expanded locally by src/wire_format.py).
+"""
+
+_INSTRUCTIONS = """Extract payroll data AS-IS to JSON. Keep exact codes/descriptions.
 
 Rules:
 - Preserve exact labels: "0-Regular Pay" not "Regular"
 - Use null for missing values
 - No math, no normalization, no assumptions
 - Extract ALL employees on page
+"""
 
-{{
-  "report_metadata": {{
+_REPORT_METADATA = """  "report_metadata": {{
     "report_title": null,
     "company_name": null,
     "company_number": null,
@@ -19,7 +29,9 @@ Rules:
     "payroll_number": null,
     "pay_frequency": null
   }},
-  "employees": [{{
+"""
+
+_EMPLOYEES = """  "employees": [{{
     "employee_name": null,
     "employee_id": null,
     "ssn_masked": null,
@@ -34,8 +46,9 @@ Rules:
     "taxes": [{{"raw_code": null, "raw_description": null, "amount_current": null, "amount_ytd": null}}],
     "totals": {{"gross_pay_current": null, "gross_pay_ytd": null, "total_deductions_current": null, "total_deductions_ytd": null, "total_taxes_current": null, "total_taxes_ytd": null, "net_pay_current": null, "net_pay_ytd": null}}
   }}]
-}}
+"""
 
+_NOTES = """
 EXTRACTION NOTES:
 - Earnings: Keep full code+description (e.g., "4-401K Plan")
 - Deductions: Same as earnings
@@ -49,8 +62,35 @@ TEXT TO EXTRACT:
 
 OUTPUT ONLY JSON."""
 
+EXTRACTOR_PROMPT_TEMPLATE = _INSTRUCTIONS + "\n{{\n" + _REPORT_METADATA + _EMPLOYEES + "}}\n" + _NOTES
+
+EMPLOYEES_PROMPT_TEMPLATE = (
+    _INSTRUCTIONS
+    + "- Report header (title, company, pay period) is already known: output employees only\n"
+    + "\n{{\n" + _EMPLOYEES + "}}\n" + _NOTES
+)
+
+# Compact wire format (see src/wire_format.py): same values as positional arrays
+WIRE_PROMPT_TEMPLATE = (
+    _INSTRUCTIONS
+    + """- Write COMPACT JSON: arrays of values in exactly the order below, no keys, no spaces
+- null for a missing value in the middle of an array; leave out trailing nulls and empty lists
+
+{wire_header}
+"""
+    + _NOTES
+)
+
+PROMPT_TEMPLATES = {
+    "header": EXTRACTOR_PROMPT_TEMPLATE,
+    "employees": EMPLOYEES_PROMPT_TEMPLATE,
+}
 
-def get_extractor_prompt(payroll_text: str) -> str:
-    """Format extractor prompt with payroll text."""
-    return EXTRACTOR_PROMPT_TEMPLATE.format(payroll_text=payroll_text)
 
+def get_extractor_prompt(payroll_text: str, role: str = "header", wire_format: bool = False) -> str:
+    """Format the extractor prompt for a page role ("header" or "employees")."""
+    if wire_format:
+        # Imported lazily: the wire layout is read from EXTRACTOR_PROMPT_TEMPLATE
+        from src.wire_format import wire_header
+        return WIRE_PROMPT_TEMPLATE.format(payroll_text=payroll_text, wire_header=wire_header(role))
+    return PROMPT_TEMPLATES[role].format(payroll_text=payroll_text)
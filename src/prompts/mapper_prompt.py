@@ -2,27 +2,28 @@
 
 MAPPER_PROMPT_TEMPLATE = """Map payroll types to normalized categories using aliases.
 
-EARNING TYPES: Regular, Overtime, Vacation, Sick, Holiday, Bonus, Commission, Other
-- "0-Regular Pay", "Regular", "REG" → Regular
+EARNING TYPES: {earning_types}
+- "0-Regular Pay", "Regular", "REG" → Regular Pay
 - "Overtime", "OT", "1-OT" → Overtime
-- "Vacation", "VAC", "PTO" → Vacation
-- "Sick", "Sick Pay" → Sick
+- "Vacation", "VAC", "PTO" → Vacation Pay
+- "Sick", "Sick Pay" → Sick Pay
 
-DEDUCTION TYPES: 401k, 403b, Health, Dental, Vision, FSA, HSA, Garnishment, Other
-- "401K", "401(k)", "4-401K Plan" → 401k
-- "Health", "CAF Medical", "Medical" → Health
-- "Dental", "CAF Dental" → Dental
-- "Child Support", "Tax Levy" → Garnishment
+DEDUCTION TYPES: {deduction_types}
+- "401K", "401(k)", "4-401K Plan" → Retirement - 401k
+- "Health", "CAF Medical", "Medical" → Health Insurance
+- "Dental", "CAF Dental" → Dental Insurance
+- "Child Support" → Child Support, "Tax Levy" → Tax Levy
 
-TAX TYPES: Fed, OASDI, Medicare, State, Local, SDI, SUI, Other
-- "Federal WH", "FWT" → Fed
+TAX TYPES: {tax_types}
+- "Federal WH", "FWT" → Federal Income Tax
 - "OASDI", "Social Security" → OASDI
 - "Medicare", "Medicare WH" → Medicare
-- "State WH", "SDI", "SUI" → State
-- Extract jurisdiction from descriptions (e.g., "MA" from "MA: State WH")
+- "State WH", "MA: State WH" → State Income Tax
+- "City Tax", "Local WH" → Local Income Tax
 
 Return JSON array with format:
 [{{
+  "id": 0,
   "type": "earning/deduction/tax",
   "raw_description": "original text",
   "mapped_type": "normalized category",
@@ -30,6 +31,7 @@ Return JSON array with format:
 }}, ...]
 
 Use confidence: 1.0=exact match, 0.7-0.9=probable, <0.7=uncertain
+Use "Other" when no category fits.
 NO inferences - only classify what exists.
 
 DATA:
@@ -38,8 +40,19 @@ DATA:
 OUTPUT JSON ARRAY ONLY."""
 
 
-def get_mapper_prompt(interim_data: dict) -> str:
-    """Format mapper prompt with interim data."""
+def get_mapper_prompt(labels: list, categories: dict) -> str:
+    """
+    Format mapper prompt with the labels to classify.
+
+    Args:
+        labels: [{"id": ..., "type": "earning/deduction/tax", "raw_description": ...}]
+        categories: Allowed types per section ("earnings", "deductions", "taxes")
+    """
     import json
-    interim_text = json.dumps(interim_data.get('employees', []), indent=1)
-    return MAPPER_PROMPT_TEMPLATE.format(interim_data=interim_text)
+    labels_text = "\n".join(json.dumps(label, ensure_ascii=False) for label in labels)
+    return MAPPER_PROMPT_TEMPLATE.format(
+        earning_types=", ".join(categories.get('earnings', [])),
+        deduction_types=", ".join(categories.get('deductions', [])),
+        tax_types=", ".join(categories.get('taxes', [])),
+        interim_data=labels_text,
+    )
@@ -0,0 +1,43 @@
+"""Selective refinement prompt - re-reads only the weak lines of one employee"""
+
+import json
+
+REFINER_PROMPT_TEMPLATE = """Re-read these payroll lines for employee {employee_name} from the text below.
+Earlier extraction was uncertain about them. Fix ONLY these items.
+
+Rules:
+- Keep exact codes/descriptions as printed
+- Use null for values not in the text
+- No math, no normalization, no assumptions
+- "category": pick one from the item's CATEGORIES, "Other" if none fits
+
+CATEGORIES:
+earnings: {earning_categories}
+deductions: {deduction_categories}
+taxes: {tax_categories}
+
+ITEMS:
+{items}
+
+Return:
+{{"items": [{{"id": "<item id>", "raw_code": null, "raw_description": null, "amount_current": null, "amount_ytd": null, "category": null}}]}}
+Earnings items may also include "rate", "hours_current", "hours_ytd".
+
+TEXT:
+
+{snippet}
+
+OUTPUT ONLY JSON."""
+
+
+def get_refiner_prompt(employee_name: str, items: list, snippet: str, categories: dict) -> str:
+    """Format refiner prompt with the weak items and their page snippet."""
+    items_text = "\n".join(json.dumps(item, ensure_ascii=False) for item in items)
+    return REFINER_PROMPT_TEMPLATE.format(
+        employee_name=employee_name,
+        earning_categories=", ".join(categories.get('earnings', [])),
+        deduction_categories=", ".join(categories.get('deductions', [])),
+        tax_categories=", ".join(categories.get('taxes', [])),
+        items=items_text,
+        snippet=snippet,
+    )
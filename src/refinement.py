@@ -0,0 +1,339 @@
+"""
+Selective Refinement
+Re-extracts only the low-confidence lines of a document instead of re-running
+Step 2 on every page.
+Output: patched interim.json / mapped.json and refinement.json (what changed)
+
+Step 3 scores each line: 0.3 when its description only matched "Other" or a
+value was not found in the page text (see src/grounding.py), and 0.0 when
+amount_current is missing. Lines under the threshold are grouped by
+employee and re-read with one small prompt containing just that employee's
+block of page text (see src/prompts/refiner_prompt.py).
+
+Corrections are written back to the interim lines, so a later Step 3 run or
+`rebuild` keeps them, and only the affected employees are re-mapped. Lines
+that were already refined once are marked and not sent again; their values
+are grounded again against the page text, so a correction clears the mark.
+"""
+
+import json
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.grounding import ground_line, page_numbers
+from src.metrics import RunMetrics
+from src.prompts.refiner_prompt import get_refiner_prompt
+from src.rollups import RollupAggregator
+from src.step3_schema_mapping import HINT_KEY, LINE_TYPES, SchemaMatcher
+
+STAGE = "refinement"
+DEFAULT_THRESHOLD = 0.5
+
+# Lines of context kept around an employee's block of page text
+SNIPPET_MARGIN = 3
+
+# section -> (mapped block, mapped lines key, type key, amount key)
+SECTIONS = {
+    "earnings": ("earnings", "earning_lines", "earning_type", "amount"),
+    "deductions": ("deductions", "deduction_lines", "deduction_type", "amount"),
+    "taxes": ("employee_taxes", "tax_lines", "tax_type", "tax_amount"),
+}
+
+# Earnings values whose confidence is only lowered by grounding (absent values are not weak)
+EXTRA_VALUE_KEYS = {
+    "earnings": ("rate", "hours"),
+}
+
+# Interim fields the refiner may correct, per section
+LINE_FIELDS = {
+    "earnings": ["raw_code", "raw_description", "rate", "hours_current", "hours_ytd",
+                 "amount_current", "amount_ytd"],
+    "deductions": ["raw_code", "raw_description", "amount_current", "amount_ytd"],
+    "taxes": ["raw_code", "raw_description", "amount_current", "amount_ytd"],
+}
+
+REFINED_KEY = "refined"
+
+
+def weak_lines(mapped_emp: Dict, threshold: float = DEFAULT_THRESHOLD) -> Iterator[Tuple[str, int, List[str]]]:
+    """
+    Find the lines of a mapped employee whose type or value confidence is low.
+
+    Yields:
+        (section, line index, reasons) with reasons drawn from "type", "amount",
+        "rate", "hours"
+    """
+    for section, (block, lines_key, type_key, amount_key) in SECTIONS.items():
+        lines = (mapped_emp.get(block) or {}).get(lines_key) or []
+        for index, line in enumerate(lines):
+            reasons = []
+            if (line.get(type_key) or {}).get('confidence', 1.0) < threshold:
+                reasons.append("type")
+            if (line.get(amount_key) or {}).get('confidence', 1.0) < threshold:
+                reasons.append("amount")
+            for key in EXTRA_VALUE_KEYS.get(section, ()):
+                value = line.get(key) or {}
+                present = any(v is not None for k, v in value.items() if k != 'confidence')
+                if present and value.get('confidence', 1.0) < threshold:
+                    reasons.append(key)
+            if reasons:
+                yield section, index, reasons
+
+
+def _name_key(name: Optional[str]) -> Optional[str]:
+    """Longest alphabetic word of a name, used to find it in page text."""
+    words = re.findall(r"[A-Za-z]{2,}", name or "")
+    return max(words, key=len).lower() if words else None
+
+
+def find_name_lines(lines: List[str], names: List[Optional[str]]) -> List[Optional[int]]:
+    """
+    Locate employees in page text by name, in page order.
+
+    Args:
+        lines: Lines of the page text
+        names: Employee names in the order they were extracted
+
+    Returns:
+        Line index of each name (None where it was not found after the previous one)
+    """
+    lowered = [line.lower() for line in lines]
+    positions: List[Optional[int]] = []
+    start = 0
+    for name in names:
+        key = _name_key(name)
+        found = None
+        if key:
+            for line_index in range(start, len(lowered)):
+                if key in lowered[line_index]:
+                    found = line_index
+                    break
+        positions.append(found)
+        if found is not None:
+            start = found + 1
+    return positions
+
+
+def employee_snippet(page_text: str, names: List[Optional[str]], index: int,
+                     margin: int = SNIPPET_MARGIN) -> str:
+    """
+    Cut one employee's block out of a page.
+
+    Employees are located by name in page order; the block runs halfway to
+    the neighbouring employees on either side. Falls back to the whole page
+    when the name cannot be found.
+
+    Args:
+        page_text: Step 1 text of the page
+        names: Names of all employees extracted from the page, in order
+        index: Position of the employee in names
+        margin: Extra lines kept on either side
+
+    Returns:
+        Snippet of page text
+    """
+    lines = page_text.split('\n')
+    positions = find_name_lines(lines, names)
+
+    position = positions[index]
+    if position is None:
+        return page_text
+
+    previous = next((p for p in reversed(positions[:index]) if p is not None), None)
+    following = next((p for p in positions[index + 1:] if p is not None), None)
+
+    low = 0 if previous is None else (previous + position) // 2 + 1
+    high = len(lines) if following is None else (position + following) // 2 + 1
+    low = max(0, low - margin)
+    high = min(len(lines), high + margin)
+    return '\n'.join(lines[low:high])
+
+
+class SelectiveRefiner:
+    """Re-reads weak lines of an already processed document with targeted LLM calls."""
+
+    def __init__(self, extractor, threshold: float = DEFAULT_THRESHOLD,
+                 matcher: Optional[SchemaMatcher] = None):
+        """
+        Args:
+            extractor: RawDataExtractor whose client, model and metrics are reused
+            threshold: Lines with a type or amount confidence below this are refined
+            matcher: Step 3 matcher used to re-map refined employees
+        """
+        self.client = extractor.client
+        self.model = extractor.model
+        self.metrics: RunMetrics = extractor.metrics
+        self.threshold = threshold
+        self.matcher = matcher or SchemaMatcher(metrics=self.metrics)
+
+    def refine(self, pages: List[Dict], interim: Dict, mapped: Dict) -> Dict:
+        """
+        Refine weak lines in place.
+
+        Args:
+            pages: Step 1 pages (extracted.json["pages"])
+            interim: Interim data; refined lines are patched here
+            mapped: Mapped data (full shape) for the same interim data;
+                    refined employees and the rollups are replaced
+
+        Returns:
+            Report dictionary (see refinement.json)
+        """
+        raw_employees = interim.get('employees') or []
+        mapped_employees = mapped.get('employees') or []
+        if len(raw_employees) != len(mapped_employees):
+            raise ValueError("mapped.json does not match interim.json; re-run Step 3 first")
+
+        page_by_number = {page['page_number']: page for page in pages}
+        page_texts = {number: page['text'] for number, page in page_by_number.items()}
+        page_names: Dict[Optional[int], List[Optional[str]]] = {}
+        for emp in raw_employees:
+            page_names.setdefault(emp.get('page_number'), []).append(emp.get('employee_name'))
+
+        report = {
+            "threshold": self.threshold,
+            "model": self.model,
+            "employees_checked": len(raw_employees),
+            "employees_refined": 0,
+            "weak_lines": 0,
+            "lines_changed": 0,
+            "snippet_chars": 0,
+            "document_chars": sum(len(text) for text in page_texts.values()),
+            "changes": [],
+        }
+
+        seen_on_page: Dict[Optional[int], int] = {}
+        with self.metrics.stage(STAGE) as stage_info:
+            for emp_index, (raw, emp) in enumerate(zip(raw_employees, mapped_employees)):
+                page_number = raw.get('page_number')
+                position = seen_on_page.get(page_number, 0)
+                seen_on_page[page_number] = position + 1
+
+                weak = [
+                    (section, index, reasons)
+                    for section, index, reasons in weak_lines(emp, self.threshold)
+                    if index < len(raw.get(section) or []) and not raw[section][index].get(REFINED_KEY)
+                ]
+                if not weak:
+                    continue
+                report["weak_lines"] += len(weak)
+
+                snippet = self._snippet(raw, page_texts, page_names, position)
+                if snippet is None:
+                    continue
+                report["snippet_chars"] += len(snippet)
+
+                with self.metrics.page(STAGE, page_number or 0) as page_info:
+                    changes = self._refine_employee(raw, weak, snippet, page_number, page_info)
+                if changes is None:
+                    continue
+                if page_number in page_by_number:
+                    numbers = page_numbers(page_by_number[page_number])
+                    for section, index, _ in weak:
+                        ground_line(raw[section][index], numbers)
+
+                report["employees_refined"] += 1
+                report["lines_changed"] += sum(1 for change in changes if change["changes"])
+                for change in changes:
+                    change["employee_index"] = emp_index
+                    change["employee_name"] = raw.get('employee_name')
+                report["changes"].extend(changes)
+
+                mapped_employees[emp_index] = self.matcher.map_employee(raw)
+
+            if report["employees_refined"]:
+                mapped['rollups'] = RollupAggregator.from_employees(mapped_employees).to_schema()
+
+            stage_info["weak_lines"] = report["weak_lines"]
+            stage_info["employees_refined"] = report["employees_refined"]
+
+        return report
+
+    def _snippet(self, raw: Dict, page_texts: Dict, page_names: Dict, position: int) -> Optional[str]:
+        """Page text for one employee, locating the page by name for older interim files."""
+        page_number = raw.get('page_number')
+        if page_number in page_texts:
+            return employee_snippet(page_texts[page_number], page_names[page_number], position)
+
+        key = _name_key(raw.get('employee_name'))
+        if key:
+            for text in page_texts.values():
+                if key in text.lower():
+                    return employee_snippet(text, [raw.get('employee_name')], 0)
+        return None
+
+    def _refine_employee(self, raw: Dict, weak: List[Tuple[str, int, List[str]]], snippet: str,
+                         page_number: Optional[int], page_info: Dict) -> Optional[List[Dict]]:
+        """
+        Send one employee's weak lines to the LLM and patch the answers into raw.
+
+        Returns:
+            Per-line change records, or None if the call or its JSON failed
+        """
+        items = []
+        for section, index, reasons in weak:
+            line = raw[section][index]
+            item = {"id": f"{section}[{index}]", "section": section, "uncertain": reasons}
+            item.update({field: line.get(field) for field in LINE_FIELDS[section]})
+            items.append(item)
+
+        employee_name = raw.get('employee_name') or "Unknown"
+        print(f"Refining {len(items)} lines for {employee_name}...")
+        prompt = get_refiner_prompt(employee_name, items, snippet, LINE_TYPES)
+
+        try:
+            start = time.perf_counter()
+            message = self.client.messages.create(
+                model=self.model,
+                max_tokens=1024,
+                temperature=0,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            self.metrics.record_api_call(STAGE, page_number, self.model, message, time.perf_counter() - start)
+            response = json.loads(message.content[0].text)
+        except json.JSONDecodeError as e:
+            print(f"  ✗ Error parsing refinement for {employee_name}: {e}")
+            self.metrics.increment("parse_failures", 1, page_number, STAGE)
+            return None
+        except Exception as e:
+            print(f"  ✗ Error refining {employee_name}: {e}")
+            page_info["error"] = str(e)
+            return None
+
+        items = (response.get('items') or []) if isinstance(response, dict) else None
+        if not isinstance(items, list):
+            print(f"  ✗ Error parsing refinement for {employee_name}: expected {{\"items\": [...]}}")
+            self.metrics.increment("parse_failures", 1, page_number, STAGE)
+            return None
+        answers = {answer.get('id'): answer for answer in items if isinstance(answer, dict)}
+
+        changes = []
+        for section, index, reasons in weak:
+            item_id = f"{section}[{index}]"
+            line = raw[section][index]
+            line[REFINED_KEY] = True
+            answer = answers.get(item_id)
+            if answer is None:
+                continue
+
+            changed = {}
+            for field in LINE_FIELDS[section]:
+                value = answer.get(field)
+                if value is not None and value != line.get(field):
+                    changed[field] = [line.get(field), value]
+                    line[field] = value
+
+            category = answer.get('category')
+            if category and category != "Other" and category in LINE_TYPES[section]:
+                if category != line.get(HINT_KEY):
+                    changed[HINT_KEY] = [line.get(HINT_KEY), category]
+                line[HINT_KEY] = category
+
+            changes.append({"id": item_id, "reasons": reasons, "changes": changed})
+
+        page_info["lines_refined"] = len(changes)
+        print(f"  ✓ {sum(1 for change in changes if change['changes'])} of {len(weak)} lines updated")
+        return changes
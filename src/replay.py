@@ -0,0 +1,237 @@
+"""
+Record/Replay for Step 2 LLM calls
+Captures messages.create request/response pairs into cassette files and
+replays them offline, so the pipeline can run without an API key.
+StubClient returns a fixed response instead, for tests of the plumbing.
+
+Cassettes are stored one JSON file per request, named by a hash of the
+request (model, prompt, sampling parameters):
+    <cassette_dir>/<request_hash>.json
+"""
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+
+class CassetteMissError(LookupError):
+    """Raised when a replayed request has no recorded response."""
+
+
+def request_key(request: Dict) -> str:
+    """
+    Hash a messages.create request into a stable cassette key.
+
+    Args:
+        request: Keyword arguments passed to messages.create
+
+    Returns:
+        Hex SHA-256 digest of the canonical request JSON
+    """
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ReplayUsage:
+    """Token usage of a replayed response (mirrors message.usage)."""
+
+    def __init__(self, input_tokens: int = 0, output_tokens: int = 0):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class ReplayTextBlock:
+    """Text content block of a replayed response."""
+
+    def __init__(self, text: str):
+        self.type = "text"
+        self.text = text
+
+
+class ReplayMessage:
+    """Minimal stand-in for an Anthropic Message."""
+
+    def __init__(self, text: str, stop_reason: Optional[str], model: Optional[str] = None,
+                 input_tokens: int = 0, output_tokens: int = 0):
+        self.content = [ReplayTextBlock(text)]
+        self.stop_reason = stop_reason
+        self.model = model
+        self.usage = ReplayUsage(input_tokens, output_tokens)
+
+    @classmethod
+    def from_cassette(cls, response: Dict) -> "ReplayMessage":
+        usage = response.get("usage") or {}
+        return cls(
+            text=response.get("text", ""),
+            stop_reason=response.get("stop_reason"),
+            model=response.get("model"),
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+        )
+
+
+def _message_to_cassette(message) -> Dict:
+    """Serialize the parts of a response message the pipeline reads."""
+    usage = getattr(message, "usage", None)
+    text = "".join(
+        getattr(block, "text", "") for block in (getattr(message, "content", None) or [])
+    )
+    return {
+        "text": text,
+        "stop_reason": getattr(message, "stop_reason", None),
+        "model": getattr(message, "model", None),
+        "usage": {
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        },
+    }
+
+
+class _RecordingMessages:
+    def __init__(self, recorder: "RecordingClient"):
+        self._recorder = recorder
+
+    def create(self, **kwargs):
+        return self._recorder.create(**kwargs)
+
+
+class RecordingClient:
+    """
+    Wraps a real Anthropic client and writes every messages.create call to
+    the cassette directory.
+
+    Usage:
+        extractor = RawDataExtractor(client=RecordingClient(Anthropic(), "cassettes/PR-Register"))
+    """
+
+    def __init__(self, client, cassette_dir: Union[str, Path]):
+        self.client = client
+        self.cassette_dir = Path(cassette_dir)
+        self.cassette_dir.mkdir(parents=True, exist_ok=True)
+        self.messages = _RecordingMessages(self)
+        self.recorded = 0
+
+    def create(self, **kwargs):
+        start = time.perf_counter()
+        message = self.client.messages.create(**kwargs)
+        elapsed = time.perf_counter() - start
+
+        key = request_key(kwargs)
+        cassette = {
+            "request": kwargs,
+            "response": _message_to_cassette(message),
+            "elapsed_seconds": round(elapsed, 6),
+        }
+        with open(self.cassette_dir / f"{key}.json", 'w', encoding='utf-8') as f:
+            json.dump(cassette, f, indent=2, ensure_ascii=False)
+        self.recorded += 1
+
+        return message
+
+
+class _ReplayMessages:
+    def __init__(self, replay: "ReplayClient"):
+        self._replay = replay
+
+    def create(self, **kwargs):
+        return self._replay.create(**kwargs)
+
+
+LatencySpec = Union[None, float, str, Callable[[Dict], float]]
+
+
+class ReplayClient:
+    """
+    Serves recorded responses in place of the Anthropic client.
+
+    Latency options:
+        None        - return immediately
+        float       - sleep a fixed number of seconds per call
+        "recorded"  - sleep the recorded call duration (times latency_scale)
+        callable    - called with the cassette dict, returns seconds to sleep
+    """
+
+    def __init__(self, cassette_dir: Union[str, Path], latency: LatencySpec = None,
+                 latency_scale: float = 1.0):
+        self.cassette_dir = Path(cassette_dir)
+        if not self.cassette_dir.is_dir():
+            raise FileNotFoundError(f"Cassette directory not found: {self.cassette_dir}")
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.messages = _ReplayMessages(self)
+        self.replayed = 0
+        self.misses: List[str] = []
+
+    def create(self, **kwargs):
+        key = request_key(kwargs)
+        path = self.cassette_dir / f"{key}.json"
+        if not path.exists():
+            self.misses.append(key)
+            raise CassetteMissError(f"No recorded response for request {key[:12]} in {self.cassette_dir}")
+
+        with open(path, 'r', encoding='utf-8') as f:
+            cassette = json.load(f)
+
+        delay = self._delay_for(cassette)
+        if delay > 0:
+            time.sleep(delay)
+
+        self.replayed += 1
+        return ReplayMessage.from_cassette(cassette["response"])
+
+    def _delay_for(self, cassette: Dict) -> float:
+        latency = self.latency
+        if latency is None:
+            return 0.0
+        if callable(latency):
+            return float(latency(cassette))
+        if latency == "recorded":
+            return float(cassette.get("elapsed_seconds", 0.0)) * self.latency_scale
+        return float(latency)
+
+
+def parse_latency(value: Optional[str]) -> LatencySpec:
+    """Parse a --replay-latency command line value ("recorded" or seconds)."""
+    if value is None or value == "":
+        return None
+    if value == "recorded":
+        return value
+    return float(value)
+
+
+class _StubMessages:
+    def __init__(self, stub: "StubClient"):
+        self._stub = stub
+
+    def create(self, **kwargs):
+        return self._stub.create(**kwargs)
+
+
+class StubClient:
+    """
+    Answers every messages.create call with the same canned response, for
+    exercising the pipeline (or the HTTP service) without an API key or cassettes.
+
+    The default response is a page with no employees; pass a dict (or a JSON
+    file path) in the interim page format to return data instead.
+    """
+
+    def __init__(self, response: Union[None, Dict, str, Path] = None, latency: float = 0.0):
+        if isinstance(response, (str, Path)):
+            with open(response, 'r', encoding='utf-8') as f:
+                response = json.load(f)
+        if response is None:
+            response = {"report_metadata": {}, "employees": []}
+        self.text = json.dumps(response, ensure_ascii=False)
+        self.latency = latency
+        self.messages = _StubMessages(self)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        self.calls += 1
+        return ReplayMessage(self.text, "end_turn", model=kwargs.get("model"),
+                             input_tokens=0, output_tokens=len(self.text) // 4)
@@ -0,0 +1,334 @@
+"""
+Rollup Aggregation
+Computes department and company totals from mapped employees in a single pass.
+Output: rollups section of the global schema (department_totals, company_totals)
+
+Sums are kept as exact Decimals and only converted to numbers when the
+rollups are written out. Aggregators built over separate chunks of employees
+(e.g. parallel shards) can be merged with merge().
+"""
+
+import copy
+import re
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from schemas.global_schema import GLOBAL_PAYROLL_SCHEMA
+from src.amounts import to_decimal, decimal_to_json
+
+
+TOTAL_FIELDS = ["gross_pay", "total_hours", "total_employee_taxes", "total_deductions", "net_pay"]
+DEPARTMENT_FIELDS = ["gross_pay", "total_employee_taxes", "total_deductions", "net_pay"]
+
+
+class RunningTotal:
+    """Exact current/YTD sum plus the number of values that contributed."""
+
+    __slots__ = ("current", "ytd", "count")
+
+    def __init__(self):
+        self.current = None
+        self.ytd = None
+        self.count = 0
+
+    def add(self, current: Optional[Decimal], ytd: Optional[Decimal]):
+        """Add one current/YTD pair (either may be None)."""
+        if current is not None:
+            self.current = current if self.current is None else self.current + current
+        if ytd is not None:
+            self.ytd = ytd if self.ytd is None else self.ytd + ytd
+        if current is not None or ytd is not None:
+            self.count += 1
+
+    def merge(self, other: "RunningTotal"):
+        """Fold another running total into this one."""
+        if other.current is not None:
+            self.current = other.current if self.current is None else self.current + other.current
+        if other.ytd is not None:
+            self.ytd = other.ytd if self.ytd is None else self.ytd + other.ytd
+        self.count += other.count
+
+    def to_schema(self, expected: int) -> Dict:
+        """Render as a schema {current, ytd, confidence} block."""
+        if expected <= 0:
+            confidence = 0.0
+        else:
+            confidence = round(min(self.count / expected, 1.0), 2)
+        return {
+            "current": decimal_to_json(self.current),
+            "ytd": decimal_to_json(self.ytd),
+            "confidence": confidence
+        }
+
+
+class _GroupTotals:
+    """Per-group (department or company) totals."""
+
+    __slots__ = ("employee_count", "totals")
+
+    def __init__(self):
+        self.employee_count = 0
+        self.totals = {field: RunningTotal() for field in TOTAL_FIELDS}
+
+    def add(self, values: Dict[str, Tuple[Optional[Decimal], Optional[Decimal]]]):
+        self.employee_count += 1
+        for field, (current, ytd) in values.items():
+            self.totals[field].add(current, ytd)
+
+    def merge(self, other: "_GroupTotals"):
+        self.employee_count += other.employee_count
+        for field in TOTAL_FIELDS:
+            self.totals[field].merge(other.totals[field])
+
+
+class RollupAggregator:
+    """
+    Streaming aggregator for the rollups section.
+
+    Usage:
+        aggregator = RollupAggregator()
+        for emp in mapped_employees:
+            aggregator.add_employee(emp)
+        output['rollups'] = aggregator.to_schema()
+    """
+
+    def __init__(self):
+        self.company = _GroupTotals()
+        self.departments: Dict[Optional[str], _GroupTotals] = {}
+        self.earning_breakdown: Dict[Optional[str], RunningTotal] = {}
+        self.tax_lines: Dict[Tuple, Dict] = {}
+        self.deduction_lines: Dict[Tuple, Dict] = {}
+
+    @classmethod
+    def from_employees(cls, employees: Iterable[Dict]) -> "RollupAggregator":
+        """Build an aggregator over an iterable of mapped employees."""
+        aggregator = cls()
+        for emp in employees:
+            aggregator.add_employee(emp)
+        return aggregator
+
+    @property
+    def employee_count(self) -> int:
+        return self.company.employee_count
+
+    def add_employee(self, emp: Dict):
+        """
+        Add one mapped employee (global schema shape) to all rollups.
+
+        Args:
+            emp: Mapped employee dictionary
+        """
+        earning_lines = emp.get('earnings', {}).get('earning_lines', [])
+        tax_lines = emp.get('employee_taxes', {}).get('tax_lines', [])
+        deduction_lines = emp.get('deductions', {}).get('deduction_lines', [])
+        employee_totals = emp.get('employee_totals', {})
+
+        # Line-level sums double as fallbacks when the report has no totals row
+        earned = self._add_earning_lines(earning_lines)
+        hours = self._sum_lines(earning_lines, 'hours')
+        taxed = self._add_tax_lines(tax_lines)
+        deducted = self._add_deduction_lines(deduction_lines)
+
+        values = {
+            "gross_pay": self._totals_or(employee_totals.get('gross_pay'), earned),
+            "total_hours": hours,
+            "total_employee_taxes": self._totals_or(employee_totals.get('total_employee_taxes'), taxed),
+            "total_deductions": self._totals_or(employee_totals.get('total_deductions'), deducted),
+            "net_pay": self._totals_or(employee_totals.get('net_pay'), (None, None)),
+        }
+
+        self.company.add(values)
+
+        department = emp.get('employee_info', {}).get('department')
+        group = self.departments.get(department)
+        if group is None:
+            group = self.departments[department] = _GroupTotals()
+        group.add(values)
+
+    def merge(self, other: "RollupAggregator") -> "RollupAggregator":
+        """
+        Merge a partial aggregate (e.g. from another shard) into this one.
+
+        Args:
+            other: Aggregator built over a different set of employees
+
+        Returns:
+            self, to allow chaining
+        """
+        self.company.merge(other.company)
+
+        for department, group in other.departments.items():
+            if department not in self.departments:
+                self.departments[department] = _GroupTotals()
+            self.departments[department].merge(group)
+
+        for earning_type, total in other.earning_breakdown.items():
+            if earning_type not in self.earning_breakdown:
+                self.earning_breakdown[earning_type] = RunningTotal()
+            self.earning_breakdown[earning_type].merge(total)
+
+        for target, source in ((self.tax_lines, other.tax_lines),
+                               (self.deduction_lines, other.deduction_lines)):
+            for key, entry in source.items():
+                if key not in target:
+                    target[key] = {"label": entry["label"], "total": RunningTotal()}
+                target[key]["total"].merge(entry["total"])
+
+        return self
+
+    def to_schema(self) -> Dict:
+        """
+        Render the rollups section in global schema shape.
+
+        Returns:
+            Dictionary to place under output['rollups']
+        """
+        rollups = copy.deepcopy(GLOBAL_PAYROLL_SCHEMA['rollups'])
+        count = self.employee_count
+        company = self.company.totals
+
+        rollups['department_totals'] = [
+            self._department_entry(department, group)
+            for department, group in self.departments.items()
+        ]
+
+        company_totals = rollups['company_totals']
+
+        earnings_totals = company_totals['earnings_totals']
+        earnings_totals['gross_pay'] = company['gross_pay'].to_schema(count)
+        earnings_totals['total_hours'] = company['total_hours'].to_schema(count)
+        earnings_totals['earning_breakdown'] = [
+            {"earning_type": earning_type, **total.to_schema(total.count)}
+            for earning_type, total in self.earning_breakdown.items()
+        ]
+
+        withholding = company_totals['employee_withholding_totals']
+        withholding['total_employee_taxes'] = company['total_employee_taxes'].to_schema(count)
+        withholding['tax_lines'] = [
+            {
+                "tax_code": code,
+                "tax_description": description,
+                "tax_authority": {
+                    "value": entry["label"],
+                    "confidence": 0.95 if entry["label"] else 0.0
+                },
+                "tax_amount": entry["total"].to_schema(entry["total"].count),
+                "notes": ""
+            }
+            for (code, description), entry in self.tax_lines.items()
+        ]
+
+        # Employee-level extraction has no employer tax data
+        employer_taxes = company_totals['employer_taxes']
+        employer_taxes['tax_lines'] = []
+        employer_taxes['employer_tax_totals']['total_employer_taxes'] = RunningTotal().to_schema(0)
+
+        deduction_totals = company_totals['deduction_totals']
+        deduction_totals['total_deductions'] = company['total_deductions'].to_schema(count)
+        deduction_totals['deduction_lines'] = [
+            {
+                "deduction_code": code,
+                "deduction_description": description,
+                "deduction_type": {
+                    "value": entry["label"],
+                    "confidence": 0.85 if entry["label"] else 0.0
+                },
+                "amount": entry["total"].to_schema(entry["total"].count),
+                "notes": ""
+            }
+            for (code, description), entry in self.deduction_lines.items()
+        ]
+
+        grand_totals = company_totals['grand_totals']
+        grand_totals['employee_count'] = count
+        for field in TOTAL_FIELDS:
+            grand_totals[field] = company[field].to_schema(count)
+        grand_totals['total_employer_taxes'] = RunningTotal().to_schema(0)
+
+        return rollups
+
+    def _department_entry(self, department: Optional[str], group: _GroupTotals) -> Dict:
+        """Build one department_totals entry."""
+        department_number = None
+        if department is not None:
+            match = re.match(r'^\s*(\d+)', str(department))
+            if match:
+                department_number = match.group(1)
+
+        return {
+            "department": department,
+            "department_number": department_number,
+            "employee_count": group.employee_count,
+            "totals": {
+                field: group.totals[field].to_schema(group.employee_count)
+                for field in DEPARTMENT_FIELDS
+            },
+            "notes": ""
+        }
+
+    def _add_earning_lines(self, lines: List[Dict]) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        """Add earning lines to the breakdown and return their summed amounts."""
+        line_sum = RunningTotal()
+        for line in lines:
+            amount = line.get('amount', {})
+            current = to_decimal(amount.get('current'))
+            ytd = to_decimal(amount.get('ytd'))
+            line_sum.add(current, ytd)
+
+            earning_type = line.get('earning_type', {}).get('value')
+            total = self.earning_breakdown.get(earning_type)
+            if total is None:
+                total = self.earning_breakdown[earning_type] = RunningTotal()
+            total.add(current, ytd)
+        return line_sum.current, line_sum.ytd
+
+    def _add_tax_lines(self, lines: List[Dict]) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        """Add tax lines to the company breakdown and return their summed amounts."""
+        return self._add_keyed_lines(
+            lines, self.tax_lines, 'tax_code', 'tax_description', 'tax_authority', 'tax_amount'
+        )
+
+    def _add_deduction_lines(self, lines: List[Dict]) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        """Add deduction lines to the company breakdown and return their summed amounts."""
+        return self._add_keyed_lines(
+            lines, self.deduction_lines, 'deduction_code', 'deduction_description', 'deduction_type', 'amount'
+        )
+
+    def _add_keyed_lines(self, lines: List[Dict], target: Dict, code_key: str, desc_key: str,
+                         label_key: str, amount_key: str) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        line_sum = RunningTotal()
+        for line in lines:
+            amount = line.get(amount_key, {})
+            current = to_decimal(amount.get('current'))
+            ytd = to_decimal(amount.get('ytd'))
+            line_sum.add(current, ytd)
+
+            key = (line.get(code_key), line.get(desc_key))
+            entry = target.get(key)
+            if entry is None:
+                entry = target[key] = {
+                    "label": line.get(label_key, {}).get('value'),
+                    "total": RunningTotal()
+                }
+            entry["total"].add(current, ytd)
+        return line_sum.current, line_sum.ytd
+
+    @staticmethod
+    def _sum_lines(lines: List[Dict], key: str) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        """Sum the current/ytd values of one sub-block across lines."""
+        line_sum = RunningTotal()
+        for line in lines:
+            block = line.get(key, {})
+            line_sum.add(to_decimal(block.get('current')), to_decimal(block.get('ytd')))
+        return line_sum.current, line_sum.ytd
+
+    @staticmethod
+    def _totals_or(block: Optional[Dict],
+                   fallback: Tuple[Optional[Decimal], Optional[Decimal]]) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        """Prefer the report's own totals row, falling back to line sums per value."""
+        block = block or {}
+        current = to_decimal(block.get('current'))
+        ytd = to_decimal(block.get('ytd'))
+        return (
+            current if current is not None else fallback[0],
+            ytd if ytd is not None else fallback[1],
+        )
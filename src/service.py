@@ -0,0 +1,437 @@
+"""
+Pipeline HTTP Service
+Long-running local service that runs Steps 1-3 on uploaded PDFs, keeping the
+LLM client, the Step 3 matchers (fuzzy alias indexes, jurisdiction table)
+and a pool of PyMuPDF worker processes warm between requests.
+Output: per-job extracted/interim/mapped artifacts under <output_root>/<job_id>/
+
+Endpoints:
+    POST /jobs[?name=<file.pdf>]   body: PDF bytes -> 202 {"job_id", "status_url", "result_url"}
+    GET  /jobs                     recent jobs, newest first
+    GET  /jobs/<id>                job status (queued, running, done, failed) and timings
+    GET  /jobs/<id>/result         mapped.json once done (?artifact=extracted|interim|metrics for others)
+    GET  /health                   job counts and configured limits
+
+Concurrency limits (all global to the service):
+    job_workers      - documents processed at once
+    pdf_workers      - PyMuPDF processes for Step 1
+    llm_concurrency  - messages.create calls in flight across all jobs
+    max_pending      - queued + running jobs; further uploads get 503 + Retry-After
+
+Usage:
+    python main.py serve --port 8080
+    curl --data-binary @PR-Register.pdf "http://127.0.0.1:8080/jobs?name=PR-Register.pdf"
+"""
+
+import hashlib
+import json
+import queue
+import re
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from src.metrics import RunMetrics
+from src.step2_raw_extraction import DEFAULT_MODEL
+
+DEFAULT_OUTPUT_ROOT = Path("./outputs/service")
+DEFAULT_JOB_WORKERS = 4
+DEFAULT_PDF_WORKERS = 2
+DEFAULT_LLM_CONCURRENCY = 8
+DEFAULT_MAX_PENDING = 64
+DEFAULT_MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+# Finished jobs remembered in memory (artifacts stay on disk)
+MAX_FINISHED_JOBS = 1000
+
+RESULT_ARTIFACTS = ("extracted", "interim", "mapped", "metrics")
+
+_JOB_PATH = re.compile(r"^/jobs/([0-9a-f]{32})(/result)?$")
+_SAFE_NAME = re.compile(r"[^\w.\-]+")
+
+
+def _warm_pdf_worker():
+    """Process pool initializer: import PyMuPDF once per worker; Ctrl-C is the parent's to handle."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import src.step1_pdf_extraction  # noqa: F401
+
+
+def _extract_pages(pdf_bytes: bytes, name: str, pdf_sha256: str, cache) -> List[Dict]:
+    """Step 1 in a pool process, straight from the uploaded bytes (PyMuPDF holds the GIL)."""
+    from src.step1_pdf_extraction import extract_text_from_pdf
+    return extract_text_from_pdf(pdf_bytes, cache=cache, pdf_sha256=pdf_sha256, source_name=name)
+
+
+class _LimitedMessages:
+    def __init__(self, limited: "ConcurrencyLimitedClient"):
+        self._limited = limited
+
+    def create(self, **kwargs):
+        return self._limited.create(**kwargs)
+
+
+class ConcurrencyLimitedClient:
+    """Wraps a client so that at most `limit` messages.create calls run at once."""
+
+    def __init__(self, client, limit: int):
+        self.client = client
+        self.limit = limit
+        self.messages = _LimitedMessages(self)
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def create(self, **kwargs):
+        with self._slots:
+            return self.client.messages.create(**kwargs)
+
+
+class Job:
+    """One uploaded PDF and its progress."""
+
+    def __init__(self, job_id: str, name: str, output_dir: Path):
+        self.job_id = job_id
+        self.name = name
+        self.output_dir = output_dir
+        self.state = "queued"
+        self.stage: Optional[str] = None
+        self.error: Optional[str] = None
+        self.submitted_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.summary: Dict = {}
+        self._submitted = time.perf_counter()
+        self._seconds: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "state": self.state,
+            "stage": self.stage,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": round(self._seconds, 3) if self._seconds is not None else None,
+            "summary": self.summary,
+        }
+
+
+class PipelineService:
+    """Runs uploaded PDFs through Steps 1-3 with warm, shared resources."""
+
+    def __init__(self, client, model: str = DEFAULT_MODEL, router_factory: Optional[Callable] = None,
+                 output_root: Path = DEFAULT_OUTPUT_ROOT, mapped_config: Optional[Dict] = None,
+                 artifact_format: Optional[str] = None, wire_format: bool = False, text_cache=None,
+                 job_workers: int = DEFAULT_JOB_WORKERS, pdf_workers: int = DEFAULT_PDF_WORKERS,
+                 llm_concurrency: int = DEFAULT_LLM_CONCURRENCY, max_pending: int = DEFAULT_MAX_PENDING,
+                 max_upload_bytes: int = DEFAULT_MAX_UPLOAD_BYTES):
+        """
+        Args:
+            client: Client exposing messages.create (Anthropic, replay or stub), shared by all jobs
+            model: Step 2 model
+            router_factory: Optional callable returning a fresh ModelRouter per job
+            output_root: Directory for per-job artifact folders
+            mapped_config: mapped.json build config (compact output, jurisdictions)
+            artifact_format: Format of extracted/interim ("json" or "msgpack")
+            wire_format: Ask the model for the compact wire format (see src/wire_format.py)
+            text_cache: Optional PageTextCache used by the PyMuPDF workers
+            job_workers: Documents processed at once
+            pdf_workers: PyMuPDF worker processes
+            llm_concurrency: LLM calls in flight across all jobs
+            max_pending: Queued plus running jobs before uploads are refused
+            max_upload_bytes: Largest accepted PDF
+        """
+        from src.interim_validator import validate_employees
+        from src.step3_schema_mapping import matcher_from_config
+
+        self.client = ConcurrencyLimitedClient(client, llm_concurrency)
+        self.model = model
+        self.router_factory = router_factory
+        self.output_root = Path(output_root)
+        self.mapped_config = mapped_config or {}
+        self.artifact_format = artifact_format
+        self.wire_format = wire_format
+        self.text_cache = text_cache
+        self.limits = {
+            "job_workers": job_workers,
+            "pdf_workers": pdf_workers,
+            "llm_concurrency": llm_concurrency,
+            "max_pending": max_pending,
+            "max_upload_bytes": max_upload_bytes,
+        }
+        self.output_root.mkdir(parents=True, exist_ok=True)
+
+        # Warm everything a request would otherwise pay for: matchers (one per
+        # job worker, since a matcher holds per-document state), the compiled
+        # interim validator and the PyMuPDF processes
+        self._matchers = queue.Queue()
+        for _ in range(job_workers):
+            self._matchers.put(matcher_from_config(self.mapped_config))
+        validate_employees([])
+        self._pdf_pool = ProcessPoolExecutor(max_workers=pdf_workers, initializer=_warm_pdf_worker)
+        for future in [self._pdf_pool.submit(int) for _ in range(pdf_workers)]:
+            future.result()
+        self._job_pool = ThreadPoolExecutor(max_workers=job_workers, thread_name_prefix="job")
+
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.started = time.perf_counter()
+
+    # ------------------------------------------
+    # Jobs
+    # ------------------------------------------
+
+    def submit(self, pdf_bytes: bytes, name: Optional[str] = None) -> Job:
+        """
+        Accept a PDF and queue it.
+
+        Raises:
+            ValueError: If the body is not a PDF or is too large
+            OverflowError: If max_pending jobs are already queued or running
+        """
+        if len(pdf_bytes) > self.limits["max_upload_bytes"]:
+            raise ValueError(f"PDF larger than {self.limits['max_upload_bytes']} bytes")
+        if not pdf_bytes.startswith(b"%PDF-"):
+            raise ValueError("Body is not a PDF")
+
+        with self._lock:
+            if self._pending >= self.limits["max_pending"]:
+                raise OverflowError(f"{self._pending} jobs pending")
+            self._pending += 1
+            job_id = uuid.uuid4().hex
+            name = _SAFE_NAME.sub("_", Path(name or "upload.pdf").name) or "upload.pdf"
+            job = Job(job_id, name, self.output_root / job_id)
+            self.jobs[job_id] = job
+            self._forget_finished()
+
+        job.output_dir.mkdir(parents=True, exist_ok=True)
+        # Kept for provenance (and `rebuild`); Step 1 reads the bytes from memory
+        (job.output_dir / job.name).write_bytes(pdf_bytes)
+        self._job_pool.submit(self._run, job, pdf_bytes)
+        return job
+
+    def job(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def recent_jobs(self, limit: int = 100) -> List[Dict]:
+        with self._lock:
+            jobs = list(self.jobs.values())[-limit:]
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def health(self) -> Dict:
+        with self._lock:
+            states: Dict[str, int] = {}
+            for job in self.jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            pending = self._pending
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.perf_counter() - self.started, 1),
+            "pending": pending,
+            "jobs": states,
+            "limits": self.limits,
+        }
+
+    def result_path(self, job: Job, artifact: str = "mapped") -> Optional[Path]:
+        """Existing file of a finished job's artifact (None if missing)."""
+        from src.artifacts import artifact_path
+        if artifact == "metrics":
+            path = job.output_dir / "metrics.json"
+            return path if path.exists() else None
+        return artifact_path(job.output_dir / f"{artifact}.json")
+
+    def close(self):
+        """Stop accepting work and wait for running jobs."""
+        self._job_pool.shutdown(wait=True)
+        self._pdf_pool.shutdown(wait=True)
+
+    def _forget_finished(self):
+        """Drop the oldest finished jobs from memory beyond MAX_FINISHED_JOBS (lock held)."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run(self, job: Job, pdf_bytes: bytes):
+        job.state = "running"
+        job.started_at = datetime.now().isoformat()
+        metrics = RunMetrics(job.name)
+        print(f"[service] {job.job_id} {job.name}: started")
+        try:
+            job.summary = self._pipeline(job, pdf_bytes, metrics)
+            job.state = "done"
+            print(f"[service] {job.job_id} {job.name}: done ({job.summary})")
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.state = "failed"
+            print(f"[service] ✗ {job.job_id} {job.name}: {job.error}")
+        finally:
+            job.stage = None
+            job.finished_at = datetime.now().isoformat()
+            job._seconds = time.perf_counter() - job._submitted
+            with self._lock:
+                self._pending -= 1
+            try:
+                metrics.write_json(job.output_dir / "metrics.json")
+            except OSError as e:
+                print(f"[service] ⚠ {job.job_id} {job.name}: metrics.json not written ({e})")
+
+    def _pipeline(self, job: Job, pdf_bytes: bytes, metrics: RunMetrics) -> Dict:
+        """Steps 1-3 for one job, writing the same artifacts as `main.py run`."""
+        from src.artifacts import (build_record, pages_hash, write_artifact,
+                                   write_mapped_artifact)
+        from src.step2_raw_extraction import RawDataExtractor
+
+        pdf_path = job.output_dir / job.name
+        pdf_sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+
+        job.stage = "step1_pdf_extraction"
+        with metrics.stage("step1_pdf_extraction") as stage_info:
+            pages = self._pdf_pool.submit(_extract_pages, pdf_bytes, job.name, pdf_sha256,
+                                           self.text_cache).result()
+            stage_info["pages"] = len(pages)
+        if not pages:
+            raise ValueError("No pages extracted from PDF")
+        write_artifact(job.output_dir / "extracted.json", {
+            "source_file": job.name,
+            "extraction_timestamp": datetime.now().isoformat(),
+            "total_pages": len(pages),
+            "pages": pages,
+        }, build_record("extracted", {"pdf": {"path": str(pdf_path.resolve()), "sha256": pdf_sha256}}),
+            self.artifact_format)
+
+        job.stage = "step2_raw_extraction"
+        router = self.router_factory() if self.router_factory else None
+        extractor = RawDataExtractor(model=self.model, metrics=metrics, client=self.client, router=router,
+                                     wire_format=self.wire_format)
+        interim = extractor.extract_raw_data(pages)
+        write_artifact(job.output_dir / "interim.json", interim,
+                       build_record("interim", {"extracted": pages_hash(pages)}, extractor.interim_config()),
+                       self.artifact_format)
+
+        job.stage = "step3_schema_mapping"
+        matcher = self._matchers.get()
+        try:
+            matcher.metrics = metrics
+            mapped = matcher.map_interim_to_schema(interim)
+        finally:
+            self._matchers.put(matcher)
+        write_mapped_artifact(job.output_dir / "mapped.json", mapped, interim, self.mapped_config)
+
+        return {
+            "pages": len(pages),
+            "employees": len(mapped.get('employees', [])),
+            "skipped_pages": len(interim.get('skipped_pages', [])),
+        }
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a PipelineService (set as server.service)."""
+
+    server_version = "PayrollExtraction/1.0"
+
+    @property
+    def service(self) -> PipelineService:
+        return self.server.service
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            return self._send_json(HTTPStatus.LENGTH_REQUIRED, {"error": "Content-Length required"})
+        if length > self.service.limits["max_upload_bytes"]:
+            return self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                   {"error": f"PDF larger than {self.service.limits['max_upload_bytes']} bytes"})
+        body = self.rfile.read(length)
+
+        name = (parse_qs(url.query).get("name") or [None])[0]
+        try:
+            job = self.service.submit(body, name)
+        except OverflowError as e:
+            return self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": f"busy: {e}"},
+                                   headers={"Retry-After": "5"})
+        except ValueError as e:
+            return self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+
+        self._send_json(HTTPStatus.ACCEPTED, {
+            "job_id": job.job_id,
+            "status_url": f"/jobs/{job.job_id}",
+            "result_url": f"/jobs/{job.job_id}/result",
+        }, headers={"Location": f"/jobs/{job.job_id}"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._send_json(HTTPStatus.OK, self.service.health())
+        if url.path == "/jobs":
+            return self._send_json(HTTPStatus.OK, {"jobs": self.service.recent_jobs()})
+
+        match = _JOB_PATH.match(url.path)
+        job = self.service.job(match.group(1)) if match else None
+        if job is None:
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "no such job"})
+        if not match.group(2):
+            return self._send_json(HTTPStatus.OK, job.to_dict())
+
+        artifact = (parse_qs(url.query).get("artifact") or ["mapped"])[0]
+        if artifact not in RESULT_ARTIFACTS:
+            return self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"artifact must be one of {RESULT_ARTIFACTS}"})
+        if job.state != "done":
+            return self._send_json(HTTPStatus.CONFLICT, {"error": f"job is {job.state}", "state": job.state,
+                                                         "job_error": job.error})
+        path = self.service.result_path(job, artifact)
+        if path is None:
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": f"{artifact} not found"})
+        if path.suffix == ".json":
+            return self._send(HTTPStatus.OK, path.read_bytes(), "application/json")
+        # Binary intermediates are served as JSON
+        from src.artifacts import read_artifact
+        self._send_json(HTTPStatus.OK, read_artifact(path))
+
+    def _send_json(self, status: HTTPStatus, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json", headers)
+
+    def _send(self, status: HTTPStatus, body: bytes, content_type: str, headers: Optional[Dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[service] {self.address_string()} {format % args}")
+
+
+def serve(service: PipelineService, host: str = "127.0.0.1", port: int = 8080):
+    """Serve until interrupted, then let running jobs finish."""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    # SIGTERM (e.g. from a process supervisor) stops the server like Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print(f"✓ Listening on http://{host}:{server.server_address[1]} "
+          f"({service.limits['job_workers']} job workers, {service.limits['pdf_workers']} PDF workers, "
+          f"{service.limits['llm_concurrency']} concurrent LLM calls)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("\nShutting down; waiting for running jobs...")
+        server.server_close()
+        service.close()
@@ -1,23 +1,165 @@
 """
 Step 1: PDF Text Extraction
 Extracts text from payroll PDF using PyMuPDF.
+The PDF can be a path or already in memory (bytes, memoryview, file object):
+in-memory PDFs are opened through PyMuPDF's stream interface on a zero-copy
+view, so uploads and attachments never need a temp file.
 Output: pages with text content
 """
 
+import hashlib
+import io
+import mmap
+import os
 import pymupdf
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+from src.metrics import RunMetrics
+from src.text_cache import PageTextCache
 
+STAGE = "step1_pdf_extraction"
 
-def extract_text_from_pdf(pdf_path: str) -> List[Dict]:
+# A PDF on disk, or its bytes already in memory (object storage, email attachments, uploads)
+PdfSource = Union[str, Path, bytes, bytearray, memoryview, BinaryIO]
+
+
+def is_pdf_path(source: PdfSource) -> bool:
+    """True if the source names a file rather than holding the PDF's bytes."""
+    return isinstance(source, (str, Path))
+
+
+@contextmanager
+def pdf_buffer(source: PdfSource) -> Iterator[memoryview]:
     """
-    Extract text from each page of a PDF file.
+    View the bytes of an in-memory or file-like PDF without copying them.
+    
+    bytes, bytearray, memoryview and BytesIO are viewed in place; other
+    binary files that have a descriptor are memory-mapped; anything else
+    (sockets, HTTP bodies) is read once.
     
     Args:
-        pdf_path: Path to the PDF file
+        source: bytes-like object or binary file object (not a path)
+        
+    Yields:
+        memoryview of the PDF bytes, valid until the block exits
+    """
+    mapped = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+    elif isinstance(source, io.BytesIO):
+        view = source.getbuffer()
+    else:
+        try:
+            fileno = source.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            fileno = None
+        if fileno is not None and os.fstat(fileno).st_size > 0:
+            mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+        else:
+            view = memoryview(source.read())
+    
+    try:
+        yield view.cast("B") if view.format != "B" or view.ndim != 1 else view
+    finally:
+        view.release()
+        if mapped is not None:
+            mapped.close()
+
+
+def pdf_source_sha256(source: PdfSource) -> str:
+    """SHA-256 of a PDF given as a path, bytes or a file object (the text cache key)."""
+    if is_pdf_path(source):
+        from src.artifacts import file_sha256
+        return file_sha256(Path(source))
+    with pdf_buffer(source) as view:
+        return hashlib.sha256(view).hexdigest()
+
+
+@contextmanager
+def open_pdf(source: PdfSource) -> Iterator[pymupdf.Document]:
+    """
+    Open a PDF from a path or from memory with PyMuPDF.
+    
+    Paths are opened by name (PyMuPDF reads the file on demand); bytes-like
+    and file-like sources go through PyMuPDF's stream interface on a
+    zero-copy view, so nothing is written to or read back from disk.
+    
+    Raises:
+        FileNotFoundError: If a path does not exist
+        ValueError: If a path does not end in .pdf
+    """
+    if is_pdf_path(source):
+        pdf_path = Path(source)
+        if not pdf_path.exists():
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+        if not pdf_path.suffix.lower() == '.pdf':
+            raise ValueError(f"File must be a PDF: {pdf_path}")
+        doc = pymupdf.open(pdf_path)
+        try:
+            yield doc
+        finally:
+            doc.close()
+        return
+    
+    with pdf_buffer(source) as view:
+        doc = pymupdf.open(stream=view, filetype="pdf")
+        try:
+            yield doc
+        finally:
+            doc.close()
+
+
+def iter_pdf_pages(source: PdfSource, words: bool = False) -> Iterator[Dict]:
+    """
+    Lazily extract pages, one PyMuPDF page at a time.
+    
+    The document stays open until the iterator is exhausted or closed, so
+    consumers can stop early (or pipeline pages into Step 2) without
+    holding every page's text at once.
+    
+    Args:
+        source: PDF path, bytes, memoryview or binary file object
+        words: Also return word boxes per page (PyMuPDF "words" output)
+        
+    Yields:
+        {"page_number": n, "text": "..."} (plus "words" if requested)
+    """
+    with open_pdf(source) as doc:
+        for page_num in range(len(doc)):
+            yield _page_data(doc[page_num], page_num + 1, words)
+
+
+def _page_data(page: pymupdf.Page, page_number: int, words: bool) -> Dict:
+    """Text (and optionally word boxes) of one PyMuPDF page."""
+    page_data = {
+        "page_number": page_number,
+        "text": page.get_text()
+    }
+    if words:
+        page_data["words"] = [list(word) for word in page.get_text("words")]
+    return page_data
+
+
+def extract_text_from_pdf(pdf: PdfSource, metrics: Optional[RunMetrics] = None,
+                          cache: Optional[PageTextCache] = None, words: bool = False,
+                          pdf_sha256: Optional[str] = None, source_name: Optional[str] = None) -> List[Dict]:
+    """
+    Extract text from each page of a PDF.
+    
+    Args:
+        pdf: Path to the PDF file, or the PDF itself as bytes, bytearray,
+             memoryview or a binary file object (read without temp files)
+        metrics: Optional run metrics to record per-page timings into
+        cache: Optional text cache; a hit skips PyMuPDF parsing entirely
+        words: Also return word boxes per page (PyMuPDF "words" output)
+        pdf_sha256: SHA-256 of the PDF if already known (used as the cache key)
+        source_name: Name used in messages and metrics for in-memory PDFs
         
     Returns:
         List of dictionaries with page_number and text for each page
+        (and "words": [[x0, y0, x1, y1, word, block, line, word_no], ...] if requested)
         
     Example:
         [
@@ -25,33 +167,60 @@ def extract_text_from_pdf(pdf_path: str) -> List[Dict]:
             {"page_number": 2, "text": "Page 2 content..."}
         ]
     """
-    pdf_path = Path(pdf_path)
-    
-    if not pdf_path.exists():
-        raise FileNotFoundError(f"PDF file not found: {pdf_path}")
-    
-    if not pdf_path.suffix.lower() == '.pdf':
-        raise ValueError(f"File must be a PDF: {pdf_path}")
+    if is_pdf_path(pdf):
+        pdf_path = Path(pdf)
+        if not pdf_path.exists():
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+        if not pdf_path.suffix.lower() == '.pdf':
+            raise ValueError(f"File must be a PDF: {pdf_path}")
+        source_name = source_name or pdf_path.name
+    elif not isinstance(pdf, memoryview):
+        # Take one view of the bytes (reading a stream only once) for both hashing and parsing
+        name = getattr(pdf, "name", None)
+        with pdf_buffer(pdf) as view:
+            return extract_text_from_pdf(view, metrics, cache, words, pdf_sha256,
+                                         source_name or (Path(name).name if isinstance(name, str) else None))
+    source_name = source_name or "<memory>"
     
+    metrics = metrics or RunMetrics(Path(source_name).stem)
     pages = []
     
+    cache_key = None
+    if cache is not None:
+        if pdf_sha256 is None:
+            pdf_sha256 = pdf_source_sha256(pdf)
+        cache_key = cache.key(pdf_sha256, {"words": words})
+    
     try:
-        # Open PDF with PyMuPDF
-        doc = pymupdf.open(pdf_path)
-        
-        # Extract text from each page
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text()
+        with metrics.stage(STAGE) as stage_info:
+            if cache_key is not None:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    metrics.increment("text_cache_hits")
+                    stage_info["pages"] = len(cached)
+                    stage_info["cache"] = "hit"
+                    print(f"Loaded {len(cached)} cached pages for {source_name}")
+                    return cached
+                metrics.increment("text_cache_misses")
+                stage_info["cache"] = "miss"
             
-            pages.append({
-                "page_number": page_num + 1,
-                "text": text
-            })
-        
-        doc.close()
+            # Open PDF with PyMuPDF (by path, or as a stream over the in-memory bytes)
+            with open_pdf(pdf) as doc:
+                
+                # Extract text from each page
+                for page_num in range(len(doc)):
+                    with metrics.page(STAGE, page_num + 1) as page_info:
+                        page_data = _page_data(doc[page_num], page_num + 1, words)
+                        page_info["chars"] = len(page_data["text"])
+                    
+                    pages.append(page_data)
+            
+            stage_info["pages"] = len(pages)
+            
+            if cache_key is not None:
+                cache.put(cache_key, pages)
         
-        print(f"Successfully extracted {len(pages)} pages from {pdf_path.name}")
+        print(f"Successfully extracted {len(pages)} pages from {source_name}")
         
         return pages
         
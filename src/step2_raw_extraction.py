@@ -6,36 +6,61 @@ Output: interim.json with raw labels and values
 
 import json
 import os
-from typing import Dict, List
-from dotenv import load_dotenv
-from anthropic import Anthropic
-from src.prompts.extractor_prompt import get_extractor_prompt
+import time
+from typing import Dict, List, Optional
+from src.prompts.extractor_prompt import PROMPT_TEMPLATES, get_extractor_prompt
+from src.grounding import ground_employees
+from src.metrics import RunMetrics
+from src.wire_format import expand_page, repair_truncated
+from src.interim_validator import print_errors, validate_employees, validate_interim
 
-# Load environment variables
-load_dotenv()
+STAGE = "step2_raw_extraction"
+DEFAULT_MODEL = "claude-3-haiku-20240307"
 
 
 class RawDataExtractor:
     """Extracts raw payroll data from text."""
     
-    def __init__(self, model: str = "claude-3-haiku-20240307"):
+    def __init__(self, model: str = DEFAULT_MODEL, metrics: Optional[RunMetrics] = None,
+                 client=None, router=None, wire_format: bool = False):
         """
         Initialize the extractor with Anthropic client.
         
         Args:
             model: Claude model to use (default: Claude 3 Haiku)
+            metrics: Optional run metrics to record API usage into
+            client: Optional pre-built client exposing messages.create
+                    (e.g. a ReplayClient); skips the API key check
+            router: Optional ModelRouter choosing the model per page
+                    (see src/model_router.py); model is then unused
+            wire_format: Ask for the compact positional wire format and expand
+                         it locally (see src/wire_format.py)
         """
-        self.api_key = os.getenv("ANTHROPIC_API_KEY")
+        self.model = model
+        self.router = router
+        self.wire_format = wire_format
+        self.metrics = metrics or RunMetrics()
+        self.api_key = None
         
-        if not self.api_key:
-            raise ValueError(
-                "ANTHROPIC_API_KEY not found in environment variables.\n"
-                "Please create a .env file with your API key.\n"
-                "See .env.example for template."
-            )
+        if client is None:
+            # Imported lazily: anthropic is slow to import and only needed for live calls
+            from dotenv import load_dotenv
+            from anthropic import Anthropic
+            
+            # Load environment variables
+            load_dotenv()
+            self.api_key = os.getenv("ANTHROPIC_API_KEY")
+            
+            if not self.api_key:
+                raise ValueError(
+                    "ANTHROPIC_API_KEY not found in environment variables.\n"
+                    "Please create a .env file with your API key.\n"
+                    "See .env.example for template."
+                )
+            
+            client = Anthropic(api_key=self.api_key)
         
-        self.client = Anthropic(api_key=self.api_key)
-        self.model = model
+        self.client = client
     
     def extract_raw_data(self, pages: List[Dict]) -> Dict:
         """
@@ -48,87 +73,217 @@ class RawDataExtractor:
             Dictionary with raw extracted payroll data
         """
         # For Haiku with token limitations, process pages individually and combine
-        all_employees = []
-        report_metadata = None
-        
-        skipped_pages = []
+        page_results = []
+        employee_count = 0
+        metrics = self.metrics
+        prompt_roles = {role: 0 for role in PROMPT_TEMPLATES}
+        header_found = False
 
-        for page in pages:
-            print(f"Processing page {page['page_number']}...")
-            page_text = f"PAGE {page['page_number']}:\n{page['text']}"
+        with metrics.stage(STAGE) as stage_info:
+            for page in pages:
+                # Ask for report_metadata until a page has it (normally page 1), then employees only
+                role = "employees" if header_found else "header"
+                page_result = self.extract_page(page, employee_count, role)
+                employee_count += len(page_result["employees"] or [])
+                page_results.append(page_result)
+                prompt_roles[role] += 1
+                if role == "header" and has_report_header(page_result["report_metadata"]):
+                    header_found = True
+                elif role == "header" and page['page_number'] == 1:
+                    print("  ⚠ No report header on page 1; asking for it on the next page")
+            
+            result = merge_page_results(page_results)
+            stage_info["pages"] = len(pages)
+            stage_info["prompt_roles"] = prompt_roles
+            stage_info["employees"] = len(result["employees"])
+            if self.router:
+                stage_info["routing"] = self.router.report(metrics)
+        
+        print(f"\n✓ Total employees extracted: {len(result['employees'])}")
+        if result["skipped_pages"]:
+            print(f"⚠ Pages skipped due to size/parse issues: {result['skipped_pages']}")
+        return result
+    
+    def extract_page(self, page: Dict, offset: int = 0, role: Optional[str] = None) -> Dict:
+        """
+        Extract and validate one page (the unit of work for distributed runs).
+        
+        Args:
+            page: Page dictionary with 'page_number' and 'text'
+            offset: Number of employees on earlier pages (for validation error paths)
+            role: Prompt role, "header" (report_metadata + employees) or
+                  "employees" (default: "header" for page 1, else "employees")
+            
+        Returns:
+            Page result for merge_page_results:
+            {"page_number": ..., "employees": [...] or None, "report_metadata": {...} or None},
+            plus "error" if the LLM call itself failed. Lines with values not
+            found in the page text are marked "ungrounded".
+        """
+        metrics = self.metrics
+        page_number = page['page_number']
+        role = role or ("header" if page_number == 1 else "employees")
+        with metrics.page(STAGE, page_number) as page_info:
+            page_info.pop("error", None)
+            page_info["prompt_role"] = role
+            employees, metadata = self._extract_page(page, page_info, role)
+            error = page_info.get("error")
+        
+        if employees:
+            errors = validate_employees(employees, offset)
+            if errors:
+                print(f"  ⚠ {len(errors)} structural problems on page {page_number}:")
+                print_errors(errors, limit=5)
+                metrics.increment("validation_errors", len(errors), page_number, STAGE)
             
-            prompt = get_extractor_prompt(page_text)
+            # Every amount/hours/rate must appear in the page text (see src/grounding.py)
+            ungrounded = ground_employees(employees, page)
+            if ungrounded:
+                print(f"  ⚠ {ungrounded} values on page {page_number} not found in its text")
+                metrics.increment("ungrounded_values", ungrounded, page_number, STAGE)
+        else:
+            metrics.increment("skipped_pages")
+        
+        page_result = {"page_number": page_number, "employees": employees, "report_metadata": metadata}
+        if error:
+            page_result["error"] = error
+        return page_result
+    
+    def _extract_page(self, page: Dict, page_info: Dict, role: str = "header"):
+        """
+        Extract one page, escalating to a stronger model if routing is enabled.
+        
+        Args:
+            page: Page dictionary with 'page_number' and 'text'
+            page_info: Per-page metrics record to annotate
+            role: Prompt role ("header" or "employees")
+            
+        Returns:
+            Tuple of (employees list or None, report_metadata or None)
+        """
+        metrics = self.metrics
+        page_number = page['page_number']
+        print(f"Processing page {page_number}...")
+        page_text = f"PAGE {page_number}:\n{page['text']}"
+        
+        prompt = get_extractor_prompt(page_text, role, self.wire_format)
+        models = self.router.plan(page, page_info) if self.router else [self.model]
+        
+        fallback = (None, None)
+        for attempt, model in enumerate(models):
+            if attempt:
+                print(f"  ↻ Escalating page {page_number} to {model}")
+                metrics.increment("escalations", 1, page_number, STAGE)
+                self.router.escalated(model)
             
+            employees, metadata, complete = self._request_page(prompt, page_number, model, page_info)
+            if complete:
+                return employees, metadata
+            if employees and fallback[0] is None:
+                # Repaired from a truncated response: keep it unless escalation does better
+                fallback = (employees, metadata)
+        
+        if fallback[0] is None:
+            print(f"  ⚠ Skipping page {page_number} due to parsing issues")
+        return fallback
+    
+    def _request_page(self, prompt: str, page_number: int, model: str, page_info: Dict):
+        """
+        Make one extraction call for a page.
+        
+        Returns:
+            Tuple of (employees list or None, report_metadata or None, complete),
+            where complete is False if the response was truncated or unparseable
+        """
+        metrics = self.metrics
+        max_tokens = self.router.max_tokens(model) if self.router else 4096  # Maximum for Haiku model
+        
+        try:
+            start = time.perf_counter()
+            message = self.client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0,    # No creativity - just extraction
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            metrics.record_api_call(STAGE, page_number, model, message, time.perf_counter() - start)
+            
+            # Get the response text
+            response_text = message.content[0].text
+            
+            # Check if response was truncated
+            stop_reason = message.stop_reason
+            if stop_reason == "max_tokens":
+                print(f"  ⚠ Warning: Page {page_number} response truncated")
+                metrics.increment("truncations", 1, page_number, STAGE)
+            
+            # Parse JSON from response
             try:
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=4096,  # Maximum for Haiku model
-                    temperature=0,    # No creativity - just extraction
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ]
-                )
+                page_result = self._parse_response(response_text)
                 
-                # Get the response text
-                response_text = message.content[0].text
+                # Collect employees from this page
+                if page_result.get('employees'):
+                    print(f"  ✓ Extracted {len(page_result['employees'])} employees from page {page_number}")
+                else:
+                    print(f"  ⚠ No employees found on page {page_number}")
                 
-                # Check if response was truncated
-                stop_reason = message.stop_reason
-                if stop_reason == "max_tokens":
-                    print(f"  ⚠ Warning: Page {page['page_number']} response truncated")
+                page_info["employees"] = len(page_result.get('employees') or [])
+                return page_result.get('employees'), page_result.get('report_metadata'), stop_reason != "max_tokens"
                 
-                # Parse JSON from response
-                try:
-                    page_result = json.loads(response_text)
-                    
-                    # Save report metadata from first page
-                    if report_metadata is None and page_result.get('report_metadata'):
-                        report_metadata = page_result['report_metadata']
-                    
-                    # Collect employees from this page
-                    if page_result.get('employees'):
-                        all_employees.extend(page_result['employees'])
-                        print(f"  ✓ Extracted {len(page_result['employees'])} employees from page {page['page_number']}")
-                    else:
-                        print(f"  ⚠ No employees found on page {page['page_number']}")
-                        skipped_pages.append(page['page_number'])
-                    
-                except json.JSONDecodeError as e:
-                    print(f"  ✗ Error parsing page {page['page_number']}: {e}")
-                    print(f"  Response preview: {response_text[:200]}")
-                    # Try JSON repair for this page
-                    repaired = self._try_repair_json(response_text, stop_reason)
-                    if repaired and repaired.get('employees'):
-                        all_employees.extend(repaired['employees'])
-                        print(f"  ✓ Recovered {len(repaired['employees'])} employees after repair")
-                        if report_metadata is None and repaired.get('report_metadata'):
-                            report_metadata = repaired['report_metadata']
-                    else:
-                        print(f"  ⚠ Skipping page {page['page_number']} due to parsing issues")
-                        skipped_pages.append(page['page_number'])
-                    
-            except Exception as e:
-                print(f"  ✗ Error processing page {page['page_number']}: {e}")
-                skipped_pages.append(page['page_number'])
-                continue
-        
-        # Combine results
-        result = {
-            "report_metadata": report_metadata or {},
-            "employees": all_employees,
-            "skipped_pages": skipped_pages,
-        }
-        
-        print(f"\n✓ Total employees extracted: {len(all_employees)}")
-        if skipped_pages:
-            print(f"⚠ Pages skipped due to size/parse issues: {skipped_pages}")
-        return result
+            except ValueError as e:
+                print(f"  ✗ Error parsing page {page_number}: {e}")
+                print(f"  Response preview: {response_text[:200]}")
+                metrics.increment("parse_failures", 1, page_number, STAGE)
+                # Try JSON repair for this page
+                repaired = self._try_repair_json(response_text, stop_reason)
+                if repaired and repaired.get('employees'):
+                    print(f"  ✓ Recovered {len(repaired['employees'])} employees after repair")
+                    metrics.increment("repairs", 1, page_number, STAGE)
+                    page_info["employees"] = len(repaired['employees'])
+                    return repaired['employees'], repaired.get('report_metadata'), False
+                
+                return None, None, False
+                
+        except Exception as e:
+            print(f"  ✗ Error processing page {page_number}: {e}")
+            page_info["error"] = str(e)
+            return None, None, False
+    
+    def _parse_response(self, text: str) -> Dict:
+        """
+        Parse a page response into {"report_metadata": ..., "employees": [...]}.
+        
+        Raises:
+            ValueError: If the text is not JSON, or not in the wire layout
+        """
+        page_result = json.loads(text)
+        if self.wire_format:
+            page_result = expand_page(page_result)
+        return page_result
+    
+    def interim_config(self) -> Dict:
+        """Build config of the interim artifacts this extractor produces."""
+        config = {"model": self.model}
+        if self.router:
+            config["routing"] = self.router.config()
+        if self.wire_format:
+            config["wire_format"] = True
+        return config
     
     def _try_repair_json(self, text: str, stop_reason: str) -> Dict:
         """Try to repair truncated or malformed JSON."""
         if stop_reason != "max_tokens":
             return None
         
+        if self.wire_format:
+            fixed_text = repair_truncated(text)
+            try:
+                return self._parse_response(fixed_text) if fixed_text else None
+            except ValueError:
+                return None
+        
         # Try to fix truncated JSON
         fixed_text = text
         
@@ -152,46 +307,82 @@ class RawDataExtractor:
             fixed_text += '\n}'
         
         try:
-            return json.loads(fixed_text)
-        except json.JSONDecodeError:
+            return self._parse_response(fixed_text)
+        except ValueError:
             return None
     
     def validate_interim_format(self, data: Dict) -> bool:
-        """
-        Validate that the extracted data has expected structure.
-        
-        Args:
-            data: The extracted data dictionary
-            
-        Returns:
-            True if valid, False otherwise
-        """
-        if not isinstance(data, dict):
-            print("✗ Data is not a dictionary")
-            return False
-        
-        if "employees" not in data:
-            print("✗ Missing 'employees' key")
-            return False
-        
-        if not isinstance(data["employees"], list):
-            print("✗ 'employees' is not a list")
-            return False
-        
-        if len(data["employees"]) == 0:
-            print("⚠ Warning: No employees extracted")
-            return False
-        
-        # Check first employee has basic structure
-        first_emp = data["employees"][0]
-        required_keys = ["employee_name", "earnings", "deductions", "taxes"]
+        """Validate that the extracted data has expected structure."""
+        return validate_interim_format(data)
+
+
+def has_report_header(metadata: Optional[Dict]) -> bool:
+    """True if a page's report_metadata has at least one non-empty field."""
+    return isinstance(metadata, dict) and any(value not in (None, "") for value in metadata.values())
+
+
+def merge_page_results(page_results: List[Dict]) -> Dict:
+    """
+    Combine per-page Step 2 results into interim data.
+    
+    Args:
+        page_results: Results of RawDataExtractor.extract_page, in any order
         
-        for key in required_keys:
-            if key not in first_emp:
-                print(f"⚠ Warning: First employee missing key '{key}'")
+    Returns:
+        Interim data: report_metadata from the first page with a report header
+        (else the first page that returned any), all
+        employees in page order, and the pages that yielded no employees
+    """
+    all_employees = []
+    report_metadata = None
+    skipped_pages = []
+    
+    for page_result in sorted(page_results, key=lambda result: result['page_number']):
+        employees = page_result.get('employees')
+        metadata = page_result.get('report_metadata')
+        if metadata and (report_metadata is None or
+                         has_report_header(metadata) and not has_report_header(report_metadata)):
+            report_metadata = metadata
+        if employees:
+            # Remember the source page so later passes can find the employee's text
+            for emp in employees:
+                if isinstance(emp, dict):
+                    emp.setdefault('page_number', page_result['page_number'])
+            all_employees.extend(employees)
+        else:
+            skipped_pages.append(page_result['page_number'])
+    
+    return {
+        "report_metadata": report_metadata or {},
+        "employees": all_employees,
+        "skipped_pages": skipped_pages,
+    }
+
+
+def validate_interim_format(data: Dict) -> bool:
+    """
+    Validate that the extracted data has expected structure.
+    
+    Every employee and line is checked (see src/interim_validator.py).
+    
+    Args:
+        data: The extracted data dictionary
         
-        print(f"✓ Data structure looks valid")
-        return True
+    Returns:
+        True if valid, False otherwise
+    """
+    errors = validate_interim(data)
+    if errors:
+        print(f"✗ {len(errors)} structural problems in interim data:")
+        print_errors(errors)
+        return False
+    
+    if len(data["employees"]) == 0:
+        print("⚠ Warning: No employees extracted")
+        return False
+    
+    print(f"✓ Data structure looks valid ({len(data['employees'])} employees checked)")
+    return True
 
 
 if __name__ == "__main__":
@@ -202,9 +393,9 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         json_file = sys.argv[1]
         
-        # Load extracted.json
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Load extracted.json (JSON or binary)
+        from src.artifacts import read_artifact, write_artifact
+        data = read_artifact(Path(json_file))
         
         extractor = RawDataExtractor()
         interim_data = extractor.extract_raw_data(data['pages'])
@@ -221,10 +412,8 @@ if __name__ == "__main__":
             print(f"  Deductions: {len(emp.get('deductions', []))} lines")
             print(f"  Taxes: {len(emp.get('taxes', []))} lines")
         
-        # Save to interim.json
-        output_file = Path(json_file).parent / "interim.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(interim_data, f, indent=2, ensure_ascii=False)
+        # Save to interim.json (in the format of an existing interim artifact)
+        output_file = write_artifact(Path(json_file).parent / "interim.json", interim_data)
         print(f"\n✓ Saved to: {output_file}")
     else:
         print("Usage: python step2_raw_extraction.py <extracted.json>")
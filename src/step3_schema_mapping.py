@@ -8,16 +8,75 @@ import json
 import os
 import copy
 import re
-from typing import Dict, List, Any, Tuple
+import sys
+from typing import Dict, List, Any, Tuple, Optional
 from schemas.global_schema import GLOBAL_PAYROLL_SCHEMA, FIELD_ALIASES
+from src.rollups import RollupAggregator
+from src.fuzzy_matcher import FuzzyAliasMatcher
+from src.grounding import UNGROUNDED_CONFIDENCE, UNGROUNDED_KEY
+from src.jurisdictions import JurisdictionIndex, default_index
+from src.metrics import RunMetrics
+
+STAGE = "step3_schema_mapping"
+
+# Category an LLM pass (see src/refinement.py) suggested for a line no alias matched
+HINT_KEY = "category_hint"
+HINT_CONFIDENCE = 0.7
+
+# Confidence of "Other" for a description no alias matched (matches are scored by src/fuzzy_matcher.py)
+OTHER_CONFIDENCE = 0.3
+
+AMOUNT_FIELDS = ('amount_current', 'amount_ytd')
+HOURS_FIELDS = ('hours_current', 'hours_ytd')
+RATE_FIELDS = ('rate',)
+
+_EMPLOYEE_TEMPLATE = GLOBAL_PAYROLL_SCHEMA['employees'][0]
+LINE_TYPES = {
+    "earnings": _EMPLOYEE_TEMPLATE['earnings']['earning_lines'][0]['earning_type']['allowed_values'],
+    "deductions": _EMPLOYEE_TEMPLATE['deductions']['deduction_lines'][0]['deduction_type']['allowed_values'],
+    "taxes": _EMPLOYEE_TEMPLATE['employee_taxes']['tax_lines'][0]['tax_type']['allowed_values'],
+}
+
+
+def _grounded(raw: Dict, fields: Tuple[str, ...], confidence: float) -> float:
+    """Cap a value confidence when Step 2 found one of its fields missing from the page text."""
+    ungrounded = raw.get(UNGROUNDED_KEY)
+    if ungrounded and any(field in ungrounded for field in fields):
+        return min(confidence, UNGROUNDED_CONFIDENCE)
+    return confidence
+
+
+def _grounding_note(raw: Dict) -> str:
+    ungrounded = raw.get(UNGROUNDED_KEY)
+    return f"Not found in page text: {', '.join(ungrounded)}" if ungrounded else ""
 
 
 class SchemaMatcher:
     """Maps raw payroll data to global schema without LLM (for token efficiency)."""
     
-    def __init__(self):
-        """Initialize the mapper with field aliases."""
+    def __init__(self, metrics: Optional[RunMetrics] = None, classifier=None,
+                 jurisdictions: Optional[JurisdictionIndex] = None):
+        """
+        Initialize the mapper with field aliases.
+        
+        Args:
+            metrics: Optional run metrics to record stage timings into
+            classifier: Optional LabelClassifier (src/label_classifier.py) used
+                        for descriptions no alias matches
+            jurisdictions: Jurisdiction index for tax lines, e.g. with per-client
+                           overrides (default: built-in table)
+        """
         self.field_aliases = FIELD_ALIASES
+        self.alias_matchers = {
+            section: FuzzyAliasMatcher(self.field_aliases.get(section, {}))
+            for section in LINE_TYPES
+        }
+        self.metrics = metrics or RunMetrics()
+        self.classifier = classifier
+        self.jurisdictions = jurisdictions or default_index()
+        
+        # Unique (section, raw_code, raw_description, hint) -> classified label, per document
+        self.label_table: Dict[Tuple, Tuple] = {}
     
     def map_interim_to_schema(self, interim_data: Dict) -> Dict:
         """
@@ -29,6 +88,13 @@ class SchemaMatcher:
         Returns:
             Dictionary following global schema structure with mapped values
         """
+        with self.metrics.stage(STAGE) as stage_info:
+            output = self._map_interim(interim_data)
+            stage_info["employees"] = len(output.get('employees', []))
+        return output
+    
+    def _map_interim(self, interim_data: Dict) -> Dict:
+        """Map interim data to the global schema (see map_interim_to_schema)."""
         employees = interim_data.get('employees', [])
         
         if not employees:
@@ -37,6 +103,10 @@ class SchemaMatcher:
         
         print(f"Mapping {len(employees)} employees to global schema...")
         
+        self.label_table = {}
+        if self.classifier is not None:
+            self._classify_unmatched(employees)
+        
         # Start with global schema template
         output = copy.deepcopy(GLOBAL_PAYROLL_SCHEMA)
         
@@ -53,56 +123,19 @@ class SchemaMatcher:
             output['metadata']['report_metadata']['run_info']['payroll_number'] = meta.get('payroll_number')
             output['metadata']['extraction_timestamp'] = interim_data.get('extraction_timestamp')
         
-        # Map employees
+        # Map employees, accumulating rollups in the same pass
         mapped_employees = []
+        aggregator = RollupAggregator()
         
         for emp_raw in employees:
-            emp_obj = copy.deepcopy(GLOBAL_PAYROLL_SCHEMA['employees'][0])
-            
-            # Set basic employee info
-            emp_obj['employee_info']['employee_name'] = emp_raw.get('employee_name', 'Unknown')
-            emp_obj['employee_info']['employee_id'] = emp_raw.get('employee_id', 'Unknown')
-            emp_obj['employee_info']['ssn_masked'] = emp_raw.get('ssn_masked')
-            emp_obj['employee_info']['department'] = emp_raw.get('department')
-            emp_obj['employee_info']['state'] = emp_raw.get('state')
-            emp_obj['employee_info']['pay_frequency'] = emp_raw.get('pay_frequency')
-            
-            # Set tax profile
-            if emp_raw.get('tax_status_federal'):
-                emp_obj['employee_info']['tax_profile']['federal_filing_status'] = emp_raw.get('tax_status_federal')
-                emp_obj['employee_info']['tax_profile']['federal_allowances'] = emp_raw.get('tax_allowances_federal')
-            if emp_raw.get('tax_status_state'):
-                emp_obj['employee_info']['tax_profile']['state_filing_status'] = emp_raw.get('tax_status_state')
-                emp_obj['employee_info']['tax_profile']['state_allowances'] = emp_raw.get('tax_allowances_state')
-            
-            # Set payment info
-            emp_obj['payment_info']['payment_type']['value'] = emp_raw.get('payment_type')
-            emp_obj['payment_info']['check_number'] = emp_raw.get('check_number')
-            
-            # Map earnings with type matching
-            emp_obj['earnings']['earning_lines'] = self._map_earning_lines(emp_raw.get('earnings', []))
-            
-            # Map deductions with type matching
-            emp_obj['deductions']['deduction_lines'] = self._map_deduction_lines(emp_raw.get('deductions', []))
-            
-            # Map taxes with type matching
-            emp_obj['employee_taxes']['tax_lines'] = self._map_tax_lines(emp_raw.get('taxes', []))
-            
-            # Copy totals from raw data
-            if emp_raw.get('totals'):
-                totals = emp_raw['totals']
-                emp_obj['employee_totals']['gross_pay']['current'] = totals.get('gross_pay_current')
-                emp_obj['employee_totals']['gross_pay']['ytd'] = totals.get('gross_pay_ytd')
-                emp_obj['employee_totals']['total_employee_taxes']['current'] = totals.get('total_taxes_current')
-                emp_obj['employee_totals']['total_employee_taxes']['ytd'] = totals.get('total_taxes_ytd')
-                emp_obj['employee_totals']['total_deductions']['current'] = totals.get('total_deductions_current')
-                emp_obj['employee_totals']['total_deductions']['ytd'] = totals.get('total_deductions_ytd')
-                emp_obj['employee_totals']['net_pay']['current'] = totals.get('net_pay_current')
-                emp_obj['employee_totals']['net_pay']['ytd'] = totals.get('net_pay_ytd')
-            
+            emp_obj = self.map_employee(emp_raw)
             mapped_employees.append(emp_obj)
+            aggregator.add_employee(emp_obj)
         
         output['employees'] = mapped_employees
+        output['rollups'] = aggregator.to_schema()
+        
+        print(f"  {len(self.label_table)} distinct labels classified")
         
         # Add skipped pages info if present
         if interim_data.get('skipped_pages'):
@@ -110,36 +143,90 @@ class SchemaMatcher:
         
         return output
     
+    def map_employee(self, emp_raw: Dict) -> Dict:
+        """
+        Map one interim employee to the global schema employee shape.
+        
+        Args:
+            emp_raw: Employee dictionary from interim.json
+            
+        Returns:
+            Mapped employee dictionary
+        """
+        emp_obj = _copy_template(_EMPLOYEE_TEMPLATE)
+        
+        # Set basic employee info
+        emp_obj['employee_info']['employee_name'] = emp_raw.get('employee_name', 'Unknown')
+        emp_obj['employee_info']['employee_id'] = emp_raw.get('employee_id', 'Unknown')
+        emp_obj['employee_info']['ssn_masked'] = emp_raw.get('ssn_masked')
+        emp_obj['employee_info']['department'] = emp_raw.get('department')
+        emp_obj['employee_info']['state'] = emp_raw.get('state')
+        emp_obj['employee_info']['pay_frequency'] = emp_raw.get('pay_frequency')
+        
+        # Set tax profile
+        if emp_raw.get('tax_status_federal'):
+            emp_obj['employee_info']['tax_profile']['federal_filing_status'] = emp_raw.get('tax_status_federal')
+            emp_obj['employee_info']['tax_profile']['federal_allowances'] = emp_raw.get('tax_allowances_federal')
+        if emp_raw.get('tax_status_state'):
+            emp_obj['employee_info']['tax_profile']['state_filing_status'] = emp_raw.get('tax_status_state')
+            emp_obj['employee_info']['tax_profile']['state_allowances'] = emp_raw.get('tax_allowances_state')
+        
+        # Set payment info
+        emp_obj['payment_info']['payment_type']['value'] = emp_raw.get('payment_type')
+        emp_obj['payment_info']['check_number'] = emp_raw.get('check_number')
+        
+        # Map earnings with type matching
+        emp_obj['earnings']['earning_lines'] = self._map_earning_lines(emp_raw.get('earnings', []))
+        
+        # Map deductions with type matching
+        emp_obj['deductions']['deduction_lines'] = self._map_deduction_lines(emp_raw.get('deductions', []))
+        
+        # Map taxes with type matching
+        emp_obj['employee_taxes']['tax_lines'] = self._map_tax_lines(emp_raw.get('taxes', []))
+        
+        # Copy totals from raw data
+        if emp_raw.get('totals'):
+            totals = emp_raw['totals']
+            emp_obj['employee_totals']['gross_pay']['current'] = totals.get('gross_pay_current')
+            emp_obj['employee_totals']['gross_pay']['ytd'] = totals.get('gross_pay_ytd')
+            emp_obj['employee_totals']['total_employee_taxes']['current'] = totals.get('total_taxes_current')
+            emp_obj['employee_totals']['total_employee_taxes']['ytd'] = totals.get('total_taxes_ytd')
+            emp_obj['employee_totals']['total_deductions']['current'] = totals.get('total_deductions_current')
+            emp_obj['employee_totals']['total_deductions']['ytd'] = totals.get('total_deductions_ytd')
+            emp_obj['employee_totals']['net_pay']['current'] = totals.get('net_pay_current')
+            emp_obj['employee_totals']['net_pay']['ytd'] = totals.get('net_pay_ytd')
+        
+        return emp_obj
+    
     def _map_earning_lines(self, raw_earnings: List[Dict]) -> List[Dict]:
         """Map earning lines with type matching using aliases."""
         earning_lines = []
         
         for raw in raw_earnings:
-            desc = raw.get('raw_description', '').lower()
-            earning_type = self._match_earning_type(desc)
+            code, description, earning_type, type_confidence = self._label("earnings", raw)
             
             line = {
-                "earning_code": raw.get('raw_code'),
-                "earning_description": raw.get('raw_description'),
+                "earning_code": code,
+                "earning_description": description,
                 "earning_type": {
                     "value": earning_type,
-                    "confidence": self._calculate_confidence(desc, earning_type)
+                    "confidence": type_confidence
                 },
                 "rate": {
                     "value": raw.get('rate'),
-                    "confidence": 1.0 if raw.get('rate') else 0.0
+                    "confidence": _grounded(raw, RATE_FIELDS, 1.0 if raw.get('rate') else 0.0)
                 },
                 "hours": {
                     "current": raw.get('hours_current'),
                     "ytd": raw.get('hours_ytd'),
-                    "confidence": 1.0 if raw.get('hours_current') else 0.5
+                    "confidence": _grounded(raw, HOURS_FIELDS, 1.0 if raw.get('hours_current') else 0.5)
                 },
                 "amount": {
                     "current": raw.get('amount_current'),
                     "ytd": raw.get('amount_ytd'),
-                    "confidence": 1.0 if raw.get('amount_current') else 0.0
+                    "confidence": _grounded(raw, AMOUNT_FIELDS, 1.0 if raw.get('amount_current') else 0.0)
                 },
-                "notes": ""
+                "notes": _grounding_note(raw)
             }
             earning_lines.append(line)
         
@@ -150,26 +237,25 @@ class SchemaMatcher:
         deduction_lines = []
         
         for raw in raw_deductions:
-            desc = raw.get('raw_description', '').lower()
-            ded_type = self._match_deduction_type(desc)
+            code, description, ded_type, type_confidence, is_pre_tax = self._label("deductions", raw)
             
             line = {
-                "deduction_code": raw.get('raw_code'),
-                "deduction_description": raw.get('raw_description'),
+                "deduction_code": code,
+                "deduction_description": description,
                 "deduction_type": {
                     "value": ded_type,
-                    "confidence": self._calculate_confidence(desc, ded_type)
+                    "confidence": type_confidence
                 },
                 "is_pre_tax": {
-                    "value": self._is_pre_tax(ded_type),
+                    "value": is_pre_tax,
                     "confidence": 0.95
                 },
                 "amount": {
                     "current": raw.get('amount_current'),
                     "ytd": raw.get('amount_ytd'),
-                    "confidence": 1.0 if raw.get('amount_current') else 0.0
+                    "confidence": _grounded(raw, AMOUNT_FIELDS, 1.0 if raw.get('amount_current') else 0.0)
                 },
-                "notes": ""
+                "notes": _grounding_note(raw)
             }
             deduction_lines.append(line)
         
@@ -180,15 +266,14 @@ class SchemaMatcher:
         tax_lines = []
         
         for raw in raw_taxes:
-            desc = raw.get('raw_description', '').lower()
-            tax_type, authority, jurisdiction = self._match_tax_type(desc)
+            code, description, tax_type, type_confidence, authority, jurisdiction = self._label("taxes", raw)
             
             line = {
-                "tax_code": raw.get('raw_code'),
-                "tax_description": raw.get('raw_description'),
+                "tax_code": code,
+                "tax_description": description,
                 "tax_type": {
                     "value": tax_type,
-                    "confidence": self._calculate_confidence(desc, tax_type)
+                    "confidence": type_confidence
                 },
                 "tax_authority": {
                     "value": authority,
@@ -198,86 +283,168 @@ class SchemaMatcher:
                 "tax_amount": {
                     "current": raw.get('amount_current'),
                     "ytd": raw.get('amount_ytd'),
-                    "confidence": 1.0 if raw.get('amount_current') else 0.0
+                    "confidence": _grounded(raw, AMOUNT_FIELDS, 1.0 if raw.get('amount_current') else 0.0)
                 },
-                "notes": ""
+                "notes": _grounding_note(raw)
             }
             tax_lines.append(line)
         
         return tax_lines
     
-    def _match_earning_type(self, description: str) -> str:
-        """Match earning description to normalized type."""
-        aliases = self.field_aliases.get('earning_types', {})
+    def _label(self, section: str, raw: Dict) -> Tuple:
+        """
+        Classified label for a raw line, computed once per distinct label.
         
-        for normalized_type, patterns in aliases.items():
-            for pattern in patterns:
-                if pattern.lower() in description:
-                    return normalized_type
+        Returns:
+            (code, description, type, confidence) plus is_pre_tax for deductions
+            or (authority, jurisdiction) for taxes; strings are interned
+        """
+        code = raw.get('raw_code')
+        description = raw.get('raw_description')
+        hint = raw.get(HINT_KEY)
+        key = (section, code, description, hint)
         
-        return "Other"
+        label = self.label_table.get(key)
+        if label is None:
+            label = self.label_table[key] = self._classify_label(section, code, description, hint)
+        return label
     
-    def _match_deduction_type(self, description: str) -> str:
-        """Match deduction description to normalized type."""
-        aliases = self.field_aliases.get('deduction_types', {})
+    def _classify_label(self, section: str, code: Any, description: Optional[str], hint: Optional[str]) -> Tuple:
+        """Classify one distinct label (see _label)."""
+        desc = (description or '').lower()
+        code = _intern(code)
+        description = _intern(description)
         
-        for normalized_type, patterns in aliases.items():
-            for pattern in patterns:
-                if pattern.lower() in description:
-                    return normalized_type
+        if section == "taxes":
+            # Original case: the jurisdiction index only takes leading state codes printed in capitals
+            matched_type, confidence, authority, jurisdiction = self._match_tax_type(description or '')
+        else:
+            matched_type, confidence = self._match_type(section, desc)
+        matched_type, confidence = self._apply_hint(section, description, hint, matched_type, confidence)
         
-        return "Other"
+        if section == "earnings":
+            return code, description, matched_type, confidence
+        if section == "deductions":
+            return code, description, matched_type, confidence, self._is_pre_tax(matched_type)
+        return code, description, matched_type, confidence, _intern(authority), _intern(jurisdiction)
     
-    def _match_tax_type(self, description: str) -> Tuple[str, str, str]:
-        """Match tax description to normalized type, authority, and jurisdiction."""
-        aliases = self.field_aliases.get('tax_types', {})
-        
-        tax_type = "Other"
+    def _match_type(self, section: str, description: str) -> Tuple[str, float]:
+        """Match a description to the normalized type of a section (exact, whole-word, then fuzzy)."""
+        matched_type, confidence = self.alias_matchers[section].match(description)
+        if matched_type is None:
+            return "Other", OTHER_CONFIDENCE
+        return matched_type, confidence
+    
+    def _match_tax_type(self, description: str) -> Tuple[str, float, str, str]:
+        """Match tax description (as printed) to normalized type, confidence, authority, and jurisdiction."""
         authority = "Federal"
         jurisdiction = None
         
-        # Check for jurisdiction first
-        jurisdiction_patterns = ["ma:", "ca:", "ny:", "tx:", "fl:"]
-        for pattern in jurisdiction_patterns:
-            if pattern in description:
-                jurisdiction = pattern.replace(":", "").upper()
-                authority = "State"
-                break
+        # Check for jurisdiction first (state, territory or locality)
+        found = self.jurisdictions.lookup(description)
+        if found:
+            state, locality, authority = found
+            jurisdiction = locality or state
         
         # Match tax type
-        for normalized_type, patterns in aliases.items():
-            for pattern in patterns:
-                if pattern.lower() in description:
-                    tax_type = normalized_type
-                    # Determine authority based on type
-                    if "federal" in normalized_type.lower() or "fica" in normalized_type.lower():
-                        authority = "Federal"
-                    elif "state" in normalized_type.lower() or "sdi" in normalized_type.lower() or "sui" in normalized_type.lower():
-                        authority = "State"
-                    elif "local" in normalized_type.lower():
-                        authority = "Local"
-                    return tax_type, authority, jurisdiction
-        
-        return tax_type, authority, jurisdiction
+        tax_type, confidence = self._match_type("taxes", description.lower())
+        if tax_type != "Other":
+            # Determine authority based on type
+            if "federal" in tax_type.lower() or tax_type in ("OASDI", "Medicare"):
+                authority = "Federal"
+            elif "state" in tax_type.lower() or "sdi" in tax_type.lower() or "sui" in tax_type.lower():
+                authority = "State"
+            elif "local" in tax_type.lower():
+                authority = "Local"
+        
+        return tax_type, confidence, authority, jurisdiction
     
     def _is_pre_tax(self, deduction_type: str) -> bool:
         """Determine if deduction is pre-tax."""
         pre_tax_types = ["401k", "403b", "fsa", "hsa"]
         return any(pt in deduction_type.lower() for pt in pre_tax_types)
     
-    def _calculate_confidence(self, description: str, matched_type: str) -> float:
-        """Calculate confidence score for match."""
-        if matched_type == "Other":
-            return 0.3  # Low confidence for "Other"
-        return 0.85  # High confidence for matched types
+    def _classify_unmatched(self, employees: List[Dict]):
+        """Send every unique description no alias matches to the label classifier (cached, batched)."""
+        labels = {}
+        for emp_raw in employees:
+            for section in LINE_TYPES:
+                for raw in emp_raw.get(section) or []:
+                    description = raw.get('raw_description')
+                    if description and not raw.get(HINT_KEY):
+                        labels[(section, description)] = True
+        
+        unmatched = [
+            (section, description) for section, description in labels
+            if self._match_type(section, description.lower())[0] == "Other"
+        ]
+        if unmatched:
+            self.classifier.classify(unmatched)
+    
+    def _apply_hint(self, section: str, description: Optional[str], hint: Optional[str],
+                    matched_type: str, confidence: float) -> Tuple[str, float]:
+        """Resolve a label no alias matched: refinement hint first, then the label classifier cache."""
+        if matched_type != "Other":
+            return matched_type, confidence
+        
+        if hint and hint != "Other" and hint in LINE_TYPES[section]:
+            return hint, HINT_CONFIDENCE
+        
+        if self.classifier is not None:
+            cached = self.classifier.lookup(section, description)
+            if cached is not None and cached[0] != "Other":
+                return cached
+        
+        return matched_type, confidence
     
     def _create_empty_mapped_schema(self, report_metadata: Dict) -> Dict:
         """Create empty schema with metadata."""
         output = copy.deepcopy(GLOBAL_PAYROLL_SCHEMA)
         output['metadata']['report_metadata'] = report_metadata
+        output['employees'] = []
+        output['rollups'] = RollupAggregator().to_schema()
         return output
 
 
+def matcher_from_config(config: Dict, metrics: Optional[RunMetrics] = None,
+                        model: Optional[str] = None) -> SchemaMatcher:
+    """
+    Recreate the SchemaMatcher a mapped.json was built with, from its build config.
+    
+    Args:
+        config: mapped.json build config (see src/artifacts.py)
+        metrics: Optional run metrics
+        model: Model for label classification calls (default: Step 2's)
+    """
+    classifier = None
+    if config.get("classify_labels"):
+        from pathlib import Path
+        from src.label_classifier import LabelClassifier
+        kwargs = {"model": model} if model else {}
+        classifier = LabelClassifier(cache_path=Path(config["label_cache"]), metrics=metrics, **kwargs)
+    
+    jurisdictions = None
+    if config.get("jurisdictions"):
+        jurisdictions = JurisdictionIndex.from_file(config["jurisdictions"])
+    
+    return SchemaMatcher(metrics=metrics, classifier=classifier, jurisdictions=jurisdictions)
+
+
+def _copy_template(node: Any) -> Any:
+    """Copy a schema template (plain dicts/lists/scalars; cheaper than deepcopy)."""
+    node_type = type(node)
+    if node_type is dict:
+        return {key: _copy_template(value) for key, value in node.items()}
+    if node_type is list:
+        return [_copy_template(item) for item in node]
+    return node
+
+
+def _intern(value: Any) -> Any:
+    """Intern strings so every line with the same label shares one object."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 if __name__ == "__main__":
     # Test mapping
     import sys
@@ -286,9 +453,9 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         json_file = sys.argv[1]
         
-        # Load interim.json
-        with open(json_file, 'r', encoding='utf-8') as f:
-            interim_data = json.load(f)
+        # Load interim.json (JSON or binary)
+        from src.artifacts import read_artifact
+        interim_data = read_artifact(Path(json_file))
         
         matcher = SchemaMatcher()
         mapped_data = matcher.map_interim_to_schema(interim_data)
@@ -0,0 +1,143 @@
+"""
+Step 1 Text Cache
+Content-addressed cache of per-page PDF text, so re-running Step 1 on a PDF
+that has not changed skips PyMuPDF parsing entirely.
+Output: one gzip-compressed JSON file of pages per cache key
+
+The key is a hash of the PDF's SHA-256, the PyMuPDF version and the
+extraction flags (e.g. whether word boxes were requested), so a new PyMuPDF
+release or different flags never return stale text. Entries are evicted
+least-recently-used first (by file mtime, refreshed on every hit) once the
+cache grows past its size limit.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_CACHE_DIR = Path("./outputs") / ".text_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CACHE_FORMAT = 1
+SUFFIX = ".json.gz"
+
+
+def pymupdf_version() -> str:
+    """Installed PyMuPDF version (part of every cache key)."""
+    from importlib import metadata
+    try:
+        return metadata.version("pymupdf")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class PageTextCache:
+    """Size-bounded, LRU-evicted cache of Step 1 pages."""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir: Directory holding the cache entries
+            max_bytes: Total compressed size to keep; older entries are evicted
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def key(self, pdf_sha256: str, flags: Optional[Dict] = None) -> str:
+        """Cache key for a PDF's content hash and extraction flags."""
+        payload = {
+            "format": CACHE_FORMAT,
+            "pdf": pdf_sha256,
+            "pymupdf": pymupdf_version(),
+            "flags": flags or {},
+        }
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{SUFFIX}"
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """
+        Look up cached pages.
+
+        Returns:
+            List of page dictionaries, or None on a miss (or unreadable entry)
+        """
+        path = self.path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                pages = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, json.JSONDecodeError):
+            # Truncated or corrupt entry: drop it and re-extract
+            path.unlink(missing_ok=True)
+            return None
+
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return pages
+
+    def put(self, key: str, pages: List[Dict]):
+        """Store pages under key (atomically), then evict down to the size limit."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8', compresslevel=6) as f:
+                json.dump(pages, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def entries(self) -> List[os.DirEntry]:
+        """Cache entries, least recently used first."""
+        if not self.cache_dir.exists():
+            return []
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(SUFFIX)]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        return entries
+
+    def size(self) -> int:
+        """Total compressed size of all entries in bytes."""
+        return sum(entry.stat().st_size for entry in self.entries())
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+
+        Returns:
+            Number of entries removed
+        """
+        entries = self.entries()
+        total = sum(entry.stat().st_size for entry in entries)
+        removed = 0
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> int:
+        """Remove every entry; returns the number removed."""
+        removed = 0
+        for entry in self.entries():
+            try:
+                os.unlink(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
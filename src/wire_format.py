@@ -0,0 +1,235 @@
+"""
+Compact Wire Format for Step 2 responses
+Positional-array alternative to the keyed interim JSON the model writes, and
+the local expander that rebuilds the interim page dict from it.
+
+The keyed format makes the model spell out "raw_description",
+"amount_current", "hours_ytd"... on every line and write every null; output
+tokens dominate per-page latency and are what hits max_tokens. The wire
+format keeps the same values in a fixed order, defined by a header in the
+prompt, with trailing nulls and empty sections left out:
+
+    {"m": [report_title, company_name, ...],          (header pages only)
+     "e": [[INFO, EARNINGS, DEDUCTIONS, TAXES, TOTALS], ...]}
+
+Field order comes from the JSON skeleton in EXTRACTOR_PROMPT_TEMPLATE (as
+for the interim validator), so the two formats cannot drift apart.
+Output: interim page dicts identical in shape to the keyed format
+"""
+
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.interim_validator import interim_skeleton
+
+METADATA_KEY = "m"
+EMPLOYEES_KEY = "e"
+
+
+class WireLayout:
+    """Positional layout of the interim format, derived from its skeleton."""
+
+    def __init__(self, skeleton: Dict):
+        employee = skeleton["employees"][0]
+        self.metadata_fields: Tuple[str, ...] = tuple(skeleton["report_metadata"])
+        self.info_fields: Tuple[str, ...] = tuple(
+            key for key, value in employee.items() if not isinstance(value, (list, dict)))
+        # Sections in skeleton order: line arrays (earnings, ...) and fixed objects (totals)
+        self.line_sections: Dict[str, Tuple[str, ...]] = {
+            key: tuple(value[0]) for key, value in employee.items() if isinstance(value, list)}
+        self.object_sections: Dict[str, Tuple[str, ...]] = {
+            key: tuple(value) for key, value in employee.items() if isinstance(value, dict)}
+        self.sections: Tuple[str, ...] = tuple(
+            key for key, value in employee.items() if isinstance(value, (list, dict)))
+        self.employee_keys: Tuple[str, ...] = tuple(employee)
+
+
+@lru_cache(maxsize=1)
+def layout() -> WireLayout:
+    return WireLayout(interim_skeleton())
+
+
+def _trim(values: List) -> List:
+    """Drop trailing nulls and empty lists (the expander restores them)."""
+    end = len(values)
+    while end and (values[end - 1] is None or values[end - 1] == []):
+        end -= 1
+    return values[:end]
+
+
+def _row(fields: Tuple[str, ...], data: Optional[Dict]) -> List:
+    data = data or {}
+    return _trim([data.get(field) for field in fields])
+
+
+def _record(fields: Tuple[str, ...], row: Any, what: str) -> Dict:
+    """Keyed dict from a positional row (missing trailing values are null)."""
+    if row is None:
+        row = []
+    if not isinstance(row, list):
+        raise ValueError(f"{what}: expected an array, got {type(row).__name__}")
+    if len(row) > len(fields):
+        raise ValueError(f"{what}: {len(row)} values for {len(fields)} fields")
+    record = dict(zip(fields, row))
+    for field in fields[len(row):]:
+        record[field] = None
+    return record
+
+
+def encode_page(page: Dict) -> Dict:
+    """
+    Encode a keyed Step 2 page response in the wire format.
+
+    Args:
+        page: {"report_metadata": {...} (optional), "employees": [...]}
+
+    Returns:
+        {"m": [...], "e": [...]} ("m" only if the page has report_metadata)
+    """
+    wire_layout = layout()
+    wire = {}
+    if "report_metadata" in page:
+        wire[METADATA_KEY] = _row(wire_layout.metadata_fields, page["report_metadata"])
+    employees = []
+    for emp in page.get("employees") or []:
+        row = [_row(wire_layout.info_fields, emp)]
+        for section in wire_layout.sections:
+            if section in wire_layout.line_sections:
+                fields = wire_layout.line_sections[section]
+                row.append([_row(fields, line) for line in emp.get(section) or []])
+            else:
+                row.append(_row(wire_layout.object_sections[section], emp.get(section)))
+        employees.append(_trim(row))
+    wire[EMPLOYEES_KEY] = employees
+    return wire
+
+
+def expand_page(wire: Dict) -> Dict:
+    """
+    Rebuild the keyed Step 2 page response from the wire format.
+
+    Responses that are already keyed (the model ignored the wire header)
+    are returned unchanged.
+
+    Args:
+        wire: Parsed wire response {"m": [...], "e": [...]}
+
+    Returns:
+        {"report_metadata": {...} or None, "employees": [...]} with every
+        skeleton key present, in skeleton order
+
+    Raises:
+        ValueError: If the response does not follow the wire layout
+    """
+    if not isinstance(wire, dict):
+        raise ValueError(f"Expected a JSON object, got {type(wire).__name__}")
+    if EMPLOYEES_KEY not in wire and METADATA_KEY not in wire:
+        return wire
+
+    wire_layout = layout()
+    metadata = None
+    if wire.get(METADATA_KEY) is not None:
+        metadata = _record(wire_layout.metadata_fields, wire[METADATA_KEY], "report metadata")
+
+    employees = []
+    for index, row in enumerate(wire.get(EMPLOYEES_KEY) or []):
+        what = f"employee {index}"
+        if not isinstance(row, list) or len(row) > 1 + len(wire_layout.sections):
+            raise ValueError(f"{what}: expected [info, sections...]")
+        row = row + [None] * (1 + len(wire_layout.sections) - len(row))
+        emp = _record(wire_layout.info_fields, row[0], what)
+        for section, value in zip(wire_layout.sections, row[1:]):
+            if section in wire_layout.line_sections:
+                if value is not None and not isinstance(value, list):
+                    raise ValueError(f"{what}.{section}: expected an array of lines")
+                fields = wire_layout.line_sections[section]
+                emp[section] = [_record(fields, line, f"{what}.{section}") for line in value or []]
+            else:
+                emp[section] = _record(wire_layout.object_sections[section], value, f"{what}.{section}")
+        employees.append({key: emp[key] for key in wire_layout.employee_keys})
+
+    return {"report_metadata": metadata, "employees": employees}
+
+
+def repair_truncated(text: str) -> Optional[str]:
+    """
+    Close a wire response cut off by max_tokens after its last complete array.
+
+    Wire responses are written on one line, so the line-based repair of the
+    keyed format would drop the whole page; this keeps every employee and
+    line that was finished (the last employee possibly missing sections).
+
+    Returns:
+        Parseable JSON text, or None if no array was completed
+    """
+    stack = []
+    in_string = escaped = False
+    cut, open_at_cut = None, None
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append(char)
+        elif char in "]}":
+            if not stack:
+                return None
+            stack.pop()
+            cut, open_at_cut = index + 1, list(stack)
+    if cut is None:
+        return None
+    return text[:cut] + "".join("]" if char == "[" else "}" for char in reversed(open_at_cut))
+
+
+def _example(with_metadata: bool) -> str:
+    """A one-employee example, encoded with encode_page so it always matches the layout."""
+    page = {
+        "employees": [{
+            "employee_name": "Doe, Jane",
+            "employee_id": "1001",
+            "department": "20",
+            "earnings": [{"raw_code": "1", "raw_description": "1-Regular Pay", "rate": "25.00",
+                          "hours_current": "40.00", "amount_current": "1,000.00", "amount_ytd": "12,000.00"}],
+            "deductions": [],
+            "taxes": [{"raw_description": "MA: State WH", "amount_current": "(5.50)"}],
+            "totals": {"gross_pay_current": "1,000.00"},
+        }],
+    }
+    if with_metadata:
+        page["report_metadata"] = {"report_title": "Payroll Register", "company_name": "Acme Co"}
+    return json.dumps(encode_page(page), ensure_ascii=False, separators=(",", ":"))
+
+
+@lru_cache(maxsize=None)
+def wire_header(role: str = "header") -> str:
+    """
+    The format definition put in the prompt.
+
+    Args:
+        role: "header" (report metadata + employees) or "employees" (employees only)
+    """
+    wire_layout = layout()
+    with_metadata = role == "header"
+    sections = ", ".join(section.upper() for section in wire_layout.sections)
+    lines = []
+    if with_metadata:
+        lines.append(f'{{"{METADATA_KEY}": META, "{EMPLOYEES_KEY}": [EMPLOYEE, ...]}}')
+        lines.append(f"META = [{', '.join(wire_layout.metadata_fields)}]")
+    else:
+        lines.append(f'{{"{EMPLOYEES_KEY}": [EMPLOYEE, ...]}}')
+    lines.append(f"EMPLOYEE = [INFO, {sections}]")
+    lines.append(f"INFO = [{', '.join(wire_layout.info_fields)}]")
+    for section in wire_layout.sections:
+        if section in wire_layout.line_sections:
+            lines.append(f"{section.upper()} = list of [{', '.join(wire_layout.line_sections[section])}]")
+        else:
+            lines.append(f"{section.upper()} = [{', '.join(wire_layout.object_sections[section])}]")
+    lines.append("Example: " + _example(with_metadata))
+    return "\n".join(lines)
@@ -0,0 +1,120 @@
+"""
+Artifact format benchmark (offline, synthetic data)
+Writes and reads synthetic extracted and interim artifacts of large registers
+as pretty-printed JSON (the default), and as MessagePack+zstd, and reports
+write time, read time and bytes on disk. The interim artifact is rows of
+employees with earning/deduction/tax lines; the extracted artifact is the
+page text such a register would produce.
+
+Usage:
+    python testing/benchmark_artifact_formats.py
+    python testing/benchmark_artifact_formats.py --employees 1000 50000 --repeat 3
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.artifacts import ARTIFACT_FORMATS, read_artifact, write_artifact
+
+SECTIONS = ["earnings", "deductions", "taxes"]
+LINES_PER_SECTION = 3
+EMPLOYEES_PER_PAGE = 5
+
+
+def make_interim(employees: int, seed: int = 1) -> dict:
+    """Interim data as Step 2 produces it, with amounts as strings and numbers."""
+    rng = random.Random(seed)
+
+    def line(section, index):
+        return {
+            "raw_code": str(index),
+            "raw_description": f"{index}-{section[:3].title()} Item {index}",
+            "rate": f"{rng.uniform(15, 60):.2f}" if section == "earnings" else None,
+            "hours_current": f"{rng.uniform(1, 40):.2f}" if section == "earnings" else None,
+            "amount_current": f"{rng.uniform(1, 2500):,.2f}",
+            "amount_ytd": round(rng.uniform(500, 50000), 2),
+        }
+
+    return {
+        "report_metadata": {"report_title": "Payroll Register", "company_name": "Acme"},
+        "employees": [
+            {
+                "employee_name": f"Employee{i}, Pat",
+                "employee_id": str(100000 + i),
+                "ssn_masked": f"*******{i % 10000:04d}",
+                "department": str(i % 12),
+                "page_number": i // EMPLOYEES_PER_PAGE + 1,
+                **{section: [line(section, n) for n in range(LINES_PER_SECTION)] for section in SECTIONS},
+                "totals": {"gross_pay_current": f"{rng.uniform(500, 5000):,.2f}", "net_pay_current": None},
+            }
+            for i in range(employees)
+        ],
+    }
+
+
+def make_extracted(interim: dict) -> dict:
+    """Page text roughly the size of the register the interim data came from."""
+    pages = {}
+    for emp in interim["employees"]:
+        lines = [emp["employee_name"], f"ID {emp['employee_id']}  SSN {emp['ssn_masked']}"]
+        for section in SECTIONS:
+            lines.extend(f"{line['raw_description']:<24} {line['amount_current']:>12} {line['amount_ytd']:>12}"
+                         for line in emp[section])
+        pages.setdefault(emp["page_number"], []).extend(lines)
+    return {
+        "source_file": "synthetic.pdf",
+        "total_pages": len(pages),
+        "pages": [{"page_number": number, "text": "\n".join(lines), "char_count": sum(map(len, lines))}
+                  for number, lines in pages.items()],
+    }
+
+
+def measure(data: dict, artifact_format: str, directory: Path, repeat: int) -> dict:
+    path = directory / f"artifact-{artifact_format}.json"
+    write_seconds, read_seconds = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        written = write_artifact(path, data, format=artifact_format)
+        write_seconds.append(time.perf_counter() - start)
+
+        loaded = None  # Free the previous copy outside the timed read
+        start = time.perf_counter()
+        loaded = read_artifact(path)
+        read_seconds.append(time.perf_counter() - start)
+    if loaded != data:
+        raise AssertionError(f"{artifact_format} round trip changed the data")
+    return {"write": min(write_seconds), "read": min(read_seconds), "bytes": written.stat().st_size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark intermediate artifact formats")
+    parser.add_argument("--employees", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of-N timings")
+    args = parser.parse_args()
+
+    header = (f"{'artifact':>9} {'employees':>9} {'format':>8} | {'write s':>8} {'read s':>8} "
+              f"{'MB':>8} | {'size':>6} {'write':>6} {'read':>6}")
+    print(header)
+    print("-" * len(header))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for employees in args.employees:
+            interim = make_interim(employees)
+            for name, data in (("interim", interim), ("extracted", make_extracted(interim))):
+                results = {fmt: measure(data, fmt, Path(tmp), args.repeat) for fmt in ARTIFACT_FORMATS}
+                base = results["json"]
+                for fmt, result in results.items():
+                    print(f"{name:>9} {employees:>9} {fmt:>8} | {result['write']:>8.3f} {result['read']:>8.3f} "
+                          f"{result['bytes'] / 1e6:>8.2f} | {result['bytes'] / base['bytes']:>6.1%} "
+                          f"{base['write'] / result['write']:>5.1f}x {base['read'] / result['read']:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
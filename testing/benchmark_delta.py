@@ -0,0 +1,233 @@
+"""
+Delta extraction benchmark (synthetic weekly registers, fake client)
+Renders two consecutive weeks of a register as Step 1 text (one value per
+line, the name in the middle of each block, like PyMuPDF output on
+PR-Register.pdf). Week two has every YTD moved on by the current amounts,
+some employees' hours and deductions changed, new hires and a termination.
+Week two's Step 2 then runs twice: from scratch, and as a delta against
+week one's outputs (src/delta.py). A fake client answers each prompt with the
+true employees whose names appear in it.
+
+Reports LLM calls, input/output tokens (estimated from characters), the
+share of employees reused, and whether the delta result equals the full
+extraction.
+
+Usage:
+    python testing/benchmark_delta.py
+    python testing/benchmark_delta.py --pages 20 --employees-per-page 8 --changed 0.2 --hires 3
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import random
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.artifacts import write_artifact
+from src.delta import DeltaExtractor
+from src.metrics import RunMetrics
+from src.replay import ReplayMessage
+from src.step2_raw_extraction import RawDataExtractor
+
+PREAMBLE = ["Pays", "Deductions & Memos", "Taxes", "Employee Name", "Year-to-Date", "Description", "Rate",
+            "Hours", "Amount", "Current", "YTD", "Net Pay"]
+DEDUCTIONS = ["4-401K Plan", "2-CAF Medical", "3-CAF Dental", "31-Child Support"]
+TAXES = ["Federal WH", "OASDI", "Medicare", "MA: State WH"]
+SURNAMES = ["Golikowski", "Lively", "McCue", "Abbott", "Baptiste", "Chen", "Dunleavy", "Okafor", "Ferreira",
+            "Gallagher", "Haddad", "Iverson", "Jablonski", "Kowalczyk", "Lindqvist", "Moreau", "Nakamura"]
+
+_PAGE = re.compile(r"^PAGE (\d+):$", re.MULTILINE)
+
+
+def money(value: float) -> str:
+    return f"{value:,.2f}"
+
+
+def new_employee(rng: random.Random, number: int) -> dict:
+    """An employee's state: pay setup and YTD figures (rendered per week by week_record)."""
+    return {
+        "name": f"{SURNAMES[number % len(SURNAMES)]}{number}, {rng.choice(['Pat', 'Sam', 'Alex'])} {chr(65 + number % 26)}.",
+        "id": str(2001000 + number),
+        "ssn": f"*******{rng.randrange(10000):04d}",
+        "rate": round(rng.uniform(15, 45), 2),
+        "hours": 40.0,
+        "deductions": {name: round(rng.uniform(5, 120), 2) for name in rng.sample(DEDUCTIONS, rng.randint(1, 3))},
+        "ytd": {},
+    }
+
+
+def week_record(state: dict) -> dict:
+    """Advance one employee by a week; returns this week's interim employee."""
+    gross = round(state["rate"] * state["hours"], 2)
+    taxes = {"Federal WH": round(gross * 0.09, 2), "OASDI": round(gross * 0.062, 2),
+             "Medicare": round(gross * 0.0145, 2), "MA: State WH": round(gross * 0.05, 2)}
+    ytd = state["ytd"]
+
+    def line(description, current, ytd_key, **extra):
+        ytd[ytd_key] = round(ytd.get(ytd_key, 0) + current, 2)
+        return {"raw_code": description.split("-")[0] if "-" in description else None,
+                "raw_description": description, **extra,
+                "amount_current": money(current), "amount_ytd": money(ytd[ytd_key])}
+
+    ytd["hours"] = round(ytd.get("hours", 0) + state["hours"], 2)
+    earnings = [line("0-Regular Pay", gross, "gross", rate=money(state["rate"]),
+                     hours_current=money(state["hours"]), hours_ytd=money(ytd["hours"]))]
+    deductions = [line(name, amount, name) for name, amount in state["deductions"].items()]
+    tax_lines = [line(name, amount, name) for name, amount in taxes.items()]
+    net = gross - sum(state["deductions"].values()) - sum(taxes.values())
+    return {
+        "employee_name": state["name"], "employee_id": state["id"], "ssn_masked": state["ssn"],
+        "department": "1", "payment_type": "DD", "check_number": None, "state": "MA",
+        "tax_status_federal": "Single", "tax_allowances_federal": "1",
+        "earnings": earnings, "deductions": deductions, "taxes": tax_lines,
+        "totals": {"gross_pay_current": money(gross), "gross_pay_ytd": money(ytd["gross"]),
+                   "total_deductions_current": None, "total_deductions_ytd": None,
+                   "total_taxes_current": None, "total_taxes_ytd": None,
+                   "net_pay_current": money(net), "net_pay_ytd": None},
+    }
+
+
+def render_block(emp: dict) -> list:
+    """Text lines of one employee, in the order PyMuPDF returns PR-Register.pdf blocks."""
+    lines = []
+    for line in emp["deductions"]:
+        lines += [line["raw_description"], line["amount_current"], line["amount_ytd"]]
+    earning = emp["earnings"][0]
+    lines += [earning["raw_description"], earning["rate"], earning["hours_current"], earning["amount_current"],
+              earning["amount_ytd"], earning["raw_description"], earning["hours_ytd"]]
+    lines += [emp["employee_id"], emp["employee_name"], "1", "DD", emp["ssn_masked"], "MA", "Weekly", "Single",
+              emp["tax_allowances_federal"]]
+    for line in emp["taxes"]:
+        lines += [line["amount_ytd"], line["amount_current"], line["raw_description"]]
+    lines += ["Totals:", emp["totals"]["gross_pay_current"], "Employee Totals", emp["totals"]["net_pay_current"]]
+    return lines
+
+
+def render_week(pages: list, check_date: str) -> list:
+    """Step 1 pages for a week: column headers, employee blocks, report header lines at the end."""
+    result = []
+    for number, employees in enumerate(pages, 1):
+        lines = list(PREAMBLE)
+        for emp in employees:
+            lines += render_block(emp)
+        lines += ["Payroll Register", "Acme Manufacturing Co", f"Check Date: {check_date}", f"Page {number}"]
+        result.append({"page_number": number, "text": "\n".join(lines)})
+    return result
+
+
+def make_weeks(pages: int, per_page: int, changed: float, hires: int, seed: int = 1):
+    """(week one pages, week one truth, week two pages, week two truth); truth = employees per page."""
+    rng = random.Random(seed)
+    states = [[new_employee(rng, page * 100 + i) for i in range(per_page)] for page in range(pages)]
+    for _ in range(6):  # Mid-year: YTD figures differ from the current ones
+        for page in states:
+            for state in page:
+                week_record(state)
+    week1 = [[week_record(state) for state in page] for page in states]
+
+    # Week two: some pay changes, new hires on random pages, one termination
+    for page in states:
+        for state in page:
+            if rng.random() < changed:
+                state["hours"] = rng.choice([32.0, 36.0, 44.0, 48.0])
+                state["deductions"] = {name: round(amount * 1.1, 2) for name, amount in state["deductions"].items()}
+    for hire in range(hires):
+        page = states[rng.randrange(pages)]
+        page.insert(rng.randrange(len(page) + 1), new_employee(rng, 9000 + hire))
+    if pages > 1:
+        states[-1].pop(rng.randrange(len(states[-1])))
+    week2 = [[week_record(state) for state in page] for page in states]
+
+    metadata = {"report_title": "Payroll Register", "company_name": "Acme Manufacturing Co",
+                "company_number": None, "pay_period_start": None, "pay_period_end": None,
+                "check_date": None, "payroll_number": None, "pay_frequency": "Weekly"}
+    return (render_week(week1, "01/10/2024"), week1, render_week(week2, "01/17/2024"), week2,
+            {**metadata, "check_date": "01/10/2024"}, {**metadata, "check_date": "01/17/2024"})
+
+
+class _FakeMessages:
+    def __init__(self, client: "TruthClient"):
+        self._client = client
+
+    def create(self, **kwargs):
+        return self._client.create(**kwargs)
+
+
+class TruthClient:
+    """Fake messages.create answering with the true employees whose names appear in the prompt."""
+
+    def __init__(self, truth: list, metadata: dict, chars_per_token: float = 3.5):
+        self.truth = truth
+        self.metadata = metadata
+        self.chars_per_token = chars_per_token
+        self.messages = _FakeMessages(self)
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        page_number = int(_PAGE.search(prompt).group(1))
+        page_text = prompt[_PAGE.search(prompt).end():]
+        response = {"employees": [copy.deepcopy(emp) for emp in self.truth[page_number - 1]
+                                  if emp["employee_name"] in page_text]}
+        if '"report_metadata"' in prompt:
+            response = {"report_metadata": self.metadata if page_number == 1 else None, **response}
+        text = json.dumps(response, indent=2)
+        return ReplayMessage(text, "end_turn", kwargs["model"],
+                             input_tokens=round(len(prompt) / self.chars_per_token),
+                             output_tokens=round(len(text) / self.chars_per_token))
+
+
+def run(pages: list, truth: list, metadata: dict, prior_dir: Path = None) -> dict:
+    metrics = RunMetrics("benchmark")
+    extractor = RawDataExtractor(metrics=metrics, client=TruthClient(truth, metadata))
+    if prior_dir is not None:
+        extractor = DeltaExtractor(extractor, prior_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        interim = extractor.extract_raw_data(pages)
+    return {"interim": interim, "calls": metrics.counters["api_calls"],
+            "input_tokens": metrics.counters["input_tokens"], "output_tokens": metrics.counters["output_tokens"],
+            "reused": metrics.counters["reused_employees"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark delta extraction against a prior week")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--employees-per-page", type=int, default=6)
+    parser.add_argument("--changed", type=float, default=0.1, help="Share of employees whose pay changed")
+    parser.add_argument("--hires", type=int, default=2, help="New employees in week two")
+    args = parser.parse_args()
+
+    week1_pages, week1, week2_pages, week2, metadata1, metadata2 = make_weeks(
+        args.pages, args.employees_per_page, args.changed, args.hires)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prior_dir = Path(tmp)
+        prior = run(week1_pages, week1, metadata1)
+        write_artifact(prior_dir / "extracted.json", {"pages": week1_pages})
+        write_artifact(prior_dir / "interim.json", prior["interim"])
+
+        full = run(week2_pages, week2, metadata2)
+        delta = run(week2_pages, week2, metadata2, prior_dir)
+
+    employees = len(full["interim"]["employees"])
+    same = "same" if delta["interim"] == full["interim"] else "DIFFERENT"
+    print(f"{args.pages} pages, {employees} employees in week two "
+          f"({args.changed:.0%} with pay changes, {args.hires} hires, 1 termination)\n")
+    print(f"{'':>8} | {'calls':>5} {'input tok':>9} {'output tok':>10} | {'reused':>6}")
+    print("-" * 48)
+    for name, result in (("full", full), ("delta", delta)):
+        print(f"{name:>8} | {result['calls']:>5} {result['input_tokens']:>9} {result['output_tokens']:>10} | "
+              f"{result['reused']:>6}")
+    saved = 1 - delta["output_tokens"] / full["output_tokens"]
+    print(f"\nOutput tokens saved: {saved:.0%}; delta result vs full extraction: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Fuzzy alias matcher benchmark (offline, synthetic aliases)
+Times FuzzyAliasMatcher.match() per label against the real FIELD_ALIASES
+padded with thousands of generated aliases, for exact, whole-word, typo and
+unmatched descriptions.
+
+Usage:
+    python testing/benchmark_fuzzy_matcher.py
+    python testing/benchmark_fuzzy_matcher.py --aliases 10000
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from schemas.global_schema import FIELD_ALIASES
+from src.fuzzy_matcher import FuzzyAliasMatcher
+
+QUERIES = {
+    "exact": ["Reg. Pay", "OASDI", "4-401K Plan", "Federal WH"],
+    "whole-word": ["MA: State WH", "OH: Columbus City Tax", "Employee Medicare WH"],
+    "typo": ["0-Regulr Pay", "Medcare", "3-CAF Dentl", "Overtme"],
+    "no match": ["Shift Differential", "Gym Membership", "Parking Reimb"],
+}
+
+
+def synthetic_aliases(count: int, seed: int = 1) -> dict:
+    """FIELD_ALIASES taxes/earnings/deductions plus `count` random two-word aliases."""
+    rng = random.Random(seed)
+    aliases = {}
+    for section in ("earnings", "deductions", "taxes"):
+        for normalized_type, patterns in FIELD_ALIASES[section].items():
+            aliases.setdefault(normalized_type, []).extend(patterns)
+
+    def word():
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+    for i in range(count):
+        aliases.setdefault(f"Synthetic {i % 50}", []).append(f"{word()} {word()}")
+    return aliases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy alias matching")
+    parser.add_argument("--aliases", type=int, nargs="+", default=[0, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=2000, help="Matches per query")
+    args = parser.parse_args()
+
+    for count in args.aliases:
+        aliases = synthetic_aliases(count)
+        start = time.perf_counter()
+        matcher = FuzzyAliasMatcher(aliases)
+        build = time.perf_counter() - start
+        print(f"\n{len(matcher.entries)} aliases (index built in {build * 1000:.1f} ms)")
+
+        for tier, queries in QUERIES.items():
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for query in queries:
+                    matcher.match(query)
+            per_label = (time.perf_counter() - start) / (args.repeat * len(queries))
+            results = ", ".join(f"{query!r}->{matcher.match(query)[0]}" for query in queries[:2])
+            print(f"  {tier:<10} {per_label * 1e6:8.1f} us/label   {results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Amount grounding benchmark (synthetic pages)
+Renders synthetic register pages as Step 1 text, one value per line like
+PyMuPDF, with the matching interim employees, then times the grounding pass
+Step 2 runs inline on every page (building the page's numeric token set and
+looking up every amount, hours and rate). A fraction of the values is
+replaced by amounts that are not on the page to check they are all flagged
+and that nothing else is.
+
+Usage:
+    python testing/benchmark_grounding.py
+    python testing/benchmark_grounding.py --employees-per-page 5 50 200 --wrong 0.05
+"""
+
+import argparse
+import copy
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.grounding import LINE_SECTIONS, ground_employees, is_grounded_field
+
+
+def synthetic_page(employees_per_page: int, rng: random.Random):
+    """(Step 1 page, interim employees) for one register page."""
+    def line(n, earning):
+        values = {"raw_code": str(n), "raw_description": f"{n}-Line {n}",
+                  "amount_current": f"{rng.uniform(1, 2500):,.2f}", "amount_ytd": f"{rng.uniform(500, 50000):,.2f}"}
+        if earning:
+            values.update({"rate": f"{rng.uniform(15, 60):.2f}", "hours_current": f"{rng.choice([8, 40, 80]):.2f}",
+                           "hours_ytd": f"{rng.uniform(100, 2000):.2f}"})
+        return values
+
+    employees = [{
+        "employee_name": f"Employee {i}, Pat",
+        "employee_id": f"{2001000 + i}",
+        "earnings": [line(n, True) for n in range(rng.randint(1, 3))],
+        "deductions": [line(n, False) for n in range(rng.randint(0, 4))],
+        "taxes": [line(n, False) for n in range(rng.randint(2, 5))],
+    } for i in range(employees_per_page)]
+
+    text_lines = []
+    for emp in employees:
+        text_lines += [emp["employee_id"], emp["employee_name"]]
+        for section in LINE_SECTIONS:
+            for values in emp[section]:
+                text_lines += [value for value in values.values() if value is not None]
+    return {"page_number": 1, "text": "\n".join(text_lines)}, employees
+
+
+def inject_wrong(employees, fraction: float, rng: random.Random) -> int:
+    """Replace a fraction of the checked values by amounts not on the page; returns how many."""
+    count = 0
+    for emp in employees:
+        for section in LINE_SECTIONS:
+            for values in emp[section]:
+                for field in values:
+                    if is_grounded_field(field) and values[field] is not None and rng.random() < fraction:
+                        values[field] = f"{rng.uniform(100000, 200000):,.3f}"
+                        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inline amount grounding pass")
+    parser.add_argument("--employees-per-page", type=int, nargs="+", default=[2, 10, 30, 100])
+    parser.add_argument("--pages", type=int, default=200, help="Pages per size (default: 200)")
+    parser.add_argument("--wrong", type=float, default=0.02, help="Fraction of values replaced (default: 0.02)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    header = f"{'employees/page':>14} {'chars/page':>10} {'values/page':>11} | {'ms/page':>8} | {'wrong':>6} {'flagged':>7}"
+    print(header)
+    print("-" * len(header))
+    for per_page in args.employees_per_page:
+        pages = [synthetic_page(per_page, rng) for _ in range(args.pages)]
+        wrong = 0
+        for _, employees in pages:
+            wrong += inject_wrong(employees, args.wrong, rng)
+        values = sum(1 for _, employees in pages for emp in employees for section in LINE_SECTIONS
+                     for line in emp[section] for field, value in line.items()
+                     if is_grounded_field(field) and value is not None)
+
+        runs = [(page, copy.deepcopy(employees)) for page, employees in pages]
+        start = time.perf_counter()
+        flagged = sum(ground_employees(employees, page) for page, employees in runs)
+        elapsed = time.perf_counter() - start
+
+        chars = sum(len(page["text"]) for page, _ in pages) / len(pages)
+        print(f"{per_page:>14} {chars:>10.0f} {values / len(pages):>11.0f} | "
+              f"{elapsed / len(pages) * 1000:>8.3f} | {wrong:>6} {flagged:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Hedged request benchmark (offline, fake client)
+Runs Step 2 on synthetic documents against a local fake client whose latency
+is heavy-tailed (mostly fast, occasionally very slow), with and without
+hedging, and reports per-document and per-call latency percentiles plus the
+extra request rate hedging cost.
+
+Usage:
+    python testing/benchmark_hedging.py
+    python testing/benchmark_hedging.py --documents 50 --pages 10 --budget 0.05
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.hedging import HedgingClient
+from src.metrics import RunMetrics
+from src.replay import ReplayMessage
+from src.step2_raw_extraction import RawDataExtractor
+
+RESPONSE = json.dumps({"report_metadata": {}, "employees": [{"employee_name": "Doe, Jane"}]})
+
+
+class _FakeMessages:
+    def __init__(self, client: "HeavyTailClient"):
+        self._client = client
+
+    def create(self, **kwargs):
+        return self._client.create(**kwargs)
+
+
+class HeavyTailClient:
+    """
+    Fake messages.create with log-normal latency plus a Pareto tail.
+
+    With probability tail_probability a call takes median * (5 to ~100)
+    seconds, the kind of stall that decides a document's finish time.
+    """
+
+    def __init__(self, median: float = 0.02, sigma: float = 0.3, tail_probability: float = 0.03,
+                 seed: int = 1):
+        self.median = median
+        self.sigma = sigma
+        self.tail_probability = tail_probability
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.messages = _FakeMessages(self)
+
+    def latency(self) -> float:
+        with self._lock:
+            self.calls += 1
+            if self.rng.random() < self.tail_probability:
+                return self.median * min(5 * self.rng.paretovariate(1.2), 100)
+            return self.median * math.exp(self.rng.gauss(0, self.sigma))
+
+    def create(self, **kwargs):
+        time.sleep(self.latency())
+        return ReplayMessage(RESPONSE, "end_turn", kwargs.get("model"), 1000, 50)
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(fraction * len(ordered))) - 1]
+
+
+def run(documents: int, pages: int, hedged: bool, args) -> dict:
+    fake = HeavyTailClient(median=args.median, tail_probability=args.tail, seed=args.seed)
+    client = fake
+    if hedged:
+        client = HedgingClient(fake, percentile=args.percentile, budget=args.budget)
+
+    call_seconds = []
+    document_seconds = []
+    for index in range(args.warmup + documents):
+        extractor = RawDataExtractor(metrics=RunMetrics(), client=client)
+        page_list = [{"page_number": n + 1, "text": f"page {n + 1}"} for n in range(pages)]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            extractor.extract_raw_data(page_list)
+        if index < args.warmup:
+            continue  # Lets the hedging client observe enough latencies first
+        document_seconds.append(time.perf_counter() - start)
+        call_seconds.extend(
+            record["step2_raw_extraction"]["wall_seconds"] for record in extractor.metrics.pages.values()
+        )
+
+    requests = (args.warmup + documents) * pages
+    return {
+        "doc_p50": percentile(document_seconds, 0.5),
+        "doc_p99": percentile(document_seconds, 0.99),
+        "call_p50": percentile(call_seconds, 0.5),
+        "call_p99": percentile(call_seconds, 0.99),
+        "extra_rate": (fake.calls - requests) / requests,
+        "stats": client.stats() if hedged else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hedged Step 2 requests")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed documents run first")
+    parser.add_argument("--median", type=float, default=0.02, help="Median call latency in seconds")
+    parser.add_argument("--tail", type=float, default=0.03, help="Probability of a slow call")
+    parser.add_argument("--percentile", type=float, default=0.95)
+    parser.add_argument("--budget", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    header = f"{'mode':>8} | {'doc p50':>8} {'doc p99':>8} | {'call p50':>8} {'call p99':>8} | {'extra req':>9}"
+    print(header)
+    print("-" * len(header))
+    for hedged in (False, True):
+        result = run(args.documents, args.pages, hedged, args)
+        print(f"{'hedged' if hedged else 'plain':>8} | {result['doc_p50']:>7.3f}s {result['doc_p99']:>7.3f}s | "
+              f"{result['call_p50']:>7.3f}s {result['call_p99']:>7.3f}s | {result['extra_rate']:>8.1%}")
+        if result["stats"]:
+            print(f"           hedging: {result['stats']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Step 3 label dedupe benchmark (offline, synthetic data)
+Maps generated interim data with a varying number of employees and distinct
+earning/deduction/tax labels, and reports how often labels are classified.
+
+With the per-document label table, classification work follows the number of
+distinct labels; the "per-line" column re-classifies every line, which is
+what Step 3 did before the table existed.
+
+Usage:
+    python testing/benchmark_label_dedupe.py
+    python testing/benchmark_label_dedupe.py --employees 1000 10000 --labels 30 300
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.step3_schema_mapping import HINT_KEY, SchemaMatcher
+
+SECTIONS = ["earnings", "deductions", "taxes"]
+LINES_PER_SECTION = 3
+
+
+class CountingMatcher(SchemaMatcher):
+    """SchemaMatcher that counts and times label classification."""
+
+    def __init__(self, per_line: bool = False):
+        super().__init__()
+        self.per_line = per_line
+        self.classified = 0
+        self.classify_seconds = 0.0
+
+    def _label(self, section, raw):
+        if self.per_line:
+            return self._classify_label(section, raw.get('raw_code'), raw.get('raw_description'), raw.get(HINT_KEY))
+        return super()._label(section, raw)
+
+    def _classify_label(self, section, code, description, hint):
+        start = time.perf_counter()
+        label = super()._classify_label(section, code, description, hint)
+        self.classify_seconds += time.perf_counter() - start
+        self.classified += 1
+        return label
+
+
+def make_interim(employees: int, labels: int, seed: int = 1) -> dict:
+    """Generate interim data using `labels` distinct descriptions spread over the sections."""
+    rng = random.Random(seed)
+    vocabulary = {
+        section: [f"{i}-{section[:3].title()} Item {i}" for i in range(max(1, labels // len(SECTIONS)))]
+        for section in SECTIONS
+    }
+
+    def line(section):
+        description = rng.choice(vocabulary[section])
+        return {
+            "raw_code": description.split("-")[0],
+            "raw_description": description,
+            "amount_current": f"{rng.uniform(1, 500):.2f}",
+            "amount_ytd": f"{rng.uniform(500, 5000):.2f}",
+        }
+
+    return {
+        "report_metadata": {},
+        "employees": [
+            {
+                "employee_name": f"Employee {i}",
+                "employee_id": str(i),
+                "department": str(i % 5),
+                **{section: [line(section) for _ in range(LINES_PER_SECTION)] for section in SECTIONS},
+            }
+            for i in range(employees)
+        ],
+    }
+
+
+def measure(interim: dict, per_line: bool) -> dict:
+    matcher = CountingMatcher(per_line=per_line)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        matcher.map_interim_to_schema(interim)
+    return {
+        "seconds": time.perf_counter() - start,
+        "classified": matcher.classified,
+        "classify_seconds": matcher.classify_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Step 3 label dedupe")
+    parser.add_argument("--employees", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--labels", type=int, nargs="+", default=[30, 300])
+    args = parser.parse_args()
+
+    header = (f"{'employees':>9} {'lines':>7} {'labels':>6} | {'classified':>10} {'classify s':>10} {'map s':>7}"
+              f" | {'per-line classified':>19} {'classify s':>10} {'map s':>7}")
+    print(header)
+    print("-" * len(header))
+
+    for labels in args.labels:
+        for employees in args.employees:
+            interim = make_interim(employees, labels)
+            lines = employees * LINES_PER_SECTION * len(SECTIONS)
+            table = measure(interim, per_line=False)
+            per_line = measure(interim, per_line=True)
+            print(f"{employees:>9} {lines:>7} {labels:>6} | {table['classified']:>10} "
+                  f"{table['classify_seconds']:>10.4f} {table['seconds']:>7.3f} | "
+                  f"{per_line['classified']:>19} {per_line['classify_seconds']:>10.4f} {per_line['seconds']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
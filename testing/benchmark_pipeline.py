@@ -0,0 +1,146 @@
+"""
+End-to-end pipeline benchmark (offline)
+Runs the full main.py pipeline (Steps 1-3) on the sample_pdfs/ corpus with
+Step 2 replayed from recorded cassettes, and reports pages/sec,
+employees/sec and peak memory per PDF.
+
+Record cassettes once with a live API key:
+    python main.py PR-Register.pdf --record testing/cassettes/PR-Register
+
+Then benchmark (exits 1 on a regression against the stored baseline):
+    python testing/benchmark_pipeline.py
+    python testing/benchmark_pipeline.py --update-baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from main import run_pipeline
+from src.metrics import RunMetrics
+from src.replay import ReplayClient, parse_latency
+from src.step2_raw_extraction import RawDataExtractor
+
+DEFAULT_CASSETTES = ROOT / "testing" / "cassettes"
+DEFAULT_BASELINE = ROOT / "testing" / "benchmark_baseline.json"
+
+
+def run_once(pdf_path: Path, cassette_dir: Path, latency) -> dict:
+    """Run the pipeline once into a temporary output directory."""
+    metrics = RunMetrics(pdf_path.stem)
+    client = ReplayClient(cassette_dir, latency=latency)
+    extractor = RawDataExtractor(metrics=metrics, client=client)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = run_pipeline(str(pdf_path), Path(tmp), pdf_path.name, metrics, extractor)
+        elapsed = time.perf_counter() - start
+
+    if client.misses:
+        raise RuntimeError(f"{len(client.misses)} requests missing from {cassette_dir}; re-record cassettes")
+
+    summary["seconds"] = elapsed
+    return summary
+
+
+def benchmark_pdf(pdf_path: Path, cassette_dir: Path, repeat: int, latency) -> dict:
+    """Best-of-N throughput plus one traced run for peak memory."""
+    runs = [run_once(pdf_path, cassette_dir, latency) for _ in range(repeat)]
+    best = min(runs, key=lambda r: r["seconds"])
+
+    tracemalloc.start()
+    run_once(pdf_path, cassette_dir, latency)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "pages": best["pages"],
+        "employees": best["employees"],
+        "seconds": round(best["seconds"], 6),
+        "pages_per_sec": round(best["pages"] / best["seconds"], 3),
+        "employees_per_sec": round(best["employees"] / best["seconds"], 3),
+        "peak_memory_bytes": peak,
+    }
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """Compare results to the baseline; return human-readable regressions."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("pages_per_sec", "employees_per_sec"):
+            if base.get(key) and result[key] < base[key] * (1 - tolerance):
+                regressions.append(f"{name}: {key} {result[key]} < baseline {base[key]}")
+        if base.get("peak_memory_bytes") and result["peak_memory_bytes"] > base["peak_memory_bytes"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak_memory_bytes {result['peak_memory_bytes']} > baseline {base['peak_memory_bytes']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to benchmark (default: sample_pdfs/*.pdf)")
+    parser.add_argument("--cassettes", type=Path, default=DEFAULT_CASSETTES,
+                        help="Directory containing one cassette folder per PDF stem")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default 0.2)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per PDF (best is kept)")
+    parser.add_argument("--latency", default=None, help='Simulated LLM latency: seconds or "recorded"')
+    args = parser.parse_args()
+
+    pdfs = [Path(p) for p in args.pdfs] or sorted((ROOT / "sample_pdfs").glob("*.pdf"))
+    latency = parse_latency(args.latency)
+
+    results = {}
+    for pdf_path in pdfs:
+        cassette_dir = args.cassettes / pdf_path.stem
+        if not cassette_dir.is_dir():
+            print(f"⚠ Skipping {pdf_path.name}: no cassettes in {cassette_dir}")
+            continue
+        result = benchmark_pdf(pdf_path, cassette_dir, args.repeat, latency)
+        results[pdf_path.stem] = result
+        print(f"{pdf_path.stem:45s} {result['pages_per_sec']:10.2f} pages/s "
+              f"{result['employees_per_sec']:10.2f} employees/s "
+              f"{result['peak_memory_bytes'] / 1e6:8.2f} MB peak")
+
+    if not results:
+        print("✗ Nothing benchmarked (record cassettes first)")
+        sys.exit(1)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"✓ Baseline saved to: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"⚠ No baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    regressions = find_regressions(results, baseline, args.tolerance)
+    if regressions:
+        for regression in regressions:
+            print(f"✗ {regression}")
+        sys.exit(1)
+    print("✓ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Page-role prompt benchmark (offline, fake client)
+Runs Step 2 on documents of increasing page count twice: once asking every
+page for report_metadata (the single-prompt behaviour) and once with page
+roles (header prompt until the report header is found, employees-only
+prompt after). A fake client answers each prompt the way the model does,
+re-emitting the metadata block only when the prompt asks for it, and
+reports output tokens per document and the generation time they cost at a
+given decode rate.
+
+Output tokens are estimated from response characters (--chars-per-token);
+live runs record the real per-page counts and prompt_role in metrics.json.
+
+Usage:
+    python testing/benchmark_prompt_roles.py
+    python testing/benchmark_prompt_roles.py --pages 1 5 50 --employees-per-page 3 --seconds-per-token 0.01
+    python testing/benchmark_prompt_roles.py --interim outputs/PR-Register/interim.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import re
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.artifacts import read_artifact
+from src.metrics import RunMetrics
+from src.replay import ReplayMessage
+from src.step2_raw_extraction import RawDataExtractor, merge_page_results
+
+METADATA = {
+    "report_title": "Payroll Register",
+    "company_name": "Acme Manufacturing Co",
+    "company_number": "1042",
+    "pay_period_start": "01/01/2024",
+    "pay_period_end": "01/07/2024",
+    "check_date": "01/10/2024",
+    "payroll_number": "2024-01",
+    "pay_frequency": "Weekly",
+}
+EMPTY_METADATA = {key: None for key in METADATA}
+
+_PAGE = re.compile(r"^PAGE (\d+):$", re.MULTILINE)
+
+
+class _FakeMessages:
+    def __init__(self, client: "PageResponseClient"):
+        self._client = client
+
+    def create(self, **kwargs):
+        return self._client.create(**kwargs)
+
+
+class PageResponseClient:
+    """
+    Fake messages.create returning each page's employees, plus the metadata
+    block if the prompt's JSON format includes report_metadata (real metadata
+    on header pages, nulls on the others, as the model does).
+    """
+
+    def __init__(self, employees_by_page: dict, header_pages: set, chars_per_token: float):
+        self.employees_by_page = employees_by_page
+        self.header_pages = header_pages
+        self.chars_per_token = chars_per_token
+        self.messages = _FakeMessages(self)
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        page_number = int(_PAGE.search(prompt).group(1))
+        response = {}
+        if '"report_metadata"' in prompt:
+            response["report_metadata"] = METADATA if page_number in self.header_pages else EMPTY_METADATA
+        response["employees"] = self.employees_by_page.get(page_number, [])
+        text = json.dumps(response, indent=1)
+        return ReplayMessage(text, "end_turn", kwargs["model"],
+                             input_tokens=round(len(prompt) / self.chars_per_token),
+                             output_tokens=round(len(text) / self.chars_per_token))
+
+
+def synthetic_employees(pages: int, per_page: int) -> dict:
+    """Employees per page in the interim format."""
+    def line(section, n):
+        return {"raw_code": str(n), "raw_description": f"{n}-{section} {n}",
+                "amount_current": f"{100 + n * 12.5:.2f}", "amount_ytd": f"{1000 + n * 125:.2f}"}
+
+    return {
+        page: [{
+            "employee_name": f"Employee{page}-{i}, Pat",
+            "employee_id": f"{page:03d}{i:03d}",
+            "department": str(i % 4),
+            "earnings": [line("Regular Pay", n) for n in range(2)],
+            "deductions": [line("401K", n) for n in range(2)],
+            "taxes": [line("Fed WH", n) for n in range(3)],
+            "totals": {"gross_pay_current": "1200.00", "net_pay_current": "900.00"},
+        } for i in range(per_page)]
+        for page in range(1, pages + 1)
+    }
+
+
+def employees_from_interim(path: Path) -> dict:
+    """Employees of a real interim.json grouped by source page."""
+    by_page = {}
+    for emp in read_artifact(path)["employees"]:
+        emp = {key: value for key, value in emp.items() if key != "page_number"}
+        by_page.setdefault(emp.get("page_number", 1), []).append(emp)
+    return by_page
+
+
+def run(employees_by_page: dict, header_pages: set, chars_per_token: float, page_roles: bool) -> dict:
+    """Step 2 over the document; returns output tokens and the merged metadata."""
+    metrics = RunMetrics("benchmark")
+    client = PageResponseClient(employees_by_page, header_pages, chars_per_token)
+    extractor = RawDataExtractor(metrics=metrics, client=client)
+    pages = [{"page_number": number, "text": f"page {number}"} for number in sorted(employees_by_page)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if page_roles:
+            result = extractor.extract_raw_data(pages)
+        else:
+            result = merge_page_results([extractor.extract_page(page, role="header") for page in pages])
+    return {"output_tokens": metrics.counters["output_tokens"], "report_metadata": result["report_metadata"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page-role prompts (output tokens saved)")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 2, 10, 50], help="Document sizes")
+    parser.add_argument("--employees-per-page", type=int, default=5)
+    parser.add_argument("--interim", metavar="PATH", help="Use a real interim.json's employees instead")
+    parser.add_argument("--chars-per-token", type=float, default=3.5,
+                        help="Response characters per output token (default: 3.5)")
+    parser.add_argument("--seconds-per-token", type=float, default=0.008,
+                        help="Decode time per output token (default: 0.008, ~125 tokens/s)")
+    args = parser.parse_args()
+
+    documents = []
+    if args.interim:
+        documents.append((Path(args.interim).parent.name, employees_from_interim(Path(args.interim)), {1}))
+    else:
+        for pages in args.pages:
+            employees = synthetic_employees(pages, args.employees_per_page)
+            documents.append((f"{pages} pages", employees, {1}))
+        if max(args.pages) > 1:
+            # Cover page without a header: the header prompt falls back to page 2
+            pages = max(args.pages)
+            documents.append((f"{pages} pages, header on p2", synthetic_employees(pages, args.employees_per_page), {2}))
+
+    header = (f"{'document':>24} | {'tokens/doc':>10} {'roles':>8} {'saved':>7} | "
+              f"{'gen s/doc':>9} {'roles':>8} {'saved s':>8} | metadata")
+    print(header)
+    print("-" * len(header))
+    for name, employees_by_page, header_pages in documents:
+        single = run(employees_by_page, header_pages, args.chars_per_token, page_roles=False)
+        roles = run(employees_by_page, header_pages, args.chars_per_token, page_roles=True)
+        saved = single["output_tokens"] - roles["output_tokens"]
+        same = "same" if roles["report_metadata"] == single["report_metadata"] else "DIFFERENT"
+        print(f"{name:>24} | {single['output_tokens']:>10} {roles['output_tokens']:>8} "
+              f"{saved / single['output_tokens']:>7.1%} | "
+              f"{single['output_tokens'] * args.seconds_per_token:>9.2f} "
+              f"{roles['output_tokens'] * args.seconds_per_token:>8.2f} {saved * args.seconds_per_token:>8.2f} | {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Wire format benchmark (offline, replayed fixtures)
+Runs Step 2 over fixture pages twice, once asking for keyed interim JSON and
+once for the compact wire format, against a fake client that answers each
+prompt with the fixture page in the requested format and cuts the answer
+off at max_tokens like the API does. Reports output tokens, truncated pages
+and employees recovered per fixture set, and checks that the expanded wire
+responses equal the keyed ones.
+
+Fixtures are the recorded responses in cassette directories (see
+testing/README.md); without any, synthetic registers with 2 to 30
+employees per page are used. Output tokens are estimated by splitting on
+words, punctuation runs and indentation (no tokenizer is installed).
+
+Usage:
+    python testing/benchmark_wire_format.py
+    python testing/benchmark_wire_format.py --cassettes testing/cassettes/*
+    python testing/benchmark_wire_format.py --employees-per-page 5 20 40 --max-tokens 4096
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import re
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.metrics import RunMetrics
+from src.replay import ReplayMessage
+from src.step2_raw_extraction import RawDataExtractor
+from src.wire_format import encode_page
+
+DEFAULT_CASSETTES = ROOT / "testing" / "cassettes"
+
+_PAGE = re.compile(r"^PAGE (\d+):$", re.MULTILINE)
+_TOKEN = re.compile(r"\w+|[^\w\s]+|\s{2,}")
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(1 for _ in _TOKEN.finditer(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Text up to the end of the max_tokens-th estimated token."""
+    for count, match in enumerate(_TOKEN.finditer(text), 1):
+        if count == max_tokens:
+            return text[:match.end()]
+    return text
+
+
+class _FakeMessages:
+    def __init__(self, client: "FixtureClient"):
+        self._client = client
+
+    def create(self, **kwargs):
+        return self._client.create(**kwargs)
+
+
+class FixtureClient:
+    """
+    Fake messages.create answering with the fixture page for the prompt's
+    page number: keyed JSON (indented, as the model writes it) or, if the
+    prompt defines the wire format, compact wire JSON; answers longer than
+    max_tokens are cut off with stop_reason "max_tokens".
+    """
+
+    def __init__(self, pages: dict, max_tokens: int):
+        self.pages = pages
+        self.max_tokens = max_tokens
+        self.messages = _FakeMessages(self)
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        page = self.pages[int(_PAGE.search(prompt).group(1))]
+        wire = "EMPLOYEE = [INFO" in prompt
+        response = {"employees": page.get("employees") or []}
+        if '"report_metadata"' in prompt or '"m": META' in prompt:
+            response = {"report_metadata": page.get("report_metadata") or {}, **response}
+        if wire:
+            text = json.dumps(encode_page(response), ensure_ascii=False, separators=(",", ":"))
+        else:
+            text = json.dumps(response, ensure_ascii=False, indent=2)
+
+        stop_reason = "end_turn"
+        max_tokens = min(kwargs["max_tokens"], self.max_tokens)
+        if estimate_tokens(text) > max_tokens:
+            text = truncate_tokens(text, max_tokens)
+            stop_reason = "max_tokens"
+        return ReplayMessage(text, stop_reason, kwargs["model"],
+                             input_tokens=estimate_tokens(prompt), output_tokens=estimate_tokens(text))
+
+
+def pages_from_cassettes(cassette_dir: Path) -> dict:
+    """Keyed page responses recorded in a cassette directory, by page number."""
+    pages = {}
+    for path in sorted(cassette_dir.glob("*.json")):
+        with open(path, 'r', encoding='utf-8') as f:
+            cassette = json.load(f)
+        match = _PAGE.search(cassette["request"]["messages"][0]["content"])
+        try:
+            response = json.loads(cassette["response"]["text"])
+        except json.JSONDecodeError:
+            continue  # Truncated recording: not a usable fixture
+        if match and "EMPLOYEE = [INFO" not in cassette["request"]["messages"][0]["content"]:
+            page = pages.setdefault(int(match.group(1)), {})
+            page.setdefault("employees", response.get("employees") or [])
+            if response.get("report_metadata"):
+                page["report_metadata"] = response["report_metadata"]
+    return pages
+
+
+def synthetic_pages(pages: int, employees_per_page: int, seed: int = 1) -> dict:
+    """A register whose pages hold employees_per_page employees with 4-12 lines each."""
+    rng = random.Random(seed)
+
+    def line(section, n, earning=False):
+        return {
+            "raw_code": str(n), "raw_description": f"{n}-{section}",
+            "rate": f"{rng.uniform(15, 60):.2f}" if earning else None,
+            "hours_current": f"{rng.uniform(1, 40):.2f}" if earning else None,
+            "hours_ytd": None,
+            "amount_current": f"{rng.uniform(1, 2500):,.2f}", "amount_ytd": f"{rng.uniform(500, 50000):,.2f}",
+        } if earning else {
+            "raw_code": str(n), "raw_description": f"{n}-{section}",
+            "amount_current": f"{rng.uniform(1, 500):,.2f}", "amount_ytd": f"{rng.uniform(50, 9000):,.2f}",
+        }
+
+    result = {}
+    for number in range(1, pages + 1):
+        employees = []
+        for i in range(employees_per_page):
+            employees.append({
+                "employee_name": f"Employee{number}-{i}, Pat", "employee_id": f"{number:03d}{i:03d}",
+                "ssn_masked": f"***-**-{rng.randrange(10000):04d}", "department": str(i % 6),
+                "payment_type": rng.choice(["DD", "Check"]), "check_number": None, "state": "MA",
+                "tax_status_federal": "S", "tax_allowances_federal": None,
+                "earnings": [line(name, n, True) for n, name in enumerate(["Regular", "Overtime", "Holiday"][:rng.randint(1, 3)])],
+                "deductions": [line(name, n) for n, name in enumerate(["401K", "Medical", "Dental", "Vision"][:rng.randint(1, 4)])],
+                "taxes": [line(name, n) for n, name in enumerate(["Fed WH", "FICA", "Medicare", "MA: State WH", "MA: PFML"][:rng.randint(2, 5)])],
+                "totals": {"gross_pay_current": f"{rng.uniform(500, 5000):,.2f}", "gross_pay_ytd": None,
+                           "total_deductions_current": None, "total_deductions_ytd": None,
+                           "total_taxes_current": None, "total_taxes_ytd": None,
+                           "net_pay_current": f"{rng.uniform(400, 4000):,.2f}", "net_pay_ytd": None},
+            })
+        result[number] = {"employees": employees}
+    result[1]["report_metadata"] = {
+        "report_title": "Payroll Register", "company_name": "Acme Co", "company_number": "1042",
+        "pay_period_start": "01/01/2024", "pay_period_end": "01/07/2024", "check_date": "01/10/2024",
+        "payroll_number": None, "pay_frequency": "Weekly",
+    }
+    return result
+
+
+def run(pages: dict, wire_format: bool, max_tokens: int) -> dict:
+    metrics = RunMetrics("benchmark")
+    extractor = RawDataExtractor(metrics=metrics, client=FixtureClient(pages, max_tokens), wire_format=wire_format)
+    extractor_pages = [{"page_number": number, "text": ""} for number in sorted(pages)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        interim = extractor.extract_raw_data(extractor_pages)
+    return {"interim": interim, "output_tokens": metrics.counters["output_tokens"],
+            "truncations": metrics.counters["truncations"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compact Step 2 wire format")
+    parser.add_argument("--cassettes", nargs="*", metavar="DIR",
+                        help="Cassette directories to use as fixtures (default: testing/cassettes/*)")
+    parser.add_argument("--employees-per-page", type=int, nargs="+", default=[2, 5, 10, 15, 20, 30],
+                        help="Synthetic fixture densities, used when no cassettes are found")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per synthetic fixture (default: 10)")
+    parser.add_argument("--max-tokens", type=int, default=4096,
+                        help="Output token limit, at most Step 2's own (default: 4096)")
+    args = parser.parse_args()
+
+    cassette_dirs = [Path(d) for d in args.cassettes] if args.cassettes else sorted(
+        d for d in DEFAULT_CASSETTES.glob("*") if d.is_dir())
+    fixtures = [(d.name, pages_from_cassettes(d)) for d in cassette_dirs]
+    fixtures = [(name, pages) for name, pages in fixtures if pages]
+    if not fixtures:
+        print("No cassettes found; using synthetic fixtures\n")
+        fixtures = [(f"{n} employees/page", synthetic_pages(args.pages, n)) for n in args.employees_per_page]
+
+    header = (f"{'fixture':>20} {'pages':>5} | {'tokens':>8} {'wire':>8} {'saved':>6} | "
+              f"{'truncated':>9} {'wire':>5} | {'employees':>9} {'wire':>5} | expanded")
+    print(header)
+    print("-" * len(header))
+    for name, pages in fixtures:
+        keyed = run(pages, False, args.max_tokens)
+        wire = run(pages, True, args.max_tokens)
+        expected = sum(len(page.get("employees") or []) for page in pages.values())
+        if keyed["truncations"] or wire["truncations"]:
+            same = "n/a (truncated)"
+        else:
+            same = "same" if wire["interim"] == keyed["interim"] else "DIFFERENT"
+        saved = 1 - wire["output_tokens"] / keyed["output_tokens"]
+        print(f"{name:>20} {len(pages):>5} | {keyed['output_tokens']:>8} {wire['output_tokens']:>8} {saved:>6.1%} | "
+              f"{keyed['truncations'] / len(pages):>9.0%} {wire['truncations'] / len(pages):>5.0%} | "
+              f"{len(keyed['interim']['employees']):>4}/{expected:<4} {len(wire['interim']['employees']):>5} | {same}")
+
+
+if __name__ == "__main__":
+    main()
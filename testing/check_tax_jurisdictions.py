@@ -0,0 +1,52 @@
+"""
+Tax jurisdiction regression check
+Maps tax labels as printed on the sample registers through Step 3's label
+classification (SchemaMatcher) and checks the state or locality each one is
+given. Leading state codes are only taken when printed in capitals, so this
+also guards against Step 3 lower-casing a label before the lookup.
+
+Exits with status 1 if any label maps to the wrong jurisdiction.
+
+Usage:
+    python testing/check_tax_jurisdictions.py
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.step3_schema_mapping import SchemaMatcher
+
+# Printed tax label -> expected jurisdiction (None: no state or locality)
+EXPECTED = {
+    "MA: State WH": "MA",  # PR-Register.pdf
+    "CA SDI": "CA",
+    "NY State WH": "NY",
+    "PA-EIT": "PA EIT",
+    "Fed WH - GA": "GA",
+    "Columbus OH City Tax": "COLUMBUS",
+    "In-State Tax": None,  # "In" is not Indiana
+    "Federal WH": None,
+    "OASDI": None,
+}
+
+
+def main():
+    matcher = SchemaMatcher()
+    failures = 0
+    for label, expected in EXPECTED.items():
+        _, _, tax_type, _, authority, jurisdiction = matcher._classify_label("taxes", None, label, None)
+        ok = jurisdiction == expected
+        failures += not ok
+        print(f"{'✓' if ok else '✗'} {label!r}: {tax_type}, {authority}, {jurisdiction!r}"
+              + ("" if ok else f" (expected {expected!r})"))
+    if failures:
+        print(f"\n✗ {failures} of {len(EXPECTED)} labels mapped to the wrong jurisdiction")
+        sys.exit(1)
+    print(f"\n✓ All {len(EXPECTED)} labels mapped as expected")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,32 @@
 """
 Quick script to examine sample PDFs and understand their structure
+(page text comes from the Step 1 text cache when the PDF is unchanged)
 """
-import pymupdf
+import sys
 from pathlib import Path
 
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.step1_pdf_extraction import extract_text_from_pdf
+from src.text_cache import PageTextCache
+
+text_cache = PageTextCache()
+
 def extract_and_display_pdf(pdf_path):
     """Extract and display text from PDF"""
     print("\n" + "="*80)
     print(f"PDF: {pdf_path.name}")
     print("="*80)
     
-    doc = pymupdf.open(pdf_path)
-    
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        text = page.get_text()
+    for page in extract_text_from_pdf(str(pdf_path), cache=text_cache):
+        text = page['text']
         
-        print(f"\n--- Page {page_num + 1} ---")
+        print(f"\n--- Page {page['page_number']} ---")
         print(text[:2000])  # Show first 2000 chars
         
         if len(text) > 2000:
             print(f"\n... [Truncated, total length: {len(text)} characters] ...")
-    
-    doc.close()
 
 # Examine all sample PDFs
 sample_dir = Path("./sample_pdfs")
@@ -1,25 +1,22 @@
 """
 Extract complete text from sample PDFs
+(page text comes from the Step 1 text cache when the PDF is unchanged)
 """
-import pymupdf
+import sys
 from pathlib import Path
 import json
 
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.step1_pdf_extraction import extract_text_from_pdf
+from src.text_cache import PageTextCache
+
+text_cache = PageTextCache()
+
 def extract_complete_pdf(pdf_path):
     """Extract complete text from PDF"""
-    doc = pymupdf.open(pdf_path)
-    
-    pages_data = []
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        text = page.get_text()
-        pages_data.append({
-            'page_number': page_num + 1,
-            'text': text
-        })
-    
-    doc.close()
-    return pages_data
+    return extract_text_from_pdf(str(pdf_path), cache=text_cache)
 
 # Extract all sample PDFs
 sample_dir = Path("./sample_pdfs")